@@ -0,0 +1,447 @@
+"""
+관광지 추천 파이프라인 벤치마크.
+
+네트워크 없이(HashEmbeddings + 가짜 채팅 모델) 동봉된 CSV와 합성 데이터셋(1만/10만/100만 곳)에 대해
+CSV 수집, 스냅샷, 벡터 인덱스 생성/로드, 검색, 이름 조회, 거리 계산, 여행 계획표 파싱, 전체 추천 요청의
+p50/p95 지연 시간(ms)과 최대 메모리(tracemalloc, MB)를 측정하여 JSON으로 저장합니다.
+
+    python benchmarks/run_benchmarks.py                                   # 동봉 CSV + 1만 + 10만
+    python benchmarks/run_benchmarks.py --sizes bundled 10000 1000000 --max-index-rows 1000000
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/baseline.json   # p50이 기준 대비 1.2배를 넘으면 종료 코드 1
+    python benchmarks/run_benchmarks.py --sizes bundled 100000 --index-report        # FAISS 인덱스 종류별 재현율/지연/크기 (위치 기반 검색 포함)
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from langchain_community.vectorstores import FAISS  # noqa: E402
+from langchain_core.language_models.fake_chat_models import FakeListChatModel  # noqa: E402
+
+from tour_answer import IncrementalPlanParser, annotate_recommendations, parse_answer, parse_structured_answer  # noqa: E402
+from tour_context import ContextBudgeter, estimate_tokens  # noqa: E402
+from tour_data import (  # noqa: E402
+    DOCUMENT_SCHEMA, FILE_HASHES_ATTR, TOUR_CSV_FILES, dataset_row_loader, discover_tour_files, load_tour_dataset,
+    load_tour_snapshot, write_tour_snapshot,
+)
+from tour_embeddings import HashEmbeddings  # noqa: E402
+from tour_engine import TripEngine, build_chain_inputs  # noqa: E402
+from tour_geo import SpatialIndex, distance_matrix, distances_from  # noqa: E402
+from tour_lexical import LexicalIndex  # noqa: E402
+from tour_names import PlaceNameIndex  # noqa: E402
+from tour_planner import places_from_documents, plan_itinerary  # noqa: E402
+from tour_retrieval import GeoRetriever, HybridRetriever  # noqa: E402
+from tour_shards import RegionResolver, RegionShards, ShardedGeoRetriever, place_regions, region_keys  # noqa: E402
+from tour_vectorstore import INDEX_TYPES, build_faiss_index, configure_index, sync_vectorstore  # noqa: E402
+
+DEFAULT_SIZES = ["bundled", "10000", "100000"]
+DEFAULT_OUTPUT_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+SEARCH_PARAM_SWEEP = {"nprobe": (1, 4, 8, 16, 32), "ef_search": (16, 32, 64, 128, 256)}  # --index-report 검색 파라미터
+QUERIES = ["수원 역사 유적지", "가평 캠핑장", "아이와 함께 가기 좋은 체험", "남한산성", "호수 공원 산책", "연천 전곡리 유적"]
+
+SAMPLE_ANSWER = """**추천 관광지:**
+- 관광지 이름: {name1}
+  - 주소: 경기도
+  - 주요 시설/특징: 성곽과 행궁
+- 관광지 이름: {name2}
+  - 주소: 경기도
+  - 주요 시설/특징: 산책로
+
+**상세 여행 계획 (2일):**
+| 일차 | 시간 | 활동 | 예상 장소 | 이동 방법 |
+|---|---|---|---|---|
+| 1일차 | 오전 (9:00 - 12:00) | 성곽 산책 | {name1} | 자동차 약 10분 |
+| | 점심 (12:00 - 13:00) | 식사 | 근처 식당 | 도보 약 5분 |
+| | 오후 (13:00 - 17:00) | 공원 산책 | {name2} | 자동차 약 20분 |
+| 2일차 | 오전 (9:00 - 12:00) | 박물관 관람 | {name1} | 자동차 약 10분 |
+| | 오후 (13:00 - 17:00) | 카페 | 근처 카페 | 도보 약 5분 |
+"""
+
+SAMPLE_JSON_ANSWER = """{{"places": [{{"name": "{name1}", "address": "경기도", "features": "성곽과 행궁"}}, \
+{{"name": "{name2}", "address": "경기도", "features": "산책로"}}], "days": [\
+{{"day": 1, "items": [["오전 (9:00 - 12:00)", "성곽 산책", "{name1}", "자동차 약 10분"], \
+["점심 (12:00 - 13:00)", "식사", "근처 식당", "도보 약 5분"], ["오후 (13:00 - 17:00)", "공원 산책", "{name2}", "자동차 약 20분"]]}}, \
+{{"day": 2, "items": [["오전 (9:00 - 12:00)", "박물관 관람", "{name1}", "자동차 약 10분"], \
+["오후 (13:00 - 17:00)", "카페", "근처 카페", "도보 약 5분"]]}}]}}"""  # SAMPLE_ANSWER와 같은 내용의 구조화 답변
+
+
+def measure(fn, repeat=20, warmup=2, setup=None, track_memory=True):
+    """`fn`을 반복 실행하여 지연 시간 분위수와 (별도 1회 실행의) tracemalloc 최대 메모리를 측정합니다."""
+    def run_once():
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        return (time.perf_counter() - start) * 1000.0
+
+    for _ in range(warmup):
+        run_once()
+    times = np.array([run_once() for _ in range(repeat)])
+    result = {
+        "repeat": repeat,
+        "p50_ms": round(float(np.percentile(times, 50)), 4),
+        "p95_ms": round(float(np.percentile(times, 95)), 4),
+        "mean_ms": round(float(times.mean()), 4),
+    }
+    if track_memory:
+        args = setup() if setup else ()
+        tracemalloc.start()
+        try:
+            fn(*args)
+            result["peak_mem_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def synthesize_csv(base, n_rows, path, seed=0):
+    """동봉 데이터의 행을 무작위로 복제하고 좌표를 흔들어 `n_rows`곳짜리 CP949 CSV를 만듭니다."""
+    rng = np.random.default_rng(seed)
+    rows = base.iloc[rng.integers(0, len(base), n_rows)].reset_index(drop=True)
+    frame = pd.DataFrame({
+        "관광지명": rows["관광지명"] + " " + pd.Series(np.arange(n_rows)).astype(str),
+        "시군명": rows["시군명"],
+        "소재지도로명주소": rows["소재지도로명주소"],
+        "관광지구분": rows["관광지구분"],
+        "전화번호": rows["전화번호"],
+        "관광지소개": rows["관광지소개"],
+        "위도": rows["위도"] + rng.normal(0.0, 0.02, n_rows),
+        "경도": rows["경도"] + rng.normal(0.0, 0.02, n_rows),
+    })
+    frame.to_csv(path, index=False, encoding="cp949", errors="replace")
+    return path
+
+
+def perturb_name(name, rng):
+    """유사 이름 조회용: 공백을 없애고 한 글자를 빼거나 괄호 설명을 붙인 이름."""
+    compact = name.replace(" ", "")
+    if len(compact) > 4 and rng.random() < 0.5:
+        cut = int(rng.integers(1, len(compact) - 1))
+        return compact[:cut] + compact[cut + 1:]
+    return f"{compact} (경기도)"
+
+
+def index_type_report(vectors, queries, index_types, k=10, repeat=200, index_options=None, geo_retriever=None,
+                      origins=None):
+    """
+    인덱스 종류별 생성 시간, 직렬화 크기, 질의 1건 검색 지연(p50/p95), 정확 검색(flat) 대비 recall@k를 측정합니다.
+    IVF 계열은 nprobe, HNSW 계열은 efSearch를 `SEARCH_PARAM_SWEEP` 값으로 바꿔 가며 재현율-지연 곡선을 만듭니다.
+    `vectors`는 색인할 float32 벡터, `queries`는 질의 임베딩 배열입니다.
+
+    `geo_retriever`(flat 인덱스의 GeoRetriever)와 `origins`(위도, 경도 배열)를 주면 위치가 있는 질의 경로
+    (`GeoRetriever.scored_documents`)도 인덱스 종류별로 측정하여 `<종류>@located` 항목으로 기록합니다.
+    이 경로는 반경 후보 벡터를 복원해 직접 점수를 매기므로 ANN 탐색(nprobe/efSearch)을 쓰지 않으며,
+    인덱스 종류는 복원 비용과 양자화 오차(flat 결과 대비 recall@k)로만 영향을 줍니다.
+    """
+    import faiss
+
+    if geo_retriever is not None:
+        located_args = [(query, lat, lon) for query, (lat, lon) in zip(queries, np.resize(origins, (len(queries), 2)))]
+        located_truth = [[doc.page_content for _, doc in geo_retriever.scored_documents(*args, k)]
+                         for args in located_args]
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    report = {}
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = build_faiss_index(vectors, index_type, index_options)
+        index.add(vectors)
+        build_ms = (time.perf_counter() - start) * 1000.0
+        size_mb = faiss.serialize_index(index).nbytes / 2 ** 20
+
+        if index_type.startswith("ivf"):
+            settings = [(f"{index_type}@nprobe={value}", {"nprobe": value}) for value in SEARCH_PARAM_SWEEP["nprobe"]]
+        elif index_type.startswith("hnsw"):
+            settings = [(f"{index_type}@ef={value}", {"ef_search": value}) for value in SEARCH_PARAM_SWEEP["ef_search"]]
+        else:
+            settings = [(index_type, {})]
+        for name, params in settings:
+            configure_index(index, **params)
+            _, found = index.search(queries, k)
+            recall = np.mean([len(set(row) & set(expected)) / k for row, expected in zip(found, truth)])
+            query_cycle = iter(np.tile(queries, (repeat // len(queries) + 2, 1)))
+            outcome = measure(lambda: index.search(next(query_cycle)[None, :], k), repeat=repeat, warmup=5,
+                              track_memory=False)
+            outcome.update({f"recall_at_{k}": round(float(recall), 4), "build_ms": round(build_ms, 1),
+                            "size_mb": round(size_mb, 3)})
+            report[name] = outcome
+            print(f"    {name:<18} recall@{k} {outcome[f'recall_at_{k}']:.3f}  p50 {outcome['p50_ms']:.4f} ms"
+                  f"  p95 {outcome['p95_ms']:.4f} ms  {size_mb:.2f} MB  생성 {build_ms:.0f} ms")
+
+        if geo_retriever is not None:  # 같은 문서/공간 인덱스에 인덱스만 바꾼 GeoRetriever
+            source = geo_retriever.vectorstore
+            located = GeoRetriever(FAISS(source.embeddings, index, source.docstore, source.index_to_docstore_id),
+                                   k=geo_retriever.k, radius_km=geo_retriever.radius_km,
+                                   spatial_index=geo_retriever.spatial_index)
+            found = [[doc.page_content for _, doc in located.scored_documents(*args, k)] for args in located_args]
+            recall = np.mean([len(set(row) & set(expected)) / max(len(expected), 1)
+                              for row, expected in zip(found, located_truth)])
+            args_cycle = iter(located_args * (repeat // len(located_args) + 2))
+            outcome = measure(lambda: located.scored_documents(*next(args_cycle), k), repeat=repeat, warmup=5,
+                              track_memory=False)
+            outcome.update({f"recall_at_{k}": round(float(recall), 4), "build_ms": round(build_ms, 1),
+                            "size_mb": round(size_mb, 3)})
+            report[f"{index_type}@located"] = outcome
+            print(f"    {index_type + '@located':<18} recall@{k} {outcome[f'recall_at_{k}']:.3f}"
+                  f"  p50 {outcome['p50_ms']:.4f} ms  p95 {outcome['p95_ms']:.4f} ms  (GeoRetriever.scored_documents)")
+    return report
+
+
+def bench_dataset(label, files, work_dir, args, rng):
+    """데이터셋 하나(파일 목록)에 대한 모든 단계를 측정합니다."""
+    heavy = args.repeat if label == "bundled" else max(1, args.repeat // 10)
+    results = {}
+
+    def record(stage, outcome):
+        results[stage] = outcome
+        summary = f"p50 {outcome['p50_ms']:.3f} ms, p95 {outcome['p95_ms']:.3f} ms" if "p50_ms" in outcome else outcome.get("skipped", "")
+        print(f"  {stage:<28} {summary}")
+
+    # --- 수집 / 스냅샷 ---
+    record("ingest_csv", measure(lambda: load_tour_dataset(files, workers=1), repeat=min(heavy, 5), warmup=0,
+                                 track_memory=not args.no_memory))
+    if len(files) > 1:  # 파일별 프로세스 풀 파싱 (작은 파일 몇 개는 프로세스 생성 비용이 더 클 수 있음)
+        record("ingest_csv_parallel", measure(lambda: load_tour_dataset(files, workers=os.cpu_count()),
+                                              repeat=min(heavy, 5), warmup=0, track_memory=False))
+    dataset, _ = load_tour_dataset(files)
+    snapshot_dir = os.path.join(work_dir, "snapshot")
+    record("snapshot_write", measure(lambda: write_tour_snapshot(dataset, files, snapshot_dir=snapshot_dir),
+                                     repeat=min(heavy, 5), warmup=0, track_memory=not args.no_memory))
+    record("snapshot_load", measure(lambda: load_tour_snapshot(files, snapshot_dir=snapshot_dir),
+                                    repeat=min(heavy, 5), warmup=1, track_memory=not args.no_memory))
+    n_rows = len(dataset)
+    results["rows"] = n_rows
+
+    # --- 조회 인덱스 생성 ---
+    record("spatial_index_build", measure(lambda: SpatialIndex.from_dataframe(dataset), repeat=min(heavy, 5), warmup=0,
+                                          track_memory=not args.no_memory))
+    record("name_index_build", measure(lambda: PlaceNameIndex.from_dataframe(dataset), repeat=min(heavy, 3), warmup=0,
+                                       track_memory=not args.no_memory))
+    record("lexical_index_build", measure(lambda: LexicalIndex.from_dataframe(dataset), repeat=min(heavy, 3), warmup=0,
+                                          track_memory=not args.no_memory))
+    spatial_index = SpatialIndex.from_dataframe(dataset)
+    place_index = PlaceNameIndex.from_dataframe(dataset)
+    lexical_index = LexicalIndex.from_dataframe(dataset)
+
+    origins = dataset[["위도", "경도"]].to_numpy()[rng.integers(0, n_rows, 64)]
+    origin_cycle = iter(np.tile(origins, (1000, 1)))
+    names = dataset["관광지명"].to_numpy()
+
+    # --- 이름 조회 / 거리 ---
+    exact_names = iter(names[rng.integers(0, n_rows, 100_000)])
+    record("name_lookup_exact", measure(lambda: place_index.lookup(next(exact_names)), repeat=args.repeat * 10,
+                                        track_memory=not args.no_memory))
+    fuzzy_names = iter([perturb_name(names[i], rng) for i in rng.integers(0, n_rows, args.repeat * 10 + 10)])
+    record("name_lookup_fuzzy", measure(lambda: place_index.lookup(next(fuzzy_names)), repeat=args.repeat * 10,
+                                        track_memory=not args.no_memory))
+    record("radius_query_30km", measure(lambda: spatial_index.query_radius(*next(origin_cycle), 30.0),
+                                        repeat=args.repeat * 5, track_memory=not args.no_memory))
+    lats, lons = dataset["위도"].to_numpy(), dataset["경도"].to_numpy()
+    record("distances_from_all", measure(lambda: distances_from(*next(origin_cycle), lats, lons), repeat=args.repeat,
+                                         track_memory=not args.no_memory))
+    sample = rng.integers(0, n_rows, 50)
+    record("distance_matrix_50", measure(lambda: distance_matrix(lats[sample], lons[sample]), repeat=args.repeat * 5,
+                                         track_memory=not args.no_memory))
+    record("lexical_search", measure(lambda: lexical_index.search(QUERIES[int(rng.integers(len(QUERIES)))], 30),
+                                     repeat=args.repeat * 5, track_memory=not args.no_memory))
+
+    # --- 답변 파싱 ---
+    answer = SAMPLE_ANSWER.format(name1=names[0], name2=names[min(1, n_rows - 1)])
+    record("parse_answer", measure(lambda: parse_answer(answer), repeat=args.repeat * 5, track_memory=not args.no_memory))
+
+    def stream_parse():
+        parser = IncrementalPlanParser()
+        for start in range(0, len(answer), 4):  # 토큰 크기와 비슷한 4글자 조각
+            parser.feed(answer[start:start + 4])
+        parser.close().to_dataframe()
+
+    record("stream_parse", measure(stream_parse, repeat=args.repeat * 5, track_memory=not args.no_memory))
+    json_answer = SAMPLE_JSON_ANSWER.format(name1=names[0], name2=names[min(1, n_rows - 1)])
+    record("parse_structured_answer", {
+        **measure(lambda: parse_structured_answer(json_answer).to_dataframe(), repeat=args.repeat * 5,
+                  track_memory=not args.no_memory),
+        "answer_tokens": estimate_tokens(json_answer), "markdown_answer_tokens": estimate_tokens(answer),
+    })
+    parsed = parse_answer(answer)
+    record("annotate_recommendations", measure(
+        lambda: annotate_recommendations(parsed.recommendation_lines, place_index, *origins[0]),
+        repeat=args.repeat * 5, track_memory=not args.no_memory))
+
+    # --- 벡터 인덱스 / 검색 / 전체 요청 ---
+    if n_rows > args.max_index_rows:
+        for stage in ("index_build", "index_load", "as_retriever_query", "geo_retrieve", "hybrid_retrieve",
+                      "sharded_retrieve", "context_assemble", "plan_itinerary", "engine_plan"):
+            record(stage, {"skipped": f"{n_rows} rows > --max-index-rows {args.max_index_rows}"})
+        return results
+
+    embeddings = HashEmbeddings()
+    build_count = iter(range(1000))
+
+    def fresh_index_path():
+        return (os.path.join(work_dir, f"index_build_{next(build_count)}"),)
+
+    def build_index(index_path):
+        sync_vectorstore(index_path, files, dataset_row_loader(dataset), embeddings, document_schema=DOCUMENT_SCHEMA,
+                         file_hashes=dataset.attrs.get(FILE_HASHES_ATTR))
+
+    record("index_build", measure(build_index, repeat=min(heavy, 3), warmup=0, setup=fresh_index_path,
+                                  track_memory=not args.no_memory))
+    index_path = os.path.join(work_dir, "index")
+    build_index(index_path)
+
+    def load_index():
+        return sync_vectorstore(index_path, files, dataset_row_loader(dataset), embeddings,
+                                document_schema=DOCUMENT_SCHEMA, file_hashes=dataset.attrs.get(FILE_HASHES_ATTR))[0]
+
+    record("index_load", measure(load_index, repeat=min(heavy, 5), warmup=1, track_memory=not args.no_memory))
+    vectorstore = load_index()
+
+    if args.index_report:  # 같은 벡터로 인덱스 종류별 재현율-지연 비교 (기준: flat 정확 검색)
+        print(f"  index types (k={args.report_k}, flat 대비 재현율)")
+        report_queries = QUERIES + [perturb_name(names[i], rng) for i in rng.integers(0, n_rows, 200)]
+        results["index_types"] = index_type_report(
+            vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal),
+            np.asarray(embeddings.embed_documents(report_queries), dtype=np.float32),
+            args.index_types, k=args.report_k, repeat=args.repeat * 10,
+            geo_retriever=GeoRetriever(vectorstore, k=8, radius_km=30.0), origins=origins,
+        )
+
+    query_cycle = iter(QUERIES * 1000)
+    as_retriever = vectorstore.as_retriever(search_kwargs={"k": 8})
+    record("as_retriever_query", measure(lambda: as_retriever.invoke(next(query_cycle)), repeat=args.repeat,
+                                         track_memory=not args.no_memory))
+    geo_retriever = GeoRetriever(vectorstore, k=8, radius_km=30.0)
+    record("geo_retrieve", measure(lambda: geo_retriever.retrieve(next(query_cycle), *next(origin_cycle)),
+                                   repeat=args.repeat, track_memory=not args.no_memory))
+    hybrid_retriever = HybridRetriever(geo_retriever, lexical_index, dataset["관광지ID"].tolist(), k=8)
+    record("hybrid_retrieve", measure(lambda: hybrid_retriever.retrieve(next(query_cycle), *next(origin_cycle)),
+                                      repeat=args.repeat, track_memory=not args.no_memory))
+    regions = region_keys(dataset)  # 지역 샤드: 주변 지역 샤드만 검색 (최초 로드 비용은 index_load와 별도)
+    shards = RegionShards(os.path.join(work_dir, "shards"), embeddings, retriever_options={"k": 8, "radius_km": 30.0})
+    shards.sync(files, dataset, regions, document_schema=DOCUMENT_SCHEMA, file_hashes=dataset.attrs.get(FILE_HASHES_ATTR))
+    sharded_retriever = ShardedGeoRetriever(shards, RegionResolver(spatial_index, regions), place_regions(dataset, regions))
+    record("sharded_retrieve", {
+        **measure(lambda: sharded_retriever.retrieve(next(query_cycle), *next(origin_cycle)), repeat=args.repeat,
+                  track_memory=not args.no_memory),
+        "shards": len(shards), "loaded_shards": len(shards.loaded_regions), **shards.stats,
+    })
+    retrieved = hybrid_retriever.retrieve(QUERIES[0], *origins[0], k=16)
+    budgeter = ContextBudgeter()
+    record("context_assemble", measure(lambda: budgeter(retrieved), repeat=args.repeat * 5,
+                                       track_memory=not args.no_memory))
+    places = places_from_documents(retrieved)
+    record("plan_itinerary", measure(lambda: plan_itinerary(places, *origins[0], 3), repeat=args.repeat * 5,
+                                     track_memory=not args.no_memory))
+
+    engine = TripEngine(files, index_path=index_path, snapshot_dir=snapshot_dir, embeddings=embeddings,
+                        llm=FakeListChatModel(responses=[answer]), llm_options={"requests_per_minute": None})
+    engine.warm_up()
+
+    def engine_plan():
+        lat, lon = next(origin_cycle)
+        engine.plan(build_chain_inputs(next(query_cycle), "30대", ["역사", "자연"], lat, lon, 2, 300000, 2),
+                    use_cache=False)
+
+    record("engine_plan", measure(engine_plan, repeat=args.repeat, track_memory=not args.no_memory))
+    return results
+
+
+def environment_info():
+    """결과 비교에 필요한 실행 환경 정보."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "embedding": HashEmbeddings().model,
+    }
+
+
+def compare_results(current, baseline, threshold):
+    """기준 결과 대비 p50이 `threshold`배를 넘게 느려진 (데이터셋, 단계, 비율) 리스트."""
+    regressions = []
+    for label, stages in current["datasets"].items():
+        for stage, outcome in stages.items():
+            base = baseline.get("datasets", {}).get(label, {}).get(stage)
+            if not isinstance(outcome, dict) or not isinstance(base, dict) or "p50_ms" not in outcome or "p50_ms" not in base:
+                continue
+            ratio = outcome["p50_ms"] / max(base["p50_ms"], 1e-6)
+            if ratio > threshold:
+                regressions.append((label, stage, round(ratio, 2)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="관광지 추천 파이프라인 벤치마크 (네트워크 불필요)")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="'bundled' 또는 합성 데이터셋 관광지 수")
+    parser.add_argument("--repeat", type=int, default=20, help="빠른 단계의 기본 반복 횟수")
+    parser.add_argument("--max-index-rows", type=int, default=100_000, help="이보다 큰 데이터셋은 벡터 인덱스 단계 생략")
+    parser.add_argument("--no-memory", action="store_true", help="tracemalloc 최대 메모리 측정 생략")
+    parser.add_argument("--output", help="결과 JSON 경로 (기본: benchmarks/results/bench-<시각>.json)")
+    parser.add_argument("--compare", help="비교할 기준 결과 JSON")
+    parser.add_argument("--threshold", type=float, default=1.2, help="회귀로 판단할 p50 비율")
+    parser.add_argument("--index-report", action="store_true", help="FAISS 인덱스 종류별 재현율/지연/크기 비교")
+    parser.add_argument("--index-types", nargs="+", default=list(INDEX_TYPES), choices=list(INDEX_TYPES),
+                        help="--index-report에서 비교할 인덱스 종류")
+    parser.add_argument("--report-k", type=int, default=10, help="--index-report의 recall@k")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    base_dataset, _ = load_tour_dataset(TOUR_CSV_FILES)
+    report = {"environment": environment_info(), "args": vars(args), "datasets": {}}
+
+    work_root = tempfile.mkdtemp(prefix="tour_bench_")
+    try:
+        for size in args.sizes:
+            label = "bundled" if size == "bundled" else f"synthetic_{int(size)}"
+            work_dir = os.path.join(work_root, label)
+            os.makedirs(work_dir)
+            if size == "bundled":
+                files = discover_tour_files(TOUR_CSV_FILES)
+            else:
+                files = [synthesize_csv(base_dataset, int(size), os.path.join(work_dir, f"synthetic_{size}.csv"), args.seed)]
+            print(f"[{label}]")
+            report["datasets"][label] = bench_dataset(label, files, work_dir, args, rng)
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"결과 저장: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare_results(report, json.load(f), args.threshold)
+        for label, stage, ratio in regressions:
+            print(f"[회귀] {label} / {stage}: p50 {ratio}배")
+        if regressions:
+            sys.exit(1)
+        print("기준 대비 회귀 없음")
+
+
+if __name__ == "__main__":
+    main()
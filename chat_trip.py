@@ -1,23 +1,21 @@
 import streamlit as st
 from streamlit_geolocation import streamlit_geolocation
 import pandas as pd
-from math import radians, sin, cos, sqrt, atan2
 import os
 import re
-import glob
+import uuid
 import io
 
 # Langchain 관련 import
-from langchain.chains.retrieval import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain_community.document_loaders import CSVLoader
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
 
+from tour_answer import IncrementalPlanParser
+from tour_cache import ResponseCache
+from tour_data import TOUR_CSV_FILES, discover_tour_files
+from tour_engine import TripEngine, TripEngineError, build_chain_inputs
+from tour_history import MAX_CONVERSATIONS, ConversationStore
+from tour_trace import METRICS_PATH, MetricsRecorder, trace_attribute, trace_stage, tracing
+
 # .env 파일 로드 (로컬 개발 시 사용. Streamlit Cloud에서는 Secrets 사용 권장)
 load_dotenv()
 
@@ -260,23 +258,18 @@ st.markdown(
 
 # --- 파일 경로 정의 (상수) ---
 # GitHub 저장소에 업로드할 때 이 경로가 올바르게 설정되어 있어야 합니다.
-VECTOR_DB_PATH = "faiss_tourist_attractions"
-
-# 로드할 개별 관광지 CSV 파일 목록을 직접 지정합니다.
-# 이 파일들은 GitHub 저장소의 앱 스크립트와 동일한 위치 또는 지정된 상대 경로에 있어야 합니다.
-TOUR_CSV_FILES = [
-    "./경기도역사관광지현황.csv",
-    "./경기도자연관광지현황.csv",
-    "./경기도체험관광지현황.csv",
-    "./경기도테마관광지현황.csv",
-    "./관광지정보현황(제공표준).csv",
-    "./관광지현황.csv",
-    # 필요에 따라 다른 CSV 파일들을 여기에 추가하세요.
-]
+# 벡터스토어 저장 폴더(VECTOR_DB_PATH)는 tour_engine.py에서 지정합니다.
+
+# 로드할 관광지 CSV 파일/폴더/glob 패턴 목록(TOUR_CSV_FILES)은 tour_data.py에서 지정합니다.
+HISTORY_PAGE_SIZE = 10  # 사이드바에 한 번에 표시할 이전 대화 수
 
 # --- 초기 파일 존재 여부 확인 ---
-# 앱 시작 전 필수 데이터 파일의 존재 여부를 확인합니다.
-for f_path in TOUR_CSV_FILES:  # 필수 관광지 CSV 파일 존재 여부 확인
+# 앱 시작 전 필수 데이터 파일의 존재 여부를 확인합니다. (폴더/패턴은 찾은 CSV 파일 목록으로 펼쳐서 확인)
+tour_csv_paths = discover_tour_files(TOUR_CSV_FILES)
+if not tour_csv_paths:  # 패턴에 맞는 파일이 하나도 없으면
+    st.error(f"관광지 CSV 파일을 찾을 수 없습니다: {TOUR_CSV_FILES}. 경로를 확인해주세요. (Streamlit Cloud에서는 해당 파일들이 Git 리포지토리에 포함되어야 합니다.)")
+    st.stop()
+for f_path in tour_csv_paths:  # 필수 관광지 CSV 파일 존재 여부 확인
     if not os.path.exists(f_path):  # 파일 존재하지 않으면
         st.error(f"필수 데이터 파일 '{f_path}'을(를) 찾을 수 없습니다. 경로를 확인해주세요. (Streamlit Cloud에서는 해당 파일들이 Git 리포지토리에 포함되어야 합니다.)")  # 에러 메시지 출력
         st.stop()  # 파일이 없으면 앱 실행 중지
@@ -298,122 +291,62 @@ def setup_environment():  # 환경 설정 함수
         return api_key  # 키 반환 또는 None
 
 
-# --- 2. 데이터 로드 및 전처리 함수 ---
+# --- 2. 추천 엔진 로드 ---
 
-@st.cache_data  # 캐시 사용
-def load_specific_tour_data(file_paths_list):  # 관광지 CSV 파일들 로드 함수
+@st.cache_resource  # 엔진(데이터셋, 인덱스, 벡터스토어, 체인, 답변 캐시)은 프로세스의 모든 세션이 공유
+def get_trip_engine(tour_csv_files_list):  # 관광지 추천 엔진 생성 함수
     """
-    지정된 CSV 파일 목록을 로드하고, 모든 파일에 CP949 인코딩을 적용하여 병합합니다.
-    '위도', '경도', '관광지명', '소재지도로명주소' 컬럼을 필수로 추출합니다.
+    `tour_engine.TripEngine`을 생성하고 데이터/벡터스토어/체인을 미리 준비합니다.
+    데이터 로드, 증분 색인, 검색, 답변 생성, 후처리는 모두 엔진이 담당하고 이 앱은 화면 표시만 합니다.
+    답변 캐시는 질문 + 프로필 + 위치 격자 칸(5km)을 키로 합니다 (TTL 24시간, LRU 2000개, 유사 질문 재사용).
+    요청별 단계 소요 시간/토큰 추적은 `TOUR_METRICS_PATH`(기본 tour_metrics.jsonl)에 기록되고,
+    `TOUR_METRICS_PORT`를 지정하면 해당 포트의 /metrics에서 Prometheus 형식으로 조회할 수 있습니다.
+    벡터/공간 인덱스는 메모리 매핑으로 열리므로 같은 서버의 여러 워커가 페이지를 공유합니다. 배포 시 워커보다 먼저
+    `python tour_engine.py --warm-up`을 실행해 두면 스냅샷/인덱스가 준비되어 각 워커의 첫 요청이 빨라집니다.
+    `TOUR_INDEX_TYPE`(sq8, ivfpq, hnsw 등)을 지정하면 메모리가 적은 근사 FAISS 인덱스를 사용합니다 (기본 flat).
+    위치가 있는 질의는 반경 후보를 전수 비교하므로 근사 인덱스로 빨라지지 않고 메모리만 줄어듭니다.
+    `TOUR_OUTPUT_FORMAT=json`이면 답변을 스키마가 지정된 JSON으로 받아 파싱 없이 바로 계획표를 만듭니다.
+    `TOUR_GENERATION_MODE=parallel`이면 추천 관광지와 일차별 일정을 동시에 생성합니다 (`TOUR_FAST_MODEL`로 추천 부분 모델 지정).
+    `TOUR_SHARD_BY_REGION=1`이면 벡터스토어를 지역(시군)별 샤드로 나누어 사용자 주변 샤드만 불러옵니다.
     """
-    combined_df = pd.DataFrame()  # 빈 데이터프레임 생성
-
-    if not file_paths_list:  # 파일 리스트 없을 경우
+    if not tour_csv_files_list:  # 파일 리스트 없을 경우
         st.error("로드할 관광지 CSV 파일 경로가 지정되지 않았습니다. `TOUR_CSV_FILES`를 확인해주세요.")
         st.stop()
 
-    for file_path in file_paths_list:  # 각 파일에 대해
-        if not os.path.exists(file_path):  # 파일이 없으면
-            st.warning(f"'{file_path}' 파일을 찾을 수 없어 건너뜁니다. (Streamlit Cloud에서는 해당 파일들이 Git 리포지토리에 포함되어야 합니다.)")
-            continue
-
-        current_encoding = 'cp949'  # CP949 인코딩 사용
-
-        try:
-            df = pd.read_csv(file_path, encoding=current_encoding)  # CSV 파일 읽기
-            df.columns = df.columns.str.strip()  # 컬럼명 공백 제거
-
-            if "위도" not in df.columns or "경도" not in df.columns:  # 필수 컬럼 확인
-                st.warning(f"'{os.path.basename(file_path)}' 파일은 '위도', '경도' 컬럼이 없어 건너뜁니다.")
-                continue
-
-            name_col = None
-            for candidate in ["관광지명", "관광정보명", "관광지"]:
-                if candidate in df.columns:
-                    name_col = candidate
-                    break
-            df["관광지명"] = df[name_col] if name_col else "이름 없음"
-
-            address_col = None
-            for candidate in ["정제도로명주소", "정제지번주소", "소재지도로명주소", "소재지지번주소", "관광지소재지지번주소", "관광지소재지도로명주소"]:
-                if candidate in df.columns:
-                    address_col = candidate
-                    break
-            df["소재지도로명주소"] = df[address_col] if address_col else "주소 없음"
-
-            combined_df = pd.concat([combined_df, df[["위도", "경도", "관광지명", "소재지도로명주소"]]], ignore_index=True)
-
-        except Exception as e:
-            st.warning(f"'{os.path.basename(file_path)}' 파일 ({current_encoding} 인코딩 시도) 처리 중 오류 발생: {e}")
-
-    if combined_df.empty:
-        st.error("지정된 파일들에서 유효한 관광지 데이터를 불러오지 못했습니다. `TOUR_CSV_FILES`와 파일 내용을 확인해주세요.")
+    metrics = MetricsRecorder(os.getenv("TOUR_METRICS_PATH", METRICS_PATH))
+    if os.getenv("TOUR_METRICS_PORT"):  # Prometheus 수집용 엔드포인트 (선택)
+        metrics.serve(int(os.getenv("TOUR_METRICS_PORT")))
+    engine = TripEngine(tour_csv_files_list, metrics=metrics)
+    # 유사 질문 비교에는 엔진의 임베딩 클라이언트를 그대로 사용 (클라이언트/임베딩 캐시 연결을 따로 만들지 않음)
+    engine.response_cache = ResponseCache(embeddings=engine.embeddings, similarity_threshold=0.95)
+    try:
+        engine.warm_up()
+    except TripEngineError as e:
+        st.error(f"{e} `TOUR_CSV_FILES`와 파일 내용을 확인해주세요.")
         st.stop()
 
-    combined_df.dropna(subset=['위도', '경도'], inplace=True)
-    return combined_df
-
-
-# --- 벡터스토어 로딩 및 캐싱 ---
-@st.cache_resource  # 벡터스토어 생성을 캐시 (Streamlit 재실행 시 재사용)
-def load_and_create_vectorstore_from_specific_files(tour_csv_files_list):  # 지정된 CSV 파일로부터 벡터스토어 생성
-    """지정된 CSV 파일 목록을 사용하여 벡터스토어를 생성합니다."""
-    all_city_tour_docs = []  # 모든 관광지 문서를 저장할 리스트
-
-    for file_path in tour_csv_files_list:  # 각 파일 경로에 대해
-        if not os.path.exists(file_path):  # 파일이 존재하지 않으면
-            st.warning(f"벡터스토어 생성을 위해 '{file_path}' 파일을 찾을 수 없어 건너뜁니다.")  # 경고 출력
-            continue
-
-        current_encoding = 'cp949'  # CP949 인코딩 사용
+    for message in engine.load_warnings:  # 건너뛴 파일 안내
+        st.warning(message)
+    stats = engine.index_stats
+    if stats["changed_files"]:  # 변경분이 반영되었으면 안내
+        st.info(f"관광지 데이터 변경 반영: 행 {stats['added_rows']}개 추가, {stats['removed_rows']}개 삭제 (임베딩 {stats['embedded_chunks']}건)")
+    return engine
 
-        try:
-            city_tour_loader = CSVLoader(file_path=file_path, encoding=current_encoding, csv_args={'delimiter': ','})  # CSV 로더 생성
-            all_city_tour_docs.extend(city_tour_loader.load())  # 문서 로드 및 추가
-        except Exception as e:  # 예외 발생 시
-            st.warning(f"'{os.path.basename(file_path)}' 파일 ({current_encoding} 인코딩 시도) 로드 중 오류 발생 (벡터스토어): {e}")  # 경고 출력
-
-    all_documents = all_city_tour_docs  # 전체 문서 저장
-
-    if not all_documents:  # 문서가 비어 있으면
-        st.error("벡터스토어를 생성할 문서가 없습니다. CSV 파일 경로와 내용을 확인해주세요.")  # 에러 출력 후 중단
-        st.stop()
-
-    # 텍스트 분할 및 임베딩 생성
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=250, chunk_overlap=50)  # 텍스트 분할기 설정
-    docs = text_splitter.split_documents(all_documents)  # 문서 분할
-    embeddings = OpenAIEmbeddings()  # OpenAI 임베딩 사용
-    vectorstore = FAISS.from_documents(docs, embeddings)  # FAISS 벡터스토어 생성
-    vectorstore.save_local(VECTOR_DB_PATH)  # 로컬에 벡터스토어 저장
-    return vectorstore  # 벡터스토어 반환
-
-@st.cache_resource()  # 벡터스토어 캐시 로딩 함수
-def get_vectorstore_cached(tour_csv_files_list):  # 벡터스토어를 캐시에서 불러오거나 새로 생성
-    """캐시된 벡터스토어를 로드하거나 새로 생성합니다."""
-    if os.path.exists(VECTOR_DB_PATH):  # 기존 벡터 DB가 존재하면
-        try:
-            return FAISS.load_local(  # 벡터 DB 로드 시도
-                VECTOR_DB_PATH,
-                OpenAIEmbeddings(),
-                allow_dangerous_deserialization=True  # 최신 LangChain 버전에서 필요
-            )
-        except Exception as e:  # 로딩 실패 시
-            st.warning(f"기존 벡터 DB 로딩 실패: {e}. 새로 생성합니다.")  # 경고 출력
-            return load_and_create_vectorstore_from_specific_files(tour_csv_files_list)  # 새로 생성
-    else:
-        return load_and_create_vectorstore_from_specific_files(tour_csv_files_list)  # 존재하지 않으면 새로 생성
 
-# --- Haversine 거리 계산 함수 ---
-def haversine(lat1, lon1, lat2, lon2):  # 두 지점 간 거리 계산 함수
-    """두 위도/경도 지점 간의 거리를 킬로미터 단위로 계산합니다 (하버사인 공식)."""
-    R = 6371  # 지구 반지름 (킬로미터)
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])  # 각도를 라디안으로 변환
-    dlon = lon2 - lon1  # 경도 차이
-    dlat = lat2 - lat1  # 위도 차이
-    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2  # 하버사인 공식 부분
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))  # 중심각 계산
-    distance = R * c  # 거리 계산
-    return distance  # 결과 반환
+def get_conversation_store(session_id=None):  # 세션별 대화 기록 저장소
+    """
+    현재 세션의 대화 기록 저장소(최근 `TOUR_HISTORY_MAX`개, 기본 50개)를 반환합니다.
+    세션 키는 서버 측 세션 상태에만 두고 URL에는 기록하지 않습니다 (공유된 주소로 대화 내용과 위치가 노출되지 않도록).
+    `TOUR_HISTORY_DB`에 SQLite 파일 경로를 지정하면 세션 키별로 기록을 저장하며, 새로고침이나 앱 재시작 후에는
+    사이드바의 복원 키를 입력해 이전 대화를 불러옵니다. `session_id`를 주면 해당 키의 저장소로 바꿉니다.
+    """
+    if session_id or "conversation_store" not in st.session_state:
+        st.session_state.conversation_store = ConversationStore(
+            session_id or uuid.uuid4().hex,
+            max_conversations=int(os.getenv("TOUR_HISTORY_MAX", MAX_CONVERSATIONS)),
+            path=os.getenv("TOUR_HISTORY_DB"),
+        )
+    return st.session_state.conversation_store
 
 
 # --- 3. 사용자 입력 및 UI 로직 함수 ---
@@ -474,76 +407,55 @@ def get_user_inputs_ui():  # 사용자 입력 UI 구성 함수
 
     return age, travel_style, user_lat_final, user_lon_final, trip_duration_days, estimated_budget, num_travelers, special_requests  # 입력값 반환
 
-# --- 4. 추천 로직 함수 (Langchain API 변경: create_retrieval_chain 사용) (프롬프트 수정) ---
-@st.cache_resource  # 추천 체인 캐시
-def get_qa_chain(_vectorstore):  # QA 체인 생성 함수
+def show_nearby_attractions_ui(tour_data_df, spatial_index, user_lat, user_lon):  # 주변 관광지 표시 UI 함수
+    """공간 인덱스로 사용자 위치 반경 내 관광지를 찾아 거리순으로 표시합니다 (LLM 호출 없음)."""
+    with st.expander("📍 내 주변 관광지 바로 보기"):
+        radius_km = st.slider("검색 반경 (km)", min_value=1, max_value=100, value=30, key="nearby_radius_km")  # 반경 선택
+        positions, distances = spatial_index.query_radius(user_lat, user_lon, radius_km)  # 반경 검색
+        if len(positions) == 0:
+            st.info(f"반경 {radius_km}km 이내에 등록된 관광지가 없습니다.")
+            return
+        nearby_df = tour_data_df.iloc[positions][["관광지명", "소재지도로명주소"]].copy()  # 검색된 관광지 행
+        nearby_df["거리(km)"] = distances.round(2)  # 사용자 위치 기준 거리
+        st.caption(f"반경 {radius_km}km 이내 관광지 {len(nearby_df)}곳 (가까운 순)")
+        st.dataframe(nearby_df.reset_index(drop=True), use_container_width=True)
+
+
+# --- 4. 답변 표시 함수 ---
+def stream_answer_ui(qa_chain, chain_inputs, structured=False):  # 스트리밍 답변 표시 함수
     """
-    LangChain을 사용하여 질문-답변 체인(QA Chain)을 생성하고 캐시합니다.
-    이 체인은 사용자의 입력과 검색된 문서를 기반으로 답변을 생성합니다.
+    검색 체인의 답변을 토큰 단위로 받아 추천 관광지 부분은 바로 표시하고,
+    '상세 여행 계획' 표는 행이 완성될 때마다 증분 파싱하여 표로 갱신합니다. 완성된 답변 텍스트를 반환합니다.
+    `structured=True`(JSON 답변 형식)이면 완성 전의 JSON은 표시하지 않고 진행 상황만 보여줍니다.
     """
-    llm = ChatOpenAI(model_name="gpt-4o", temperature=0.7)  # GPT-4o LLM 인스턴스 생성 (온도 0.7)
-
-    qa_prompt = PromptTemplate.from_template(
-        """
-당신은 사용자 위치 기반 여행지 추천 및 상세 여행 계획 수립 챗봇입니다.
-사용자의 나이대, 여행 성향, 현재 위치 정보, 그리고 다음의 추가 정보를 참고하여 사용자가 입력한 질문에 가장 적합한 관광지를 추천하고, 이를 바탕으로 상세한 여행 계획을 수립해 주세요.
-**관광지 추천 시 사용자 위치로부터의 거리는 시스템이 자동으로 계산하여 추가할 것이므로, 답변에서 거리를 직접 언급하지 마십시오.**
-특히, 사용자의 현재 위치({user_lat}, {user_lon})에서 가까운 장소들을 우선적으로 고려하여 추천하고 사용자가 선택한 성향에 맞게 추천해주세요.
-
-[관광지 데이터]
-{context}
-
-[사용자 정보]
-나이대: {age}
-여행 성향: {travel_style}
-현재 위치 (위도, 경도): {user_lat}, {user_lon}
-여행 기간: {trip_duration_days}일
-예상 예산: {estimated_budget}원
-여행 인원: {num_travelers}명
-특별 고려사항: {special_requests}
-
-[사용자 질문]
-{input}
-
-다음 지침에 따라 상세한 여행 계획을 세워주세요:
-1.  **관광지 추천:** 질문에 부합하고, 사용자 위치에서 가까운 1~3개의 주요 관광지를 추천하고, 각 관광지에 대한 다음 정보를 제공하세요.
-    * 관광지 이름: [관광지명]
-    * 주소: [주소]
-    * 주요 시설/특징: [정보]
-    **[참고: 사용자 위치 기준 거리는 시스템이 자동으로 계산하여 추가할 것이므로, 이 항목은 제외합니다.]**
-    
-2.  **추천된 관광지를 포함하여, 사용자 정보와 질문에 기반한 {trip_duration_days}일간의 상세 여행 계획을 일자별로 구성해 주세요.**
-    * 각 날짜별로 방문할 장소(식당, 카페, 기타 활동 포함), 예상 시간, 간단한 활동 내용을 포함하세요.
-    * 예산을 고려하여 적절한 식사 장소나 활동을 제안할 수 있습니다.
-    * 이동 경로(예: "도보 15분", "버스 30분")를 간략하게 언급해 주세요.
-    * 계획은 명확하고 이해하기 쉽게 작성되어야 합니다.
-
-[답변 예시]
-**추천 관광지:**
-- 관광지 이름: [관광지명 1]
-  - 주소: [주소 1]
-  - 주요 시설/특징: [정보 1]
-- 관광지 이름: [관광지명 2]
-  - 주소: [주소 2]
-  - 주요 시설/특징: [정보 2]
-
-**상세 여행 계획 ({trip_duration_days}일):**
-다음 표 형식으로 일자별 상세 계획을 작성해 주세요. 컬럼명은 '일차', '시간', '활동', '예상 장소', '이동 방법'으로 해주세요.
-| 일차 | 시간 | 활동 | 예상 장소 | 이동 방법 |
-|---|---|---|---|---|
-| 1일차 | 오전 (9:00 - 12:00) | [활동 내용] | [장소명] | [이동 방법] |
-| 1일차 | 점심 (12:00 - 13:00) | [식사] | [식당명] | - |
-| 1일차 | 오후 (13:00 - 17:00) | [활동 내용] | [장소명] | [이동 방법] |
-| 1일차 | 저녁 (17:00 이후) | [활동 내용] | [장소명 또는 자유 시간] | - |
-| 2일차 | ... | ... | ... | ... |
-**중요: '일차' 컬럼의 경우, 같은 일차의 여러 활동이 있을 경우 첫 번째 활동에만 해당 '일차'를 명시하고, 나머지 활동 행의 '일차' 셀은 비워두세요 (예: "| | 시간 | 활동 | 예상 장소 | 이동 방법 |"). 이렇게 해야 표에서 '일차'가 자동으로 병합되어 보입니다.**
-"""
-    )
-    document_chain = create_stuff_documents_chain(llm, qa_prompt)
-    retriever = _vectorstore.as_retriever(search_kwargs={"k": 15})  # 상위 15개 문서 검색
-    retrieval_chain = create_retrieval_chain(retriever, document_chain)
-
-    return retrieval_chain
+    st.subheader("💡 답변 (생성 중):")
+    text_placeholder = st.empty()  # 추천 관광지 텍스트 영역
+    table_placeholder = st.empty()  # 여행 계획표 영역
+    parser = IncrementalPlanParser()
+    answer_parts = []
+    shown_rows = 0  # 표에 마지막으로 표시한 행 수
+
+    for chunk in qa_chain.stream(chain_inputs):
+        token = chunk.get("answer")
+        if not token:
+            continue  # 검색 결과(context) 등 답변 외 조각
+        answer_parts.append(token)
+        if structured:  # JSON은 끝까지 받은 뒤 한 번에 검증/표시
+            text_placeholder.caption(f"여행 계획 생성 중... ({sum(map(len, answer_parts))}자)")
+            continue
+        parser.feed(token)
+        if not parser.in_plan_section:
+            text_placeholder.markdown(parser.recommendation_text + " ▌")  # 커서 표시와 함께 갱신
+        elif len(parser.rows) > shown_rows:  # 새 행이 완성되었을 때만 표 갱신
+            shown_rows = len(parser.rows)
+            table_placeholder.dataframe(parser.to_dataframe(), use_container_width=True)
+
+    parser.close()
+    if structured:
+        text_placeholder.empty()  # 완성된 답변은 후처리 후 아래 답변 영역에 표시
+    else:
+        text_placeholder.markdown(parser.recommendation_text)
+    return "".join(answer_parts)
 
 # --- 5. 메인 앱 실행 로직 ---
 if __name__ == "__main__":
@@ -556,11 +468,13 @@ if __name__ == "__main__":
     if "app_started" not in st.session_state:
         st.session_state.app_started = False
     
-    # 세션 상태 초기화 및 이전 대화 기록 관리
-    if "conversations" not in st.session_state:
-        st.session_state.conversations = []
+    # 세션 상태 초기화 및 이전 대화 기록 관리 (최대 개수 제한, 선택 시 SQLite 저장)
+    conversation_store = get_conversation_store()
+    if "selected_conversation_id" not in st.session_state:
         st.session_state.current_input = ""
-        st.session_state.selected_conversation_index = None
+        st.session_state.selected_conversation_id = None
+        st.session_state.history_page = 0  # 사이드바 대화 목록 페이지 (0 = 최신)
+        st.session_state.last_processed = None  # (대화 ID, 후처리 결과): 방금 생성한 답변의 후처리 재사용
     
     # 이전 messages 상태가 남아있을 경우 삭제 (LangChain 챗봇 메시지와 혼동 방지)
     if "messages" in st.session_state:
@@ -599,10 +513,8 @@ if __name__ == "__main__":
     else:  # 앱 시작 플래그가 True인 경우 챗봇 화면 표시
         st.title("🗺️ 위치 기반 관광지 추천 및 여행 계획 챗봇")
         
-        # 벡터스토어 및 관광지 데이터 로드
-        vectorstore = get_vectorstore_cached(TOUR_CSV_FILES)
-        tour_data_df = load_specific_tour_data(TOUR_CSV_FILES)
-        qa_chain = get_qa_chain(vectorstore)
+        # 추천 엔진 로드 (관광지 데이터, 공간/이름 인덱스, 벡터스토어, 검색 체인)
+        engine = get_trip_engine(TOUR_CSV_FILES)
 
         # 사용자 입력 UI 호출
         (
@@ -612,228 +524,194 @@ if __name__ == "__main__":
 
         # 입력값이 모두 유효할 때만 질문 입력 UI 표시 및 답변 생성
         if user_lat is not None and user_lon is not None:
+            show_nearby_attractions_ui(engine.dataset, engine.spatial_index, user_lat, user_lon)  # 주변 관광지 즉시 조회
+
             user_question = st.text_input("여행에 대해 궁금한 점을 입력하세요.", key="user_question_input")
             
+            stream_mode = st.toggle("⚡ 답변 실시간 표시 (스트리밍)", value=True, key="stream_mode_toggle")  # 스트리밍 모드 선택
+
             if st.button("질문하기"):
                 if user_question.strip() == "":
                     st.warning("질문 내용을 입력해 주세요.")
                 else:
-                    with st.spinner("AI가 여행 계획을 분석 중입니다..."):
-                        # 예: 추가 컨텍스트를 프롬프트에 포함할 수도 있습니다.
-                        context = f"나이대: {age}, 여행 스타일: {', '.join(travel_style)}, 위치: ({user_lat:.7f}, {user_lon:.7f}), 여행 기간: {trip_duration}일, 예산: {budget}원, 인원: {num_travelers}명, 특이사항: {special_requests}"
-                        query = f"{context}\n\n사용자 질문: {user_question}"
-
-                        # QA 체인 실행
-                        try:
-                            # LangChain의 invoke 메서드는 딕셔너리 형태로 인풋을 받습니다.
-                            response = qa_chain.invoke({"input": user_question, 
-                                                         "age": age, 
-                                                         "travel_style": ', '.join(travel_style), 
-                                                         "user_lat": user_lat, 
-                                                         "user_lon": user_lon, 
-                                                         "trip_duration_days": trip_duration, 
-                                                         "estimated_budget": budget, 
-                                                         "num_travelers": num_travelers, 
-                                                         "special_requests": special_requests})
-                            answer = response['answer']
-                        except Exception as e:
-                            st.error(f"AI 응답 생성 중 오류가 발생했습니다: {e}")
-                            answer = "죄송합니다. 답변을 생성하는 데 문제가 발생했습니다."
-                            
-                        # 대화 기록에 추가
-                        st.session_state.conversations.append({
-                            "question": user_question,
-                            "answer": answer,
-                            "user_lat": user_lat, # 현재 대화의 위도 저장
-                            "user_lon": user_lon, # 현재 대화의 경도 저장
-                            "travel_style_selected": ', '.join(travel_style) if travel_style else '특정 없음', # 선택된 여행 스타일 저장
-                            "trip_duration": trip_duration,
-                            "budget": budget,
-                            "num_travelers": num_travelers,
-                            "special_requests": special_requests
-                        })
-                        # 새로 생성된 답변이 가장 최근 것이므로 자동으로 선택
-                        st.session_state.selected_conversation_index = len(st.session_state.conversations) - 1
-                        st.rerun() # 화면 갱신하여 새 답변 표시
+                    # LangChain 체인은 딕셔너리 형태로 인풋을 받습니다.
+                    chain_inputs = build_chain_inputs(user_question, age, travel_style, user_lat, user_lon,
+                                                      trip_duration, budget, num_travelers, special_requests)
+
+                    response_cache = engine.response_cache
+                    with tracing(name="chat", stream=stream_mode) as trace:  # 단계별 소요 시간/토큰 수 기록
+                        with trace_stage("cache_lookup"):
+                            answer = response_cache.get(chain_inputs)  # 같은(또는 매우 유사한) 질문/프로필/위치의 답변 재사용
+                        trace_attribute("cached", answer is not None)
+                        if answer is not None:
+                            st.toast("이전에 생성된 답변을 재사용했습니다. (캐시 적중)")
+                        elif stream_mode:  # 토큰이 도착하는 대로 표시
+                            try:
+                                answer = stream_answer_ui(engine.get_qa_chain(), chain_inputs, engine.structured_output)
+                                with trace_stage("cache_store"):
+                                    response_cache.put(chain_inputs, answer)
+                            except Exception as e:
+                                st.error(f"AI 응답 생성 중 오류가 발생했습니다: {e}")
+                                answer = "죄송합니다. 답변을 생성하는 데 문제가 발생했습니다."
+                                trace_attribute("error", type(e).__name__)
+                        else:
+                            with st.spinner("AI가 여행 계획을 분석 중입니다..."):
+                                # QA 체인 실행
+                                try:
+                                    answer, _ = engine.generate(chain_inputs, use_cache=False)  # 캐시는 위에서 이미 확인 (생성 후 저장)
+                                except Exception as e:
+                                    st.error(f"AI 응답 생성 중 오류가 발생했습니다: {e}")
+                                    answer = "죄송합니다. 답변을 생성하는 데 문제가 발생했습니다."
+                                    trace_attribute("error", type(e).__name__)
+                        processed_answer = engine.postprocess(answer, user_lat, user_lon)  # 거리 계산, 계획표 파싱 (표시할 때 재사용)
+
+                    # 대화 기록에 추가 (최대 개수를 넘으면 가장 오래된 대화 제거)
+                    conversation = conversation_store.add(
+                        user_question,
+                        answer,
+                        user_lat=user_lat,  # 현재 대화의 위도 저장
+                        user_lon=user_lon,  # 현재 대화의 경도 저장
+                        travel_style=', '.join(travel_style),  # 선택된 여행 스타일 저장
+                        trip_duration=trip_duration,
+                        budget=budget,
+                        num_travelers=num_travelers,
+                        special_requests=special_requests,
+                        trace=engine.record_trace(trace),  # 단계별 소요 시간(ms), 토큰/문서 수
+                    )
+                    # 새로 생성된 답변이 가장 최근 것이므로 자동으로 선택
+                    st.session_state.selected_conversation_id = conversation.conv_id
+                    st.session_state.last_processed = (conversation.conv_id, processed_answer)
+                    st.session_state.history_page = 0
+                    st.rerun() # 화면 갱신하여 새 답변 표시
 
         # 사이드바: 이전 대화 기록 관리
         with st.sidebar:
             st.subheader("💡 이전 대화")
-            if st.session_state.conversations:
-                # 최신 대화를 먼저 보여주기 위해 역순으로 반복
-                for i, conv in enumerate(reversed(st.session_state.conversations)):
-                    original_index = len(st.session_state.conversations) - 1 - i
-                    
-                    # 대화 미리보기 텍스트 생성
-                    preview_text = ""
-                    if 'travel_style_selected' in conv and conv['travel_style_selected'] and conv['travel_style_selected'] != '특정 없음':
-                        preview_text += f"성향: {conv['travel_style_selected']}"
-                    
-                    # 질문 내용 추가, 너무 길면 잘라냄
-                    # 'user_query' 대신 'question' 사용
-                    if 'question' in conv and conv['question'].strip():
-                        query_preview = conv['question'].strip()
-                        if len(query_preview) > 20:
-                            query_preview = query_preview[:17] + '...'
-                        if preview_text: # 성향 정보가 있다면 줄바꿈
-                            preview_text += f"\n질문: {query_preview}"
-                        else:
-                            preview_text = f"질문: {query_preview}"
-                    
-                    if not preview_text: # 둘 다 없으면 기본 텍스트
-                        preview_text = f"대화 {original_index + 1}"
-                        
-                    # 버튼 생성
-                    if st.button(preview_text, key=f"sidebar_conv_{original_index}"):
-                        st.session_state.selected_conversation_index = original_index
+            if len(conversation_store):
+                # 최신 대화부터 한 페이지만 버튼으로 표시 (전체 기록을 매번 그리지 않음)
+                page_count = conversation_store.page_count(HISTORY_PAGE_SIZE)
+                page = min(st.session_state.history_page, page_count - 1)
+                for conv in conversation_store.page(page, HISTORY_PAGE_SIZE):
+                    if st.button(conv.preview(), key=f"sidebar_conv_{conv.conv_id}"):
+                        st.session_state.selected_conversation_id = conv.conv_id
                         st.rerun() # 선택된 대화로 화면 업데이트
+
+                if page_count > 1:  # 페이지 이동
+                    prev_col, info_col, next_col = st.columns([1, 2, 1])
+                    if prev_col.button("◀", key="history_prev_page", disabled=page == 0):
+                        st.session_state.history_page = page - 1
+                        st.rerun()
+                    info_col.caption(f"{page + 1} / {page_count} 페이지 (최근 {len(conversation_store)}개)")
+                    if next_col.button("▶", key="history_next_page", disabled=page >= page_count - 1):
+                        st.session_state.history_page = page + 1
+                        st.rerun()
             else:
                 st.info("이전 대화가 없습니다.")
             
+            # 답변 캐시 적중/미적중 통계 (격자 크기 등 튜닝용)
+            with st.expander("📊 답변 캐시 통계"):
+                response_cache = engine.response_cache
+                st.write({**response_cache.stats, "저장 항목 수": len(response_cache), "적중률": f"{response_cache.hit_rate():.1%}"})
+
+            # LLM 호출 게이트웨이 통계 (동시성/속도 제한, 재시도, 동일 요청 병합)
+            with st.expander("🚦 LLM 호출 통계"):
+                gateway = engine.llm_gateway  # 체인을 만들기 전(첫 질문 전)에는 None
+                if gateway is not None:
+                    st.write(gateway.stats)
+                else:
+                    st.info("아직 LLM 호출이 없습니다.")
+
+            # 디버그 패널: 대화별 단계 소요 시간과 전체 요청의 단계별 p50/p95
+            debug_mode = st.toggle("🛠️ 디버그 패널", value=False, key="debug_panel_toggle")
+            if debug_mode:
+                with st.expander("⏱️ 단계별 지연 시간 (최근 요청)", expanded=True):
+                    stage_summary = engine.metrics.summary()
+                    if stage_summary:
+                        st.dataframe(pd.DataFrame.from_dict(stage_summary, orient="index"), use_container_width=True)
+                    else:
+                        st.info("아직 기록된 요청이 없습니다.")
+                    st.caption("앱 시작 시 준비 단계 (ms)")
+                    st.write(engine.startup_trace.to_dict()["stages_ms"])
+
+            # 대화 기록 복원 키 (SQLite 저장 시에만): 키를 아는 사람만 기록을 불러올 수 있음
+            if os.getenv("TOUR_HISTORY_DB"):
+                with st.expander("🔑 대화 기록 복원 키"):
+                    st.caption("새로고침이나 재시작 후 이 키를 입력하면 대화 기록을 다시 불러옵니다. 다른 사람과 공유하지 마세요.")
+                    st.code(conversation_store.session_id, language=None)
+                    restore_key = st.text_input("복원 키 입력", key="history_restore_key", type="password").strip()
+                    if st.button("기록 불러오기", key="history_restore_button", disabled=not restore_key):
+                        get_conversation_store(restore_key)
+                        st.session_state.selected_conversation_id = None
+                        st.session_state.history_page = 0
+                        st.session_state.last_processed = None
+                        st.rerun()
+
             # 새로운 대화 시작 버튼 (사이드바에 배치)
             if st.button("✨ 새로운 대화 시작하기", key="new_conversation_sidebar_button"):
-                st.session_state.selected_conversation_index = None
-                st.session_state.conversations = [] # 모든 대화 기록 초기화
+                st.session_state.selected_conversation_id = None
+                conversation_store.clear() # 모든 대화 기록 초기화 (저장된 기록 포함)
                 st.session_state.current_input = ""
+                st.session_state.history_page = 0
+                st.session_state.last_processed = None
                 st.rerun()
 
 # --- 메인 콘텐츠 영역: 선택된 대화 표시 ---
 # 이 부분은 'else: # 앱 시작 플래그가 True인 경우 챗봇 화면 표시' 블록 안에 있어야 합니다.
 # 사용자가 질문하기 버튼을 눌렀을 때만 이전 대화가 생성되도록 로직을 분리했습니다.
-if st.session_state.selected_conversation_index is not None:
+# 선택된 대화 객체를 대화 기록 저장소에서 가져오기 (보관 개수 초과로 제거되었으면 None)
+selected_conv = None
+if st.session_state.selected_conversation_id is not None:
+    selected_conv = conversation_store.get(st.session_state.selected_conversation_id)
+
+if selected_conv is not None:
     st.header("📝 이전 대화 내용")
     
-    # 선택된 대화 객체를 세션 상태에서 가져오기
-    selected_conv = st.session_state.conversations[st.session_state.selected_conversation_index]
-    
     # 사용자 질문 부분 표시
     st.subheader("🗣️ 질문:")
-    st.markdown(f"**{selected_conv['question']}**") # 'user_query' 대신 'question' 사용
+    st.markdown(f"**{selected_conv.question}**")
     
-    # 선택된 여행 스타일이 있을 경우 별도 표시 (특정 없음이 아닌 경우만)
-    if 'travel_style_selected' in selected_conv and selected_conv['travel_style_selected'] and selected_conv['travel_style_selected'] != '특정 없음':
+    # 선택된 여행 스타일이 있을 경우 별도 표시
+    if selected_conv.travel_style:
         st.subheader("🌟 선택된 여행 스타일:")
-        st.markdown(selected_conv['travel_style_selected'])
+        st.markdown(selected_conv.travel_style)
 
     # 챗봇 답변 표시 영역 시작
     st.subheader("💡 답변:")
     
     # LLM이 생성한 응답 텍스트 가져오기
-    # 'chatbot_response' 대신 'answer' 사용
-    rag_result_text = selected_conv['answer']
-
-    # 출력할 텍스트 라인 저장 리스트 및 처리한 관광지명 집합 초기화
-    processed_output_lines = []
-    processed_place_names = set()
-    # 여행 계획표 텍스트를 별도로 저장할 변수 초기화
-    table_plan_text = ""
-    # 여행 계획 표 섹션 진입 여부를 나타내는 플래그
-    in_plan_section = False
-
-    # LLM 응답을 줄 단위로 순회하면서 처리
-    for line in rag_result_text.split('\n'):
-        # '상세 여행 계획' 섹션 시작을 감지 (단, 표 헤더 라인 제외)
-        if "상세 여행 계획" in line and "일차 | 시간 | 활동" not in line:
-            processed_output_lines.append(line)
-            in_plan_section = True  # 이후부터는 여행 계획표 영역임을 표시
-            continue
+    rag_result_text = selected_conv.answer
 
-        if not in_plan_section:
-            # 관광지 이름 패턴이 있으면 추출
-            name_match = re.search(r"관광지 이름:\s*(.+)", line)
-            if name_match:
-                current_place_name = name_match.group(1).strip()
-                # 아직 처리하지 않은 관광지면 처리 시작
-                if current_place_name not in processed_place_names:
-                    processed_output_lines.append(line)
-                    processed_place_names.add(current_place_name)
-
-                    # 관광지 이름에 맞는 위도/경도 데이터 조회
-                    found_place_data = tour_data_df[
-                        (tour_data_df['관광지명'].str.strip() == current_place_name) &
-                        (pd.notna(tour_data_df['위도'])) &
-                        (pd.notna(tour_data_df['경도']))
-                    ]
-                    
-                    # 대화에서 저장된 사용자 위치 정보 가져오기
-                    current_user_lat_conv = selected_conv.get('user_lat')
-                    current_user_lon_conv = selected_conv.get('user_lon')
-
-                    # 위치 데이터가 존재하면 거리 계산
-                    if not found_place_data.empty and current_user_lat_conv is not None and current_user_lon_conv is not None:
-                        place_lat = found_place_data['위도'].iloc[0]
-                        place_lon = found_place_data['경도'].iloc[0]
-                        distance = haversine(current_user_lat_conv, current_user_lon_conv, place_lat, place_lon)
-                        # 거리 정보 출력 (소수점 2자리)
-                        processed_output_lines.append(f"- 사용자 위치 기준 거리(km): 약 **{distance:.2f}** km")
-                    else:
-                        # 위치 데이터가 없거나 불일치할 경우 안내 메시지 출력
-                        processed_output_lines.append("- 사용자 위치 기준 거리(km): 정보 없음 (데이터 불일치 또는 좌표 누락)")
-                else:
-                    # 이미 처리된 관광지 이름에 대한 중복 라인 중 거리 정보가 아니면 출력
-                    if not re.search(r"거리\(km\):", line):
-                        processed_output_lines.append(line)
-            else:
-                # 관광지 이름 패턴이 아니고, 거리 정보 라인도 아니면 일반 텍스트로 추가
-                if not re.search(r"거리\(km\):", line): # 중복 거리 정보 방지
-                    processed_output_lines.append(line)
-        else:
-            # 여행 계획표 영역에 들어오면 해당 라인을 여행 계획표 텍스트에 누적
-            table_plan_text += line + "\n"
+    # 답변 후처리: 추천 관광지마다 사용자 위치 기준 거리(정확/유사 이름 조회)를 덧붙이고 여행 계획표를 파싱
+    # 방금 생성한 답변은 생성 직후의 후처리 결과를 재사용하고, 이전 대화는 표시할 때 다시 계산 (기록에는 원문만 보관)
+    last_processed = st.session_state.last_processed
+    if last_processed is not None and last_processed[0] == selected_conv.conv_id:
+        processed_answer = last_processed[1]
+    else:
+        processed_answer = engine.postprocess(rag_result_text, selected_conv.user_lat, selected_conv.user_lon)
 
     # 처리된 일반 출력 텍스트 출력
-    st.markdown("\n".join(processed_output_lines))
+    st.markdown(processed_answer["recommendation_text"])
 
-    # 여행 계획표가 있다면 DataFrame으로 파싱 후 시각화
+    # 여행 계획표가 있다면 DataFrame으로 변환 후 시각화
+    table_plan_text = processed_answer["plan_text"]
     if table_plan_text.strip():
         try:
-            plan_lines = table_plan_text.strip().split('\n')
-            
-            # 최소한 표의 기본 형식(헤더, 구분선, 데이터 행)이 맞는지 검증
-            if len(plan_lines) >= 3 and plan_lines[0].count('|') >= 2 and plan_lines[1].count('|') >= 2 and all(re.match(r'^-+$', s.strip()) for s in plan_lines[1].split('|') if s.strip()):
-                # 헤더 파싱 및 공백 제거
-                header = [h.strip() for h in plan_lines[0].split('|') if h.strip()]
-                data_rows = []
-                for row_str in plan_lines[2:]:  # 헤더, 구분선 제외 데이터 행 순회
-                    if row_str.strip() and row_str.startswith('|'):
-                        # 각 컬럼 값 파싱 및 양쪽 빈 요소 제거
-                        parsed_row = [d.strip() for d in row_str.split('|') if d.strip() or d == '']
-                        # 첫 번째와 마지막 빈 문자열 제거 로직 개선 (공백으로만 된 스트링도 처리)
-                        if parsed_row and not parsed_row[0].strip(): parsed_row = parsed_row[1:]
-                        if parsed_row and not parsed_row[-1].strip(): parsed_row = parsed_row[:-1]
-
-                        # 데이터 행의 길이가 헤더와 맞지 않으면 (일차 병합 등)
-                        # 헤더 개수에 맞춰 데이터를 채워넣거나 자르는 보정 로직 추가
-                        if len(parsed_row) < len(header):
-                            parsed_row.extend([''] * (len(header) - len(parsed_row)))
-                        elif len(parsed_row) > len(header):
-                            parsed_row = parsed_row[:len(header)]
-                        
-                        data_rows.append(parsed_row)
-
-                # 모든 데이터 행이 헤더 컬럼 수와 일치하는지 확인 (재확인)
-                if data_rows and all(len(row) == len(header) for row in data_rows):
-                    temp_plan_df = pd.DataFrame(data_rows, columns=header)
-                    
-                    # '일차' 컬럼이 있으면 중복된 일차 값을 빈 문자열로 바꿔서 시각적 병합 효과
-                    if '일차' in temp_plan_df.columns:
-                        last_day = ""
-                        for i in range(len(temp_plan_df)):
-                            current_day = temp_plan_df.loc[i, '일차']
-                            if current_day == last_day and current_day != '':
-                                temp_plan_df.loc[i, '일차'] = ''
-                            else:
-                                last_day = current_day
-                    
-                    st.markdown("---")
-                    st.markdown("### 🗓️ AI가 제안하는 여행 계획표")
-                    st.dataframe(temp_plan_df, use_container_width=True)
-                else:
-                    st.warning("AI가 생성한 여행 계획표 형식이 예상과 다릅니다. 원본 텍스트로 표시합니다.")
-                    st.markdown(table_plan_text)
+            temp_plan_df = processed_answer["plan_df"]  # 헤더/구분선/데이터 행이 갖춰진 경우에만 생성됨 ('일차' 병합 처리 포함)
+            if temp_plan_df is not None:
+                st.markdown("---")
+                st.markdown("### 🗓️ AI가 제안하는 여행 계획표")
+                st.dataframe(temp_plan_df, use_container_width=True)
             else:
                 st.warning("AI가 생성한 여행 계획표 형식이 예상과 다릅니다. 원본 텍스트로 표시합니다.")
                 st.markdown(table_plan_text)
         except Exception as e:
             st.warning(f"여행 계획표를 파싱하는 중 오류가 발생했습니다: {e}. 원본 텍스트로 표시합니다.")
             st.markdown(table_plan_text)
+
+    # 디버그 패널: 이 답변의 처리 단계별 소요 시간, 토큰 수, 검색 문서 수
+    if st.session_state.get("debug_panel_toggle") and selected_conv.trace:
+        conv_trace = selected_conv.trace
+        with st.expander(f"🛠️ 처리 과정 (총 {conv_trace['total_ms']:.0f}ms)", expanded=True):
+            stage_df = pd.DataFrame(list(conv_trace["stages_ms"].items()), columns=["단계", "소요 시간(ms)"])
+            st.dataframe(stage_df, use_container_width=True)
+            st.write({**conv_trace["counters"], **conv_trace["attributes"]})
@@ -0,0 +1,5 @@
+"""테스트 공통 설정: 저장소 루트의 모듈(tour_*.py)을 가져올 수 있도록 경로를 추가합니다."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,87 @@
+"""마크다운 증분 파서와 JSON 구조화 답변 파서를 부분/잘못된 입력으로 확인합니다."""
+import json
+
+import pytest
+
+from tour_answer import IncrementalPlanParser, merge_structured_answers, parse_answer, parse_structured_answer
+
+MARKDOWN_ANSWER = """**추천 관광지:**
+- 관광지 이름: 수원화성
+  - 주소: 경기도 수원시 팔달구
+  - 주요 시설/특징: 성곽 산책로
+
+**상세 여행 계획:**
+| 일차 | 시간 | 활동 | 예상 장소 | 이동 방법 |
+|---|---|---|---|---|
+| 1일차 | 09:00 | 성곽 걷기 | 수원화성 | 도보 |
+| 1일차 | 12:00 | 점심 | 통닭거리 | 도보 10분 | 남는 셀 |
+| 2일차 | 10:00 | 관람 |
+"""
+
+
+def test_incremental_parser_matches_one_shot_parse():
+    parser = IncrementalPlanParser()
+    for start in range(0, len(MARKDOWN_ANSWER), 7):  # 스트리밍처럼 7글자씩
+        parser.feed(MARKDOWN_ANSWER[start:start + 7])
+    parser.close()
+    whole = parse_answer(MARKDOWN_ANSWER)
+
+    assert parser.rows == whole.rows
+    assert parser.header == ["일차", "시간", "활동", "예상 장소", "이동 방법"]
+    assert parser.rows[1] == ["1일차", "12:00", "점심", "통닭거리", "도보 10분"]  # 남는 셀은 자름
+    assert parser.rows[2] == ["2일차", "10:00", "관람", "", ""]  # 모자란 셀은 채움
+    assert parser.to_dataframe()["일차"].tolist() == ["1일차", "", "2일차"]
+    assert "수원화성" in parser.recommendation_text and "상세 여행 계획" in parser.recommendation_text
+
+
+def test_incremental_parser_partial_and_malformed_tables():
+    parser = IncrementalPlanParser()
+    parser.feed("**추천 관광지:**\n- 관광지 이름: 남한산성\n- 주")
+    assert parser.recommendation_text.endswith("- 주")  # 줄바꿈 전 조각도 표시
+    assert not parser.has_table and parser.to_dataframe() is None
+
+    malformed = parse_answer("상세 여행 계획\n| 일차 | 시간 |\n| 1일차 | 09:00 |\n")  # 구분선 없음
+    assert malformed.table_malformed and not malformed.has_table
+
+
+def test_parse_structured_answer_round_trip():
+    answer = json.dumps({
+        "places": [{"name": "수원화성", "address": "경기도 수원시", "features": "성곽"}, {"name": ""}, "잘못된 항목"],
+        "days": [
+            {"day": 1, "items": [["09:00", "관람", "수원화성", "도보"], ["12:00", "점심"], []]},
+            {"day": "둘째 날", "items": [{"time": "10:00", "activity": "산책", "place": "광교호수공원", "move": "버스"}]},
+            {"items": "잘못된 형식"},
+        ],
+    }, ensure_ascii=False)
+    parsed = parse_structured_answer(f"```json\n{answer}\n```")
+
+    assert [place["name"] for place in parsed.places] == ["수원화성"]
+    assert parsed.plan_rows == [
+        (1, "09:00", "관람", "수원화성", "도보"),
+        (1, "12:00", "점심", "", ""),
+        (2, "10:00", "산책", "광교호수공원", "버스"),  # 일차가 숫자가 아니면 순서로 대신
+    ]
+    assert parsed.has_table
+    assert parsed.to_dataframe()["일차"].tolist() == ["1일차", "", "2일차"]
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "**추천 관광지:** 마크다운 답변",
+    '{"places": [{"name": "수원화성"}], "days": [',  # 스트리밍 도중 잘린 JSON
+    '{"places": "없음", "days": []}',
+    '["places", "days"]',
+])
+def test_parse_structured_answer_rejects_partial_or_malformed_json(text):
+    assert parse_structured_answer(text) is None
+
+
+def test_merge_structured_answers_renumbers_days():
+    places = json.dumps({"places": [{"name": "남한산성", "address": "경기도 광주시", "features": "산성"}]})
+    day_answers = [([1], json.dumps({"days": [{"day": 1, "items": [["09:00", "등산", "남한산성", "도보"]]}]})),
+                   ([2, 3], json.dumps({"days": [{"day": 7, "items": [["10:00", "관람", "-", "-"]]},
+                                                 {"day": 8, "items": [["11:00", "휴식", "-", "-"]]}]})),
+                   ([4], "잘린 응답 {")]
+    parsed = parse_structured_answer(merge_structured_answers(places, day_answers))
+    assert [row[0] for row in parsed.plan_rows] == [1, 2, 3]
+    assert parsed.places[0]["name"] == "남한산성"
@@ -0,0 +1,23 @@
+"""ResponseCache의 정확/유사 질문 적중과 임베딩 모델 전환을 확인합니다."""
+from tour_cache import ResponseCache
+from tour_embeddings import HashEmbeddings
+
+INPUTS = {"input": "수원 가볼 만한 곳?", "user_lat": 37.28, "user_lon": 127.01, "age": "30대", "travel_style": "역사, 자연"}
+
+
+def test_exact_and_semantic_hits(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), embeddings=HashEmbeddings(), similarity_threshold=0.8)
+    cache.put(INPUTS, "답변")
+
+    assert cache.get({**INPUTS, "input": "수원  가볼 만한 곳", "travel_style": "자연,역사"}) == "답변"  # 정규화 후 정확 일치
+    assert cache.get({**INPUTS, "input": "수원 가볼 만한 곳 알려줘"}) == "답변"  # 유사 질문
+    assert cache.get({**INPUTS, "user_lat": 35.1, "user_lon": 129.0}) is None  # 다른 격자 칸
+    assert cache.stats["hits"] == 1 and cache.stats["semantic_hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_switching_embedding_model_does_not_mix_vectors(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ResponseCache(path, embeddings=HashEmbeddings(size=256)).put(INPUTS, "답변")
+
+    switched = ResponseCache(path, embeddings=HashEmbeddings(size=128), similarity_threshold=0.0)
+    assert switched.get({**INPUTS, "input": "수원 가볼 곳"}) is None  # 차원이 다른 벡터와 비교하지 않음 (오류 없음)
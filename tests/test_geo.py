@@ -0,0 +1,46 @@
+"""SpatialIndex 반경/최근접 검색을 전수 하버사인 계산과 비교합니다."""
+import numpy as np
+import pytest
+
+from tour_geo import SpatialIndex, haversine_np
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(33.0, 38.5, 3000)  # 한국 영역의 임의 좌표
+    lons = rng.uniform(125.0, 130.0, 3000)
+    lats[::97] = np.nan  # 좌표 누락 행은 색인에서 제외되어야 함
+    return lats, lons
+
+
+@pytest.mark.parametrize("lat, lon, radius_km", [(37.5, 127.0, 15.0), (35.1, 129.0, 40.0), (33.4, 126.5, 120.0)])
+def test_query_radius_matches_brute_force(points, lat, lon, radius_km):
+    lats, lons = points
+    index = SpatialIndex(lats, lons)
+    positions, dists = index.query_radius(lat, lon, radius_km)
+
+    brute = haversine_np(lat, lon, lats, lons)
+    expected = np.flatnonzero(brute <= radius_km)
+    assert sorted(positions.tolist()) == expected.tolist()
+    np.testing.assert_allclose(dists, brute[positions], rtol=1e-9)
+    assert np.all(np.diff(dists) >= 0)  # 가까운 순
+
+
+@pytest.mark.parametrize("k", [1, 7, 50])
+def test_query_knn_matches_brute_force(points, k):
+    lats, lons = points
+    index = SpatialIndex(lats, lons)
+    positions, dists = index.query_knn(36.0, 127.5, k)
+
+    brute = haversine_np(36.0, 127.5, lats, lons)
+    brute[~np.isfinite(brute)] = np.inf
+    np.testing.assert_allclose(dists, np.sort(brute)[:k], rtol=1e-9)
+    np.testing.assert_allclose(brute[positions], dists, rtol=1e-9)
+
+
+def test_non_finite_query_returns_nothing(points):
+    index = SpatialIndex(*points)
+    for lat, lon in [(np.nan, 127.0), (37.5, np.nan), (np.nan, np.nan)]:
+        assert index.query_radius(lat, lon, 10.0)[0].size == 0
+        assert index.query_knn(lat, lon, 5)[0].size == 0
@@ -0,0 +1,32 @@
+"""ConversationStore의 SQLite 저장/복원과 최대 개수 제한을 확인합니다."""
+from tour_history import ConversationStore
+
+
+def test_conversation_store_round_trip(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    store = ConversationStore("session-a", max_conversations=3, path=path)
+    for i in range(5):
+        store.add(f"질문 {i}", f"답변 {i}", user_lat=37.5, user_lon=127.0, travel_style="자연, 역사",
+                  trip_duration=2, trace={"total_ms": 12.5, "stages_ms": {"retrieve": 3.0}})
+    assert len(store) == 3 and store.get(1) is None  # 가장 오래된 대화부터 제거
+
+    restored = ConversationStore("session-a", max_conversations=3, path=path)
+    assert [conv.question for conv in restored.page(0, 10)] == ["질문 4", "질문 3", "질문 2"]
+    assert restored.get(5).trace == {"total_ms": 12.5, "stages_ms": {"retrieve": 3.0}}
+    assert restored.get(5).travel_style == "자연, 역사" and restored.get(5).user_lat == 37.5
+    assert restored.add("질문 5", "답변 5").conv_id == 6  # 대화 번호는 이어서 증가
+
+    assert len(ConversationStore("session-b", path=path)) == 0  # 다른 세션 키의 기록은 보이지 않음
+
+    restored.clear()
+    assert len(ConversationStore("session-a", path=path)) == 0
+
+
+def test_conversation_store_pages_latest_first():
+    store = ConversationStore(max_conversations=10)
+    for i in range(7):
+        store.add(f"질문 {i}", "답변")
+    assert store.page_count(3) == 3
+    assert [conv.conv_id for conv in store.page(0, 3)] == [7, 6, 5]
+    assert [conv.conv_id for conv in store.page(2, 3)] == [1]
+    assert store.page(5, 3) == []
@@ -0,0 +1,29 @@
+"""가짜 채팅 모델로 LLM 게이트웨이의 호출, 요청 병합, 모델 공유를 확인합니다."""
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+
+from tour_llm import wrap_with_gateway
+
+
+def test_models_share_one_gateway():
+    main = wrap_with_gateway(FakeListChatModel(responses=["기본 답변"]), max_concurrency=2, requests_per_minute=None)
+    fast = wrap_with_gateway(FakeListChatModel(responses=["빠른 답변"]), gateway=main.gateway)
+
+    assert fast.gateway is main.gateway
+    assert wrap_with_gateway(fast, gateway=main.gateway) is fast
+    assert main.invoke("질문").content == "기본 답변"
+    assert fast.invoke("질문").content == "빠른 답변"  # 같은 프롬프트라도 모델이 다르면 병합하지 않음
+    assert main.gateway.stats["calls"] == 2
+
+
+async def _ainvoke_twice(model, text):
+    return await asyncio.gather(model.ainvoke(text), model.ainvoke(text))
+
+
+def test_identical_concurrent_requests_are_coalesced():
+    model = wrap_with_gateway(FakeListChatModel(responses=["답변"], sleep=0.2), requests_per_minute=None)
+    first, second = asyncio.run(_ainvoke_twice(model, [HumanMessage("같은 질문")]))
+    assert first.content == second.content == "답변"
+    assert model.gateway.stats["calls"] == 1 and model.gateway.stats["coalesced"] == 1
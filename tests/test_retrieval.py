@@ -0,0 +1,44 @@
+"""HybridRetriever가 위치가 있는 일반 질의에서 반경 밖 어휘 일치 결과를 끌어오지 않는지 확인합니다."""
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from tour_data import LAT_KEY, LON_KEY, PLACE_ID_KEY
+from tour_embeddings import HashEmbeddings
+from tour_lexical import LexicalIndex
+from tour_retrieval import DISTANCE_KEY, GeoRetriever, HybridRetriever
+from tour_vectorstore import create_vectorstore
+
+USER_LAT, USER_LON = 37.26, 127.03  # 수원
+RADIUS_KM = 20.0
+
+
+@pytest.fixture(scope="module")
+def hybrid():
+    rng = np.random.default_rng(0)
+    places = [(f"수원 명소 {i}", "수원시", USER_LAT + rng.uniform(-0.08, 0.08), USER_LON + rng.uniform(-0.08, 0.08))
+              for i in range(60)]  # 반경 안
+    places += [(f"해운대 바다공원 {i}", "부산시", 35.16 + rng.uniform(-0.05, 0.05), 129.16) for i in range(10)]
+    places += [(f"가평 캠핑장 {i}", "가평군", 37.83, 127.51 + rng.uniform(-0.05, 0.05)) for i in range(10)]
+    docs = [Document(page_content=f"관광지명: {name} | 시군: {region}",
+                     metadata={LAT_KEY: lat, LON_KEY: lon, "name": name, "region": region, PLACE_ID_KEY: f"P{i}"})
+            for i, (name, region, lat, lon) in enumerate(places)]
+    vectorstore = create_vectorstore(docs, HashEmbeddings(size=64))
+    lexical_index = LexicalIndex([(name, region) for name, region, _, _ in places])
+    return HybridRetriever(GeoRetriever(vectorstore, radius_km=RADIUS_KM), lexical_index,
+                           [f"P{i}" for i in range(len(places))], k=8)
+
+
+@pytest.mark.parametrize("query", ["근처 공원 추천해줘", "캠핑장", "바다 전망 좋은 곳"])
+def test_located_generic_queries_stay_within_radius(hybrid, query):
+    docs = hybrid.retrieve(query, USER_LAT, USER_LON)
+    assert len(docs) == 8
+    assert all(doc.metadata[DISTANCE_KEY] <= RADIUS_KM for doc in docs)
+
+
+def test_named_places_and_regions_bypass_radius(hybrid):
+    names = [doc.metadata["name"] for doc in hybrid.retrieve("해운대 바다공원 3", USER_LAT, USER_LON)]
+    assert "해운대 바다공원 3" in names
+    assert any(doc.metadata["region"] == "가평군" for doc in hybrid.retrieve("가평 캠핑장", USER_LAT, USER_LON))
+    docs = hybrid.retrieve("캠핑장")  # 위치가 없으면 어휘 결과를 그대로 반영
+    assert any(doc.metadata["region"] == "가평군" for doc in docs)
@@ -0,0 +1,100 @@
+"""sync_vectorstore 증분 갱신 통계(추가/삭제/변경 없음)를 확인합니다."""
+import os
+
+from langchain_core.documents import Document
+
+from tour_embeddings import HashEmbeddings
+import tour_vectorstore
+from tour_vectorstore import (
+    load_manifest, load_vectorstore, manifest_vector_count, resolve_index_dir, sync_vectorstore, vectorstore_dir,
+)
+
+
+def _write(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(rows))
+
+
+def _load_rows(file_path):
+    with open(file_path, encoding="utf-8") as f:
+        return [Document(page_content=line, metadata={"source": os.path.basename(file_path)})
+                for line in f.read().splitlines() if line]
+
+
+def _sync(index_path, files):
+    return sync_vectorstore(index_path, files, _load_rows, HashEmbeddings(size=64))
+
+
+def test_sync_counts_added_removed_and_unchanged(tmp_path):
+    index_path = str(tmp_path / "index")
+    a, b = str(tmp_path / "a.csv"), str(tmp_path / "b.csv")
+    _write(a, ["수원화성 성곽", "화성행궁 궁궐", "광교호수공원 호수"])
+    _write(b, ["남한산성 산성", "남한산성 산성"])  # 같은 행은 한 번만 색인
+
+    vectorstore, stats = _sync(index_path, [a, b])
+    assert stats == {"unchanged_files": 0, "changed_files": 2, "added_rows": 4, "removed_rows": 0, "embedded_chunks": 4}
+    assert vectorstore.index.ntotal == 4
+
+    vectorstore, stats = _sync(index_path, [a, b])  # 변경 없음: 다시 읽거나 임베딩하지 않음
+    assert stats == {"unchanged_files": 2, "changed_files": 0, "added_rows": 0, "removed_rows": 0, "embedded_chunks": 0}
+    assert vectorstore.index.ntotal == 4
+
+    _write(a, ["수원화성 성곽", "화성행궁 궁궐 야간개장", "에버랜드 놀이공원"])  # 1행 유지, 1행 변경, 1행 교체
+    vectorstore, stats = _sync(index_path, [a, b])
+    assert stats == {"unchanged_files": 1, "changed_files": 1, "added_rows": 2, "removed_rows": 2, "embedded_chunks": 2}
+    assert vectorstore.index.ntotal == 4
+
+    vectorstore, stats = _sync(index_path, [a])  # 목록에서 빠진 파일의 행은 삭제
+    assert stats["removed_rows"] == 1 and stats["added_rows"] == 0
+    assert sorted(doc.page_content for doc in vectorstore.docstore._dict.values()) == [
+        "수원화성 성곽", "에버랜드 놀이공원", "화성행궁 궁궐 야간개장",
+    ]
+
+
+def test_unchanged_sync_does_not_open_the_index(tmp_path, monkeypatch):
+    index_path = str(tmp_path / "index")
+    a = str(tmp_path / "a.csv")
+    _write(a, ["수원화성 성곽", "화성행궁 궁궐"])
+    _sync(index_path, [a])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("변경이 없으면 인덱스를 열지 않아야 함")
+
+    monkeypatch.setattr(tour_vectorstore, "load_vectorstore", fail)
+    vectorstore, stats = sync_vectorstore(index_path, [a], _load_rows, HashEmbeddings(size=64), load_unchanged=False)
+    assert vectorstore is None and stats["unchanged_files"] == 1
+    assert manifest_vector_count(index_path) == 2
+
+
+def test_sync_rebuilds_when_embedding_model_changes(tmp_path):
+    index_path = str(tmp_path / "index")
+    a = str(tmp_path / "a.csv")
+    _write(a, ["수원화성 성곽", "화성행궁 궁궐"])
+    _sync(index_path, [a])
+
+    vectorstore, stats = sync_vectorstore(index_path, [a], _load_rows, HashEmbeddings(size=32))
+    assert stats["embedded_chunks"] == 2
+    assert vectorstore.index.d == 32
+
+
+def test_saves_publish_complete_versions_behind_a_pointer(tmp_path):
+    index_path = str(tmp_path / "index")
+    a = str(tmp_path / "a.csv")
+    _write(a, ["수원화성 성곽"])
+    first, _ = _sync(index_path, [a])
+    first_dir = vectorstore_dir(first)
+
+    for rows in (["수원화성 성곽", "화성행궁 궁궐"], ["수원화성 성곽", "화성행궁 궁궐", "남한산성 산성"]):
+        _write(a, rows)
+        latest, _ = _sync(index_path, [a])
+
+    current = resolve_index_dir(index_path)
+    assert current == vectorstore_dir(latest) != first_dir
+    assert {"index.faiss", "index.pkl", "manifest.json"} <= set(os.listdir(current))  # 한 버전에 모든 파일
+    entries = set(os.listdir(index_path))
+    assert {"CURRENT", os.path.basename(current)} <= entries and len(entries) == 3  # 포인터 + 현재 + 직전 버전만 남음
+    assert os.path.basename(first_dir) not in entries
+    assert load_manifest(index_path)["files"][os.path.normpath(a)]["rows"].keys() == {
+        doc_id.split(":")[0] for doc_id in latest.index_to_docstore_id.values()
+    }
+    assert load_vectorstore(index_path, HashEmbeddings(size=64), mmap=True).index.ntotal == 3
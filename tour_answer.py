@@ -0,0 +1,328 @@
+"""
+LLM 답변 후처리 모듈.
+
+답변을 '추천 관광지' 부분과 '상세 여행 계획' 표 부분으로 나누고, 마크다운 표를 DataFrame으로 변환합니다.
+추천 관광지 줄에는 데이터셋 좌표로 계산한 사용자 위치 기준 거리를 덧붙입니다. 토큰 단위로 도착하는 스트리밍 응답도 완성된 줄부터 바로 처리할 수 있도록 증분(incremental) 파서로 구현합니다.
+
+구조화(JSON) 출력 모드의 답변(`ANSWER_JSON_SCHEMA`)은 `parse_structured_answer()`가 한 번에 검증하여
+같은 인터페이스(추천 관광지 줄, 계획 텍스트, DataFrame)로 변환하므로, 이후 거리 계산과 화면 표시는 형식과 무관합니다.
+"""
+import json
+import re
+
+import pandas as pd
+
+from tour_geo import distances_from
+
+PLAN_SECTION_MARKER = "상세 여행 계획"  # 여행 계획 섹션 시작 표시
+PLAN_HEADER_MARKER = "일차 | 시간 | 활동"  # 표 헤더 줄 (섹션 시작으로 보지 않음)
+DAY_COLUMN = "일차"
+DISTANCE_LINE_PREFIX = "- 사용자 위치 기준 거리(km):"  # 시스템이 덧붙이는 거리 줄
+PLAN_COLUMNS = ("일차", "시간", "활동", "예상 장소", "이동 방법")  # 여행 계획표 컬럼 (JSON 일정 항목 순서와 같음)
+
+
+def _object_schema(**properties):
+    """모든 속성이 필수이고 추가 속성이 없는 JSON 스키마 객체 (OpenAI strict 모드 요구사항)."""
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+_PLACES_SCHEMA = {  # 추천 관광지
+    "type": "array",
+    "items": _object_schema(name={"type": "string"}, address={"type": "string"}, features={"type": "string"}),
+}
+_DAYS_SCHEMA = {  # 일차별 일정. 항목은 [시간, 활동, 예상 장소, 이동 방법] 배열 (키 반복 없이 토큰 절약)
+    "type": "array",
+    "items": _object_schema(
+        day={"type": "integer"},
+        items={"type": "array", "items": {"type": "array", "items": {"type": "string"}}},
+    ),
+}
+ANSWER_JSON_SCHEMA = _object_schema(places=_PLACES_SCHEMA, days=_DAYS_SCHEMA)  # 구조화 출력 모드의 전체 답변
+PLACES_JSON_SCHEMA = _object_schema(places=_PLACES_SCHEMA)  # 병렬 생성: 추천 관광지 부분 요청
+DAYS_JSON_SCHEMA = _object_schema(days=_DAYS_SCHEMA)  # 병렬 생성: 일차(묶음)별 일정 요청
+
+_PLACE_NAME_LINE = re.compile(r"관광지 이름:\s*(.+)")
+_DISTANCE_LINE = re.compile(r"거리\(km\):")
+
+_SEPARATOR_CELL = re.compile(r"^:?-+:?$")  # |---|:---:| 형태의 구분선 셀
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")  # JSON을 코드 블록으로 감싼 답변
+
+
+def split_table_row(line):
+    """마크다운 표의 한 줄을 셀 리스트로 나눕니다. 양 끝의 '|' 바깥 빈 셀은 제거합니다."""
+    stripped = line.strip()
+    cells = [cell.strip() for cell in stripped.split("|")]
+    if stripped.startswith("|"):
+        cells = cells[1:]
+    if stripped.endswith("|") and cells:
+        cells = cells[:-1]
+    return cells
+
+
+def is_separator_row(cells):
+    """표 헤더 아래의 구분선 줄인지 확인합니다."""
+    non_empty = [cell for cell in cells if cell]
+    return bool(non_empty) and all(_SEPARATOR_CELL.match(cell) for cell in non_empty)
+
+
+class IncrementalPlanParser:
+    """
+    LLM 답변 텍스트를 조각 단위로 받아 완성된 줄부터 처리하는 증분 파서입니다.
+
+    '상세 여행 계획' 줄 이전은 추천 관광지 텍스트(`recommendation_lines`)로, 이후는 여행 계획 텍스트로
+    모으면서 표 헤더/구분선/데이터 행을 바로 파싱하여 `rows`에 쌓습니다. 스트리밍 중에는
+    `feed()`를, 답변이 끝나면 `close()`를 호출하고, 저장된 답변은 `parse_answer()`로 한 번에 처리합니다.
+    """
+
+    def __init__(self):
+        self._buffer = ""  # 아직 줄바꿈이 오지 않은 마지막 조각
+        self.recommendation_lines = []  # 추천 관광지 부분 (섹션 제목 줄 포함)
+        self.plan_lines = []  # 여행 계획 부분 원문 줄
+        self.in_plan_section = False  # 여행 계획 섹션 진입 여부
+        self.header = None  # 표 헤더 셀 리스트
+        self.separator_seen = False  # 헤더 다음 구분선 확인 여부
+        self.table_malformed = False  # 헤더 다음 줄이 구분선이 아닌 경우
+        self.rows = []  # 헤더 길이에 맞춘 데이터 행
+
+    def feed(self, text):
+        """텍스트 조각을 추가하고, 새로 완성된 줄 수를 반환합니다."""
+        self._buffer += text
+        *complete_lines, self._buffer = self._buffer.split("\n")
+        for line in complete_lines:
+            self._consume_line(line)
+        return len(complete_lines)
+
+    def close(self):
+        """남은 마지막 줄까지 처리합니다."""
+        if self._buffer:
+            self._consume_line(self._buffer)
+            self._buffer = ""
+        return self
+
+    def _consume_line(self, line):
+        if not self.in_plan_section:
+            self.recommendation_lines.append(line)
+            if PLAN_SECTION_MARKER in line and PLAN_HEADER_MARKER not in line:
+                self.in_plan_section = True  # 이후부터는 여행 계획표 영역
+            return
+
+        self.plan_lines.append(line)
+        if not line.strip() or self.table_malformed:
+            return
+        if self.header is None:
+            if line.count("|") >= 2:
+                self.header = [cell for cell in split_table_row(line) if cell]
+            return
+        cells = split_table_row(line)
+        if not self.separator_seen:
+            self.separator_seen = is_separator_row(cells)
+            self.table_malformed = not self.separator_seen
+            return
+        if line.strip().startswith("|"):
+            # 헤더 개수에 맞춰 데이터를 채워넣거나 자르는 보정 (일차 병합 등으로 셀 수가 다를 수 있음)
+            width = len(self.header)
+            self.rows.append((cells + [""] * width)[:width])
+
+    @property
+    def recommendation_text(self):
+        """추천 관광지 부분 텍스트 (스트리밍 중에는 아직 줄바꿈이 오지 않은 부분도 포함)."""
+        pending = [] if self.in_plan_section or not self._buffer else [self._buffer]
+        return "\n".join(self.recommendation_lines + pending)
+
+    @property
+    def plan_text(self):
+        """여행 계획 부분 원문 텍스트."""
+        return "\n".join(self.plan_lines)
+
+    @property
+    def has_table(self):
+        """헤더, 구분선, 데이터 행을 모두 갖춘 표가 파싱되었는지 여부."""
+        return self.header is not None and self.separator_seen and bool(self.rows)
+
+    def to_dataframe(self):
+        """파싱된 표를 DataFrame으로 반환합니다. 같은 '일차'가 이어지면 첫 행에만 남겨 병합처럼 보이게 합니다."""
+        if not self.has_table:
+            return None
+        plan_df = pd.DataFrame(self.rows, columns=self.header)
+        if DAY_COLUMN in plan_df.columns:
+            day = plan_df[DAY_COLUMN]
+            if isinstance(day, pd.Series):  # 중복 헤더명이면 DataFrame이 되므로 건너뜀
+                repeated = day.eq(day.shift()) & day.ne("")
+                plan_df.loc[repeated, DAY_COLUMN] = ""
+        return plan_df
+
+
+def parse_answer(answer_text):
+    """완성된 답변 텍스트 전체를 한 번에 파싱합니다."""
+    parser = IncrementalPlanParser()
+    parser.feed(answer_text)
+    return parser.close()
+
+
+def _text(value):
+    """JSON 값을 표시용 문자열로 (None은 빈 문자열)."""
+    return "" if value is None else str(value).strip()
+
+
+class StructuredAnswer:
+    """
+    검증을 마친 구조화(JSON) 답변입니다. `IncrementalPlanParser`와 같은 속성/메서드를 제공하여
+    `annotate_recommendations`와 화면 표시 코드가 두 형식을 구분하지 않게 합니다.
+    """
+
+    def __init__(self, places, plan_rows):
+        self.places = places  # [{"name", "address", "features"}] (이름이 없는 항목 제외)
+        self.plan_rows = plan_rows  # [(일차 번호, 시간, 활동, 예상 장소, 이동 방법)]
+        self.recommendation_lines = ["**추천 관광지:**"]
+        for place in places:
+            self.recommendation_lines.append(f"- 관광지 이름: {place['name']}")
+            if place["address"]:
+                self.recommendation_lines.append(f"  - 주소: {place['address']}")
+            if place["features"]:
+                self.recommendation_lines.append(f"  - 주요 시설/특징: {place['features']}")
+
+    @property
+    def recommendation_text(self):
+        return "\n".join(self.recommendation_lines)
+
+    @property
+    def has_table(self):
+        return bool(self.plan_rows)
+
+    @property
+    def plan_text(self):
+        """여행 계획의 마크다운 표 (DataFrame을 표시할 수 없을 때의 원문 대신)."""
+        if not self.plan_rows:
+            return ""
+        lines = [f"**{PLAN_SECTION_MARKER}:**", "| " + " | ".join(PLAN_COLUMNS) + " |", "|" + "---|" * len(PLAN_COLUMNS)]
+        lines += ["| " + " | ".join(cells) + " |" for cells in self._display_rows()]
+        return "\n".join(lines)
+
+    def _display_rows(self):
+        """일차 값은 각 일차의 첫 행에만 남긴 표시용 행 (같은 일차 병합처럼 보이게)."""
+        previous_day = None
+        for day, *cells in self.plan_rows:
+            yield [f"{day}일차" if day != previous_day else "", *cells]
+            previous_day = day
+
+    def to_dataframe(self):
+        if not self.plan_rows:
+            return None
+        return pd.DataFrame(list(self._display_rows()), columns=list(PLAN_COLUMNS))
+
+
+def _load_json_object(text):
+    """코드 블록을 벗긴 JSON 객체 (JSON 객체가 아니면 None)."""
+    text = _CODE_FENCE.sub("", text.strip())
+    if not text.startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def parse_structured_answer(answer_text):
+    """
+    `ANSWER_JSON_SCHEMA` 형식의 답변을 한 번에 검증하여 `StructuredAnswer`로 반환합니다.
+    JSON이 아니거나 최상위 구조가 맞지 않으면 None (마크다운 파서로 처리), 개별 항목의 형식 오류는 그 항목만 건너뜁니다.
+    """
+    data = _load_json_object(answer_text)
+    if data is None or not isinstance(data.get("places"), list) or not isinstance(data.get("days"), list):
+        return None
+
+    places = []
+    for place in data["places"]:
+        if isinstance(place, dict) and _text(place.get("name")):
+            places.append({key: _text(place.get(key)) for key in ("name", "address", "features")})
+
+    width = len(PLAN_COLUMNS) - 1  # 일차를 뺀 항목 수
+    plan_rows = []
+    for index, day in enumerate(data["days"], start=1):
+        if not isinstance(day, dict) or not isinstance(day.get("items"), list):
+            continue
+        day_number = day.get("day")
+        if isinstance(day_number, bool) or not isinstance(day_number, (int, float)):
+            day_number = index  # 일차 번호가 없거나 숫자가 아니면 순서로 대신
+        for item in day["items"]:
+            if isinstance(item, dict):  # 키 이름으로 준 경우도 허용
+                item = [item.get(key) for key in ("time", "activity", "place", "move")]
+            if not isinstance(item, list) or not any(_text(value) for value in item):
+                continue
+            cells = [_text(value) for value in item[:width]]
+            plan_rows.append((int(day_number), *cells, *[""] * (width - len(cells))))
+    return StructuredAnswer(places, plan_rows)
+
+
+def merge_structured_answers(places_answer, day_answers):
+    """
+    병렬 생성한 추천 관광지 답변(`PLACES_JSON_SCHEMA`)과 [(요청한 일차 번호 리스트, 일정 답변)]을
+    `ANSWER_JSON_SCHEMA` 형식의 답변 텍스트 하나로 합칩니다. 일차 번호는 요청한 번호로 다시 매기고,
+    JSON이 아닌 부분 답변은 건너뜁니다 (해당 일차는 계획표에서 빠짐).
+    """
+    places = (_load_json_object(places_answer) or {}).get("places")
+    days = []
+    for day_numbers, answer in day_answers:
+        chunk_days = (_load_json_object(answer) or {}).get("days")
+        if not isinstance(chunk_days, list):
+            continue
+        for day_number, day in zip(day_numbers, chunk_days):
+            if isinstance(day, dict):
+                days.append({**day, "day": day_number})
+    return json.dumps({"places": places if isinstance(places, list) else [], "days": days}, ensure_ascii=False)
+
+
+def parse_any_answer(answer_text):
+    """구조화(JSON) 답변이면 `StructuredAnswer`로, 아니면 마크다운 답변으로 파싱합니다 (캐시/기록의 두 형식 모두 처리)."""
+    return parse_structured_answer(answer_text) or parse_answer(answer_text)
+
+
+def annotate_recommendations(recommendation_lines, place_index, user_lat, user_lon):
+    """
+    추천 관광지 줄마다 '관광지 이름:' 뒤의 이름을 `place_index`로 조회하여 거리 줄을 덧붙입니다.
+
+    같은 관광지가 다시 나오면 이름 줄은 건너뛰고, LLM이 직접 쓴 거리 줄은 제거합니다.
+    (출력 줄 리스트, 관광지별 결과 딕셔너리 리스트)를 반환합니다.
+    """
+    found_places = {}  # 답변 속 관광지명 -> PlaceMatch (정확 일치 O(1), 실패 시 유사 이름 조회)
+    for line in recommendation_lines:
+        name_match = _PLACE_NAME_LINE.search(line)
+        if name_match is not None and name_match.group(1).strip() not in found_places:
+            found_places[name_match.group(1).strip()] = place_index.lookup(name_match.group(1).strip())
+
+    distances = {}  # 좌표를 찾은 관광지들의 거리를 한 번의 벡터 연산으로 계산
+    located = [name for name, found in found_places.items() if found is not None]
+    if located and user_lat is not None and user_lon is not None:
+        km = distances_from(user_lat, user_lon, [found_places[n].lat for n in located], [found_places[n].lon for n in located])
+        distances = dict(zip(located, km.tolist()))
+
+    output_lines, places, seen_names = [], [], set()
+    for line in recommendation_lines:
+        name_match = _PLACE_NAME_LINE.search(line)
+        if name_match is None or name_match.group(1).strip() in seen_names:
+            if not _DISTANCE_LINE.search(line):  # 중복 거리 정보 방지
+                output_lines.append(line)
+            continue
+
+        place_name = name_match.group(1).strip()
+        seen_names.add(place_name)
+        output_lines.append(line)
+
+        found = found_places[place_name]
+        distance = distances.get(place_name)
+        if distance is not None:
+            matched_name_note = f" (데이터 명칭: {found.name})" if found.score < 1.0 else ""
+            output_lines.append(f"{DISTANCE_LINE_PREFIX} 약 **{distance:.2f}** km{matched_name_note}")
+        else:
+            output_lines.append(f"{DISTANCE_LINE_PREFIX} 정보 없음 (데이터 불일치 또는 좌표 누락)")
+
+        places.append({
+            "name": place_name,
+            "matched_name": found.name if found is not None else None,
+            "match_score": found.score if found is not None else None,
+            "lat": found.lat if found is not None else None,
+            "lon": found.lon if found is not None else None,
+            "distance_km": round(distance, 2) if distance is not None else None,
+        })
+    return output_lines, places
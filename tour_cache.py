@@ -0,0 +1,176 @@
+"""
+추천 답변 캐시 모듈.
+
+질문과 사용자 프로필(나이대, 여행 스타일, 기간, 예산, 인원, 특이사항), 그리고 격자 칸으로 묶은
+사용자 위치를 키로 LLM 답변을 SQLite에 저장합니다. TTL이 지난 항목은 무시/삭제하고, 최대 개수를 넘으면
+가장 오래 사용하지 않은(LRU) 항목부터 지웁니다. 임베딩을 지정하면 같은 프로필/격자 칸 안에서
+질문 임베딩 유사도가 임계값 이상인 답변도 재사용합니다. 임베딩 모델명은 프로필 키에 포함되므로
+다른 모델(차원)로 저장된 질문 벡터와는 비교하지 않습니다.
+"""
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from tour_vectorstore import embedding_model_name
+
+RESPONSE_CACHE_PATH = "response_cache.sqlite3"  # 기본 답변 캐시 파일 경로
+_KM_PER_DEGREE = 111.32  # 위도 1도당 거리 (km)
+
+
+def normalize_question(question):
+    """질문 비교용 정규화: NFKC, 소문자화, 연속 공백 축소, 끝의 물음표/마침표 제거."""
+    text = unicodedata.normalize("NFKC", str(question)).lower()
+    return " ".join(text.split()).rstrip("?.!。 ")
+
+
+def grid_cell(lat, lon, cell_km):
+    """위도/경도를 약 `cell_km` 크기의 격자 칸 번호 (행, 열)로 변환합니다."""
+    lat_step = cell_km / _KM_PER_DEGREE
+    row = math.floor(float(lat) / lat_step)
+    center_lat = (row + 0.5) * lat_step  # 같은 행은 같은 경도 폭을 쓰도록 행 중심 위도 기준
+    lon_step = cell_km / (_KM_PER_DEGREE * max(math.cos(math.radians(center_lat)), 1e-6))
+    return row, math.floor(float(lon) / lon_step)
+
+
+class ResponseCache:
+    """TTL과 LRU 제거를 지원하는 SQLite 기반 추천 답변 캐시입니다. 여러 세션(스레드)이 공유할 수 있습니다."""
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, ttl_seconds=24 * 3600, max_entries=2000, cell_km=5.0,
+                 embeddings=None, similarity_threshold=0.95):
+        self.ttl_seconds = ttl_seconds  # 항목 유효 시간 (초)
+        self.max_entries = max_entries  # 최대 저장 항목 수 (초과 시 LRU 제거)
+        self.cell_km = cell_km  # 위치를 묶는 격자 칸 크기 (km)
+        self.embeddings = embeddings  # 질문 유사도 비교용 임베딩 (None이면 정확 일치만 사용)
+        self.embedding_model = embedding_model_name(embeddings) if embeddings is not None else None
+        self.similarity_threshold = similarity_threshold  # 유사 질문으로 인정할 코사인 유사도
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "expired": 0, "evictions": 0}  # 튜닝용 카운터
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, profile_key TEXT NOT NULL, question TEXT NOT NULL,"
+                " question_vector BLOB, answer TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_profile ON responses (profile_key)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    def profile_key(self, inputs):
+        """질문을 제외한 입력(프로필 + 위치 격자 칸)의 해시 키."""
+        lat, lon = inputs.get("user_lat"), inputs.get("user_lon")
+        cell = grid_cell(lat, lon, self.cell_km) if lat is not None and lon is not None else None
+        styles = inputs.get("travel_style") or ""
+        if isinstance(styles, str):
+            styles = [s.strip() for s in styles.split(",")]
+        profile = {
+            "age": inputs.get("age"),
+            "travel_style": sorted(s for s in styles if s),
+            "trip_duration_days": inputs.get("trip_duration_days"),
+            "estimated_budget": inputs.get("estimated_budget"),
+            "num_travelers": inputs.get("num_travelers"),
+            "special_requests": normalize_question(inputs.get("special_requests") or ""),
+            "cell": cell,
+            "cell_km": self.cell_km,
+            "embedding_model": self.embedding_model,  # 백엔드를 바꾸면 이전 질문 벡터와 섞이지 않도록 분리
+        }
+        return hashlib.sha256(json.dumps(profile, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _entry_key(self, profile_key, question):
+        return hashlib.sha256(f"{profile_key}\x1f{question}".encode("utf-8")).hexdigest()
+
+    def _question_vector(self, question):
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get(self, inputs):
+        """캐시된 답변을 반환합니다. 없거나 만료되었으면 None."""
+        question = normalize_question(inputs.get("input", ""))
+        profile_key = self.profile_key(inputs)
+        key = self._entry_key(profile_key, question)
+        now = time.time()
+
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT answer, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats["expired"] += 1
+                row = None
+            if row:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self.stats["hits"] += 1
+                return row[0]
+
+        if self.embeddings is not None:
+            answer = self._semantic_get(profile_key, question, now)
+            if answer is not None:
+                return answer
+
+        self.stats["misses"] += 1
+        return None
+
+    def _semantic_get(self, profile_key, question, now):
+        """같은 프로필/격자 칸의 저장된 질문 중 임베딩 유사도가 가장 높은 항목을 찾습니다."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, question_vector, answer FROM responses"
+                " WHERE profile_key = ? AND question_vector IS NOT NULL AND created_at >= ?",
+                (profile_key, now - self.ttl_seconds),
+            ).fetchall()
+        if not rows:
+            return None
+
+        query_vec = self._question_vector(question)
+        rows = [row for row in rows if len(row[1]) == query_vec.nbytes]  # 차원이 다른 벡터는 비교 대상에서 제외
+        if not rows:
+            return None
+        vectors = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob, _ in rows])
+        similarity = vectors @ query_vec  # 저장 시 정규화했으므로 내적 = 코사인 유사도
+        best = int(np.argmax(similarity))
+        if similarity[best] < self.similarity_threshold:
+            return None
+
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, rows[best][0]))
+        self.stats["semantic_hits"] += 1
+        return rows[best][2]
+
+    def put(self, inputs, answer):
+        """답변을 저장하고, 최대 개수를 넘으면 가장 오래 사용하지 않은 항목부터 제거합니다."""
+        question = normalize_question(inputs.get("input", ""))
+        profile_key = self.profile_key(inputs)
+        vector = self._question_vector(question).tobytes() if self.embeddings is not None else None
+        now = time.time()
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, profile_key, question, question_vector, answer, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._entry_key(profile_key, question), profile_key, question, vector, answer, now, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))  # 만료 항목 정리
+            overflow = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.stats["evictions"] += overflow
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def hit_rate(self):
+        """정확/유사 적중을 합한 적중률 (조회가 없으면 0.0)."""
+        hits = self.stats["hits"] + self.stats["semantic_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
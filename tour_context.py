@@ -0,0 +1,121 @@
+"""
+프롬프트 컨텍스트 조립 모듈.
+
+검색된 관광지 문서를 `{context}`에 넣기 전에 같은 관광지(여러 CSV에 중복 수록된 경우)를 하나로 합치고,
+빈 항목을 빼고, 관광지마다 짧은 한 줄로 다시 쓴 뒤, 토큰 예산을 넘지 않는 만큼만 검색 순위대로 남깁니다.
+토큰 수는 tiktoken 인코딩을 쓸 수 있으면 그것으로, 아니면(오프라인 등) 한글 음절 기반 추정치로 계산합니다.
+"""
+import functools
+import math
+import re
+
+from tour_data import LAT_KEY, LON_KEY
+from tour_geo import haversine_np
+from tour_names import base_place_name
+
+CONTEXT_TOKEN_BUDGET = 1500  # {context}에 넣을 최대 토큰 수 (기본값)
+TOKENIZER_ENCODING = "o200k_base"  # gpt-4o 계열 인코딩
+DEDUPE_DISTANCE_KM = 2.0  # 이름이 같고 이 거리 안이면 같은 관광지로 봄
+CONTEXT_DOCUMENT_SEPARATOR = "\n"  # 한 줄 문서 사이 구분자 (기본 "\n\n"보다 토큰 절약)
+
+_HANGUL = re.compile(r"[가-힣]")
+_FIELD_ORDER = ("관광지명", "시군", "구분", "주소", "전화", "소개")  # tour_data.attraction_text의 항목 이름
+
+
+@functools.lru_cache(maxsize=1)
+def _tiktoken_encoding():
+    try:
+        import tiktoken  # 선택 의존성: langchain-openai와 함께 설치됨
+
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception:  # 미설치 또는 인코딩 파일을 내려받을 수 없는 환경
+        return None
+
+
+def estimate_tokens(text):
+    """텍스트의 토큰 수. tiktoken을 쓸 수 없으면 한글 음절 1개 = 1토큰, 그 밖의 문자 3자 = 1토큰으로 넉넉히 추정합니다."""
+    encoding = _tiktoken_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    hangul = len(_HANGUL.findall(text))
+    return hangul + math.ceil((len(text) - hangul) / 3)
+
+
+def parse_fields(page_content):
+    """'항목: 값 | 항목: 값' 형식의 문서 내용을 딕셔너리로 나눕니다 (빈 값 제외)."""
+    fields = {}
+    for part in page_content.split(" | "):
+        label, sep, value = part.partition(": ")
+        if sep and value.strip():
+            fields.setdefault(label.strip(), value.strip())
+    return fields
+
+
+def compact_line(fields, description_chars=120):
+    """관광지 한 곳을 '이름 (시군/구분) 주소 … 전화 … - 소개' 형식의 짧은 한 줄로 만듭니다."""
+    tags = "/".join(fields[key] for key in ("시군", "구분") if fields.get(key))
+    parts = [fields.get("관광지명", "")]
+    if tags:
+        parts.append(f"({tags})")
+    if fields.get("주소"):
+        parts.append(f"주소 {fields['주소']}")
+    if fields.get("전화"):
+        parts.append(f"전화 {fields['전화']}")
+    line = " ".join(part for part in parts if part)
+    description = fields.get("소개", "")
+    if description:
+        if len(description) > description_chars:
+            description = description[:description_chars].rstrip() + "…"
+        line += f" - {description}"
+    return line
+
+
+class ContextBudgeter:
+    """
+    검색 결과 문서 리스트 -> 중복 제거/압축/토큰 예산 적용된 문서 리스트 변환기입니다.
+    반환되는 문서는 메타데이터(좌표, 관광지 ID 등)를 유지하고 `page_content`만 한 줄로 바뀌므로
+    일정 골격 계산 등 뒤 단계는 그대로 동작합니다.
+    """
+
+    def __init__(self, token_budget=CONTEXT_TOKEN_BUDGET, description_chars=120, dedupe_km=DEDUPE_DISTANCE_KM):
+        self.token_budget = token_budget  # {context} 전체의 최대 토큰 수
+        self.description_chars = description_chars  # 소개 글 최대 글자 수
+        self.dedupe_km = dedupe_km  # 같은 이름의 관광지를 하나로 볼 거리
+
+    def _same_place(self, group_doc, doc):
+        lat1, lon1 = group_doc.metadata.get(LAT_KEY), group_doc.metadata.get(LON_KEY)
+        lat2, lon2 = doc.metadata.get(LAT_KEY), doc.metadata.get(LON_KEY)
+        if None in (lat1, lon1, lat2, lon2):
+            return True  # 좌표를 비교할 수 없으면 이름만으로 판단
+        return float(haversine_np(lat1, lon1, lat2, lon2)) <= self.dedupe_km
+
+    def dedupe(self, documents):
+        """같은 관광지 문서를 묶어 [(대표 문서, 합친 항목 딕셔너리)] 리스트를 검색 순위대로 반환합니다."""
+        groups = []  # [대표 문서, 항목, 이름 키]
+        for doc in documents:
+            fields = parse_fields(doc.page_content)
+            name_key = base_place_name(fields.get("관광지명") or doc.metadata.get("name") or doc.page_content[:30])
+            for group in groups:
+                if group[2] == name_key and self._same_place(group[0], doc):
+                    for label, value in fields.items():  # 먼저 나온 문서에 없는 항목만 채움
+                        group[1].setdefault(label, value)
+                    break
+            else:
+                groups.append([doc, fields, name_key])
+        return [(doc, fields) for doc, fields, _ in groups]
+
+    def __call__(self, documents):
+        """문서 리스트에 중복 제거, 한 줄 압축, 토큰 예산을 적용합니다. 첫 문서는 예산을 넘어도 잘라서 남깁니다."""
+        compacted, used = [], 0
+        separator_tokens = estimate_tokens(CONTEXT_DOCUMENT_SEPARATOR)
+        for doc, fields in self.dedupe(documents):
+            line = compact_line(fields, self.description_chars) if "관광지명" in fields else doc.page_content
+            tokens = estimate_tokens(line) + (separator_tokens if compacted else 0)
+            if used + tokens > self.token_budget:
+                if compacted:
+                    break
+                line = line[:max(1, len(line) * self.token_budget // max(tokens, 1))]  # 첫 문서는 비율대로 잘라 남김
+                tokens = estimate_tokens(line)
+            compacted.append(doc.model_copy(update={"page_content": line}))
+            used += tokens
+        return compacted
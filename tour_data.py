@@ -0,0 +1,453 @@
+"""
+관광지 CSV 데이터 수집(ingestion), 정규화 및 문서 변환 모듈.
+
+폴더/glob 패턴으로 CSV 파일을 찾고, 파일마다 인코딩(UTF-8, UTF-8 BOM, CP949)을 감지하며,
+파일마다 다른 컬럼명(관광지명/관광정보명/명칭, 정제도로명주소/소재지지번주소/주소 등)을 컬럼 매핑 레지스트리
+(`TOUR_COLUMN_MAPPINGS`)에 따라 하나의 표준 스키마로 맞춥니다. 파일이 많으면 프로세스 풀에서 병렬로 파싱합니다.
+각 CSV를 한 번만 읽어 만든 관광지 데이터셋을 거리 계산용 DataFrame과 벡터스토어 문서가 함께 사용합니다.
+관광지 한 곳당 정확히 하나의 간결한 LangChain 문서를 만듭니다. Streamlit에 의존하지 않습니다.
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
+
+from tour_geo import SpatialIndex
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 로드할 관광지 CSV 파일 목록입니다. 파일 경로, 폴더(하위 폴더의 *.csv 포함), glob 패턴을 섞어 쓸 수 있으며
+# `discover_tour_files()`가 실제 파일 목록으로 펼칩니다. 기본값은 실행 위치(cwd)와 무관하게 앱 폴더 기준이며,
+# 벤치마크 결과나 내보낸 CSV가 섞이지 않도록 번들된 파일 계열(관광지 공공데이터, 숫자 ID 내보내기 파일)만 찾습니다.
+# (예: 시도별 공공데이터 파일을 "data" 폴더에 모아 두고 os.path.join(APP_DIR, "data")를 추가)
+TOUR_CSV_FILES = [
+    os.path.join(APP_DIR, "*관광지*.csv"),  # 경기도*관광지현황, 관광지정보현황(제공표준), 전국관광지정보표준데이터 등
+    os.path.join(APP_DIR, "[0-9]*.csv"),  # 공공데이터 포털의 ID 기반 내보내기 파일 (예: 2025661749210500635.csv)
+]
+
+ENCODING_CANDIDATES = ("utf-8", "cp949")  # 인코딩 자동 감지 순서 (BOM이 있으면 utf-8-sig)
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024  # 파일 합계가 이보다 크면 프로세스 풀에서 병렬 파싱
+
+# 정규화된 데이터셋의 바이너리 스냅샷 (콜드 스타트 시 CSV 파싱 생략). CSV 목록처럼 앱 폴더 기준이므로
+# 다른 위치에서 실행한 `tour_engine.py --warm-up`이 만든 스냅샷을 워커가 그대로 사용합니다.
+SNAPSHOT_DIR = os.path.join(APP_DIR, ".tour_snapshot")
+SNAPSHOT_TABLE_FILE = "tour.parquet"  # 전체 컬럼 (Parquet 열 지향 형식)
+SNAPSHOT_COORDS_FILE = "coords.npy"  # float32 (N, 2) [위도, 경도] 배열 (메모리 매핑 가능)
+SNAPSHOT_SPATIAL_DIR = "spatial"  # 데이터셋 행 기준 공간 인덱스 배열 (메모리 매핑 가능)
+SNAPSHOT_META_FILE = "meta.json"  # 원본 파일 서명 (마지막에 기록하여 완료 표시 역할)
+SNAPSHOT_VERSION = 2
+
+# 표준 컬럼별 원본 컬럼 후보 (앞에 있을수록 우선)
+LATITUDE_COLUMN_CANDIDATES = ["위도", "mapy"]
+LONGITUDE_COLUMN_CANDIDATES = ["경도", "mapx"]
+NAME_COLUMN_CANDIDATES = ["관광지명", "관광정보명", "관광지", "명칭"]
+ADDRESS_COLUMN_CANDIDATES = ["정제도로명주소", "정제지번주소", "소재지도로명주소", "소재지지번주소", "관광지소재지지번주소", "관광지소재지도로명주소", "소재주소", "주소"]
+CATEGORY_COLUMN_CANDIDATES = ["관광지구분", "관광지구분명"]
+REGION_COLUMN_CANDIDATES = ["시군명"]
+PHONE_COLUMN_CANDIDATES = ["전화번호", "관리기관전화번호"]
+DESCRIPTION_COLUMN_CANDIDATES = ["관광지소개", "개요"]
+
+# 정규화된 관광지 데이터의 컬럼 순서
+TOUR_COLUMNS = ["관광지ID", "위도", "경도", "관광지명", "소재지도로명주소", "시군명", "관광지구분", "전화번호", "관광지소개", "출처"]
+
+MISSING_NAME = "이름 없음"  # 이름 컬럼이 없는 파일의 기본값
+MISSING_ADDRESS = "주소 없음"  # 주소 컬럼이 없는 파일의 기본값
+
+
+def category_from_source(file_path):
+    """'경기도역사관광지현황.csv' 같은 파일명에서 관광지 분류('역사')를 추출합니다."""
+    match = re.search(r"경기도(.+?)관광지현황", os.path.basename(file_path))
+    return match.group(1) if match else ""
+
+
+# 컬럼 매핑 레지스트리: 표준 컬럼 -> (원본 컬럼 후보 리스트, 후보가 하나도 없을 때의 기본값)
+# 기본값이 함수이면 파일 경로로 호출한 결과를 씁니다. 좌표 컬럼(기본값 None)은 필수입니다.
+# 새 형식의 파일은 `register_column_aliases()`로 후보를 추가하면 코드 수정 없이 읽을 수 있습니다.
+TOUR_COLUMN_MAPPINGS = {
+    "위도": (LATITUDE_COLUMN_CANDIDATES, None),
+    "경도": (LONGITUDE_COLUMN_CANDIDATES, None),
+    "관광지명": (NAME_COLUMN_CANDIDATES, MISSING_NAME),
+    "소재지도로명주소": (ADDRESS_COLUMN_CANDIDATES, MISSING_ADDRESS),
+    "시군명": (REGION_COLUMN_CANDIDATES, ""),
+    "관광지구분": (CATEGORY_COLUMN_CANDIDATES, category_from_source),
+    "전화번호": (PHONE_COLUMN_CANDIDATES, ""),
+    "관광지소개": (DESCRIPTION_COLUMN_CANDIDATES, ""),
+}
+COORDINATE_COLUMNS = ("위도", "경도")
+
+LAT_KEY = "lat"  # 문서 메타데이터의 위도 키
+LON_KEY = "lon"  # 문서 메타데이터의 경도 키
+PLACE_ID_KEY = "place_id"  # 문서 메타데이터의 관광지ID 키 (데이터셋 행과 1:1 대응)
+FILE_HASHES_ATTR = "file_sha256"  # 데이터셋 attrs에 저장하는 파일별 SHA-256 해시
+DOCUMENT_SCHEMA = "attraction-row-v3"  # 문서 형식 식별자 (바뀌면 벡터스토어 전체 재생성)
+DESCRIPTION_MAX_CHARS = 200  # 문서에 포함할 관광지 소개 최대 길이
+
+
+class TourSchemaError(ValueError):
+    """CSV 파일이 관광지 표준 스키마로 변환할 수 없는 형식일 때 발생합니다."""
+
+
+def _first_present(columns, candidates):
+    """후보 컬럼명 중 DataFrame에 존재하는 첫 번째 컬럼명을 반환합니다."""
+    for candidate in candidates:
+        if candidate in columns:
+            return candidate
+    return None
+
+
+def register_column_aliases(column, *candidates):
+    """표준 컬럼 `column`의 원본 컬럼 후보를 (기존 후보 뒤에) 추가합니다."""
+    if column not in TOUR_COLUMN_MAPPINGS:
+        raise KeyError(f"알 수 없는 표준 컬럼입니다: {column}")
+    existing = TOUR_COLUMN_MAPPINGS[column][0]
+    existing.extend(candidate for candidate in candidates if candidate not in existing)
+
+
+def _text_column(df, candidates, default=""):
+    """후보 컬럼 중 첫 번째 컬럼을 공백 제거한 문자열로 반환합니다. 없으면 기본값으로 채웁니다."""
+    column = _first_present(df.columns, candidates)
+    if column is None:
+        return pd.Series(default, index=df.index, dtype=object)
+    values = df[column].fillna("").astype(str).str.strip()
+    return values.mask(values.str.lower() == "null", "")  # 일부 공공데이터의 'null' 문자열은 빈 값으로
+
+
+def normalize_tour_frame(df, source):
+    """
+    CSV에서 읽은 DataFrame을 컬럼 매핑 레지스트리에 따라 표준 관광지 스키마(`TOUR_COLUMNS`)로 변환합니다.
+    좌표 컬럼 후보가 하나도 없으면 TourSchemaError를 발생시키고, 좌표가 비어 있는 행은 제외합니다.
+    """
+    df = df.copy()
+    df.columns = df.columns.astype(str).str.strip()  # 컬럼명 공백 제거
+    normalized = pd.DataFrame(index=df.index)
+    for column, (candidates, default) in TOUR_COLUMN_MAPPINGS.items():
+        if column in COORDINATE_COLUMNS:
+            present = _first_present(df.columns, candidates)
+            if present is None:  # 필수 컬럼 확인
+                raise TourSchemaError(f"'{os.path.basename(source)}' 파일에 '위도', '경도' 컬럼이 없습니다.")
+            normalized[column] = pd.to_numeric(df[present], errors="coerce")
+        else:
+            normalized[column] = _text_column(df, candidates, default(source) if callable(default) else default)
+    normalized["출처"] = os.path.basename(source)
+
+    normalized = normalized.dropna(subset=["위도", "경도"])  # 좌표 없는 행 제외
+    identity = normalized[["출처", "관광지명", "소재지도로명주소", "위도", "경도"]]
+    hashes = pd.util.hash_pandas_object(identity, index=False).to_numpy()  # 실행마다 같은 결정적 해시
+    normalized["관광지ID"] = [f"{h:016x}" for h in hashes]
+    normalized = normalized.drop_duplicates(subset="관광지ID")  # 같은 파일 안의 완전히 중복된 관광지 행 제거
+    return normalized.reset_index(drop=True)[TOUR_COLUMNS]
+
+
+def discover_tour_files(sources):
+    """
+    파일 경로, 폴더, glob 패턴 목록을 실제 CSV 파일 경로 목록으로 펼칩니다.
+    폴더는 하위 폴더까지 *.csv를 찾고, 패턴은 `**`를 지원합니다. 결과는 항목별로 정렬하고 중복을 제거합니다.
+    패턴이 아닌 파일 경로는 존재하지 않아도 그대로 남겨 로드 시 누락 경고가 나오게 합니다.
+    """
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+    files, seen = [], set()
+    for source in sources:
+        source = os.fspath(source)
+        if os.path.isdir(source):
+            matches = sorted(glob.glob(os.path.join(source, "**", "*.csv"), recursive=True))
+        elif glob.has_magic(source):
+            matches = sorted(path for path in glob.glob(source, recursive=True) if os.path.isfile(path))
+        else:
+            matches = [source]
+        for path in matches:
+            key = os.path.normpath(path)
+            if key not in seen:
+                seen.add(key)
+                files.append(path)
+    return files
+
+
+def decode_csv_bytes(raw, encoding=None, candidates=ENCODING_CANDIDATES):
+    """
+    CSV 바이트를 디코딩하여 (인코딩, 텍스트)를 반환합니다. `encoding`이 None이면 UTF-8 BOM은 'utf-8-sig',
+    아니면 후보 중 오류 없이 디코딩되는 첫 인코딩을 쓰며, 감지에 성공한 디코딩 결과를 그대로 재사용합니다.
+    """
+    if encoding is None and raw.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
+    if encoding is not None:
+        return encoding, raw.decode(encoding)
+    for candidate in candidates[:-1]:
+        try:
+            return candidate, raw.decode(candidate)
+        except UnicodeDecodeError:
+            continue
+    return candidates[-1], raw.decode(candidates[-1])  # 마지막 후보도 맞지 않으면 디코딩 오류를 그대로 전달
+
+
+def detect_encoding(raw, candidates=ENCODING_CANDIDATES):
+    """CSV 바이트의 인코딩을 감지합니다 (디코딩한 텍스트도 필요하면 `decode_csv_bytes`를 사용)."""
+    try:
+        return decode_csv_bytes(raw, candidates=candidates)[0]
+    except UnicodeDecodeError:
+        return candidates[-1]  # 어느 것도 맞지 않으면 마지막 후보로 시도하여 오류 메시지를 남김
+
+
+def _read_csv_lenient(text):
+    """
+    따옴표가 깨진 행이 있는 CSV를 표준 csv 모듈로 읽습니다 (pandas 파싱 실패 시 대체).
+    필드가 헤더보다 많은 행은 넘치는 필드를 마지막 컬럼에 합치고, 모자란 행은 빈 값으로 채웁니다.
+    """
+    rows = csv.reader(io.StringIO(text))
+    header = next(rows, [])
+    width = len(header)
+    records = []
+    for row in rows:
+        if len(row) > width:
+            row = row[:width - 1] + [",".join(row[width - 1:])]
+        records.append(row + [""] * (width - len(row)))
+    return pd.DataFrame(records, columns=header).replace("", np.nan)
+
+
+def _read_csv_text(text):
+    try:
+        return pd.read_csv(io.StringIO(text), low_memory=False)
+    except pd.errors.ParserError:  # 따옴표가 깨진 행이 있는 파일
+        return _read_csv_lenient(text)
+
+
+def read_tour_csv(file_path, encoding=None):
+    """관광지 CSV 파일 하나를 읽어 표준 스키마로 정규화합니다. `encoding`이 None이면 자동 감지합니다."""
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    return normalize_tour_frame(_read_csv_text(decode_csv_bytes(raw, encoding)[1]), file_path)
+
+
+def _parse_tour_file(file_path, encoding=None):
+    """
+    CSV 파일 하나를 읽어 (정규화된 DataFrame, SHA-256 해시, 경고 메시지)를 반환합니다.
+    프로세스 풀 작업 함수이므로 예외를 던지지 않고 경고 메시지로 돌려줍니다 (실패 시 DataFrame은 None).
+    """
+    if not os.path.exists(file_path):
+        return None, None, f"'{file_path}' 파일을 찾을 수 없어 건너뜁니다."
+    used_encoding = encoding
+    try:
+        with open(file_path, "rb") as f:
+            raw = f.read()  # 파일 I/O는 한 번만
+        used_encoding, text = decode_csv_bytes(raw, encoding)  # 감지와 디코딩을 한 번에
+        frame = normalize_tour_frame(_read_csv_text(text), file_path)
+        return frame, hashlib.sha256(raw).hexdigest(), None
+    except TourSchemaError as e:  # '위도', '경도' 컬럼이 없는 파일
+        return None, None, f"{e} 해당 파일을 건너뜁니다."
+    except Exception as e:
+        return None, None, f"'{os.path.basename(file_path)}' 파일 ({used_encoding or '자동 감지'} 인코딩 시도) 처리 중 오류 발생: {e}"
+
+
+def _parse_workers(file_paths, workers):
+    """병렬 파싱 프로세스 수. `workers`를 생략하면 파일 합계가 PARALLEL_MIN_BYTES 이상일 때만 병렬로 파싱합니다."""
+    if workers is None:
+        total_bytes = sum(os.path.getsize(path) for path in file_paths if os.path.exists(path))
+        workers = (os.cpu_count() or 1) if total_bytes >= PARALLEL_MIN_BYTES else 1
+    return max(1, min(workers, len(file_paths)))
+
+
+def load_tour_dataset(file_paths, encoding=None, workers=None):
+    """
+    관광지 CSV 파일들을 파일당 한 번씩만 읽어 하나의 정규화된 데이터셋으로 병합합니다.
+    `file_paths`는 파일/폴더/glob 패턴 목록이고 (`discover_tour_files`), `encoding`이 None이면 파일마다 감지합니다.
+    파일이 많거나 크면 `workers`개 프로세스에서 병렬로 파싱합니다 (None: 자동, 1: 순차).
+    (데이터셋, 경고 메시지 리스트)를 반환하며, 읽은 바이트로 계산한 파일별 SHA-256 해시를
+    `dataset.attrs[FILE_HASHES_ATTR]`에 담아 벡터스토어 동기화가 파일을 다시 읽지 않게 합니다.
+    """
+    frames, warnings, file_hashes, sources = [], [], {}, {}
+    parse_paths = []
+    for file_path in discover_tour_files(file_paths):
+        name = os.path.basename(file_path)
+        if name in sources:  # '출처'(파일명)로 행을 구분하므로 같은 이름의 파일은 하나만 사용
+            warnings.append(f"'{file_path}' 파일은 '{sources[name]}'와 파일명이 같아 건너뜁니다. 파일명을 바꿔주세요.")
+            continue
+        sources[name] = file_path
+        parse_paths.append(file_path)
+
+    workers = _parse_workers(parse_paths, workers)
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_parse_tour_file, parse_paths, [encoding] * len(parse_paths)))
+        except Exception:  # 프로세스를 만들 수 없는 환경 등은 순차 파싱으로 대체
+            results = [_parse_tour_file(file_path, encoding) for file_path in parse_paths]
+    else:
+        results = [_parse_tour_file(file_path, encoding) for file_path in parse_paths]
+
+    for file_path, (frame, file_hash, warning) in zip(parse_paths, results):  # 파일 순서대로 병합
+        if warning:
+            warnings.append(warning)
+            continue
+        frames.append(frame)
+        file_hashes[os.path.normpath(file_path)] = file_hash
+
+    dataset = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=TOUR_COLUMNS)  # 마지막에 한 번만 병합
+    dataset.attrs[FILE_HASHES_ATTR] = file_hashes
+    return dataset, warnings
+
+
+def source_signature(file_paths, encoding):
+    """
+    스냅샷 신선도 판단용 원본 파일 서명 (경로, 크기, 수정 시각). 없는 파일은 None으로 기록합니다.
+    폴더/패턴은 찾은 파일 목록으로 펼치므로 CSV 파일이 추가/삭제되어도 서명이 바뀝니다.
+    """
+    files = {}
+    for file_path in discover_tour_files(file_paths):
+        try:
+            stat = os.stat(file_path)
+            files[os.path.normpath(file_path)] = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            files[os.path.normpath(file_path)] = None
+    return {"version": SNAPSHOT_VERSION, "schema": TOUR_COLUMNS, "encoding": encoding, "files": files}
+
+
+def write_tour_snapshot(dataset, file_paths, encoding=None, snapshot_dir=SNAPSHOT_DIR):
+    """
+    정규화된 데이터셋을 Parquet 테이블과 float32 좌표 배열(.npy)로 저장합니다.
+    임시 폴더에 모두 쓴 뒤 폴더째 교체하므로 읽는 쪽이 반쯤 쓰인 스냅샷을 보지 않습니다.
+    """
+    tmp_dir = snapshot_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    dataset.to_parquet(os.path.join(tmp_dir, SNAPSHOT_TABLE_FILE), index=False)
+    coords = dataset[["위도", "경도"]].to_numpy(dtype=np.float32)
+    np.save(os.path.join(tmp_dir, SNAPSHOT_COORDS_FILE), coords)
+    SpatialIndex.from_dataframe(dataset).save(os.path.join(tmp_dir, SNAPSHOT_SPATIAL_DIR), _spatial_stamp(dataset))
+
+    meta = source_signature(file_paths, encoding)
+    meta["rows"] = len(dataset)
+    meta[FILE_HASHES_ATTR] = dataset.attrs.get(FILE_HASHES_ATTR, {})
+    with open(os.path.join(tmp_dir, SNAPSHOT_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.replace(tmp_dir, snapshot_dir)
+
+
+def load_tour_snapshot(file_paths, encoding=None, snapshot_dir=SNAPSHOT_DIR):
+    """원본 CSV 서명이 스냅샷 기록과 같을 때만 스냅샷 데이터셋을 반환합니다. 오래되었거나 없으면 None."""
+    try:
+        with open(os.path.join(snapshot_dir, SNAPSHOT_META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        current = source_signature(file_paths, encoding)
+        if any(meta.get(key) != value for key, value in current.items()):
+            return None
+        dataset = pd.read_parquet(os.path.join(snapshot_dir, SNAPSHOT_TABLE_FILE))
+    except Exception:  # 스냅샷 없음/손상/pyarrow 미설치 등은 CSV 파싱으로 대체
+        return None
+    if len(dataset) != meta.get("rows"):
+        return None
+    dataset.attrs[FILE_HASHES_ATTR] = meta.get(FILE_HASHES_ATTR, {})
+    return dataset
+
+
+def load_snapshot_coordinates(snapshot_dir=SNAPSHOT_DIR, mmap=True):
+    """스냅샷의 float32 (N, 2) 좌표 배열을 반환합니다. `mmap=True`이면 읽기 전용 메모리 매핑으로 엽니다."""
+    return np.load(os.path.join(snapshot_dir, SNAPSHOT_COORDS_FILE), mmap_mode="r" if mmap else None)
+
+
+def _spatial_stamp(dataset):
+    return {"rows": len(dataset), FILE_HASHES_ATTR: dataset.attrs.get(FILE_HASHES_ATTR, {})}
+
+
+def load_snapshot_spatial_index(dataset, snapshot_dir=SNAPSHOT_DIR, mmap=True):
+    """
+    스냅샷에 저장된 `dataset` 기준 공간 인덱스를 엽니다 (기본: 메모리 매핑).
+    스냅샷이 다른 데이터(파일 해시/행 수)로 만들어졌거나 없으면 None을 반환합니다.
+    """
+    return SpatialIndex.load(os.path.join(snapshot_dir, SNAPSHOT_SPATIAL_DIR), _spatial_stamp(dataset), mmap=mmap)
+
+
+def load_or_build_tour_dataset(file_paths, encoding=None, snapshot_dir=SNAPSHOT_DIR):
+    """
+    스냅샷이 최신이면 스냅샷을, 아니면 CSV를 파싱한 뒤 새 스냅샷을 기록하고 (데이터셋, 경고 리스트)를 반환합니다.
+    경고가 있었던 경우(파일 누락/파싱 실패)에는 문제가 계속 보이도록 스냅샷을 기록하지 않습니다.
+    """
+    dataset = load_tour_snapshot(file_paths, encoding, snapshot_dir) if snapshot_dir else None
+    if dataset is not None:
+        return dataset, []
+
+    dataset, warnings = load_tour_dataset(file_paths, encoding)
+    if snapshot_dir and not warnings and not dataset.empty:
+        try:
+            write_tour_snapshot(dataset, file_paths, encoding, snapshot_dir)
+        except Exception as e:  # 스냅샷 기록 실패는 치명적이지 않음
+            warnings.append(f"관광지 데이터 스냅샷 저장에 실패했습니다: {e}")
+    return dataset, warnings
+
+
+def attraction_text(row):
+    """관광지 한 곳을 임베딩/프롬프트용 한 줄 텍스트로 만듭니다. 빈 항목과 기본값 항목은 생략합니다."""
+    description = row["관광지소개"]
+    if len(description) > DESCRIPTION_MAX_CHARS:
+        description = description[:DESCRIPTION_MAX_CHARS] + "…"
+    fields = [
+        ("관광지명", row["관광지명"]),
+        ("시군", row["시군명"]),
+        ("구분", row["관광지구분"]),
+        ("주소", row["소재지도로명주소"]),
+        ("전화", row["전화번호"]),
+        ("소개", description),
+    ]
+    return " | ".join(f"{label}: {value}" for label, value in fields if value and value not in (MISSING_NAME, MISSING_ADDRESS))
+
+
+def build_attraction_documents(tour_df):
+    """정규화된 관광지 DataFrame의 각 행을 좌표/출처/분류 메타데이터가 붙은 문서 하나로 변환합니다."""
+    documents = []
+    for row in tour_df.to_dict("records"):
+        documents.append(Document(
+            page_content=attraction_text(row),
+            metadata={
+                LAT_KEY: float(row["위도"]),
+                LON_KEY: float(row["경도"]),
+                "name": row["관광지명"],
+                "region": row["시군명"],
+                "category": row["관광지구분"],
+                "source": row["출처"],
+                PLACE_ID_KEY: row["관광지ID"],
+            },
+        ))
+    return documents
+
+
+def dataset_row_loader(dataset):
+    """
+    `sync_vectorstore`의 `load_rows`로 쓸 수 있도록, 이미 읽어 둔 데이터셋에서 파일별 문서를 만드는 함수를 반환합니다.
+    데이터셋에 없는 파일(읽기 실패, 파일명 중복으로 제외)은 None을 반환하여 기존 인덱스 내용을 유지하게 합니다.
+    """
+    rows_by_source = {source: frame for source, frame in dataset.groupby("출처", sort=False)}
+    loaded_files = dataset.attrs.get(FILE_HASHES_ATTR)
+
+    def load_rows(file_path):
+        if loaded_files is not None and os.path.normpath(file_path) not in loaded_files:
+            return None
+        frame = rows_by_source.get(os.path.basename(file_path))
+        return build_attraction_documents(frame) if frame is not None else None
+
+    return load_rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="관광지 CSV를 정규화하여 바이너리 스냅샷을 생성합니다.")
+    parser.add_argument("files", nargs="*", default=TOUR_CSV_FILES, help="CSV 파일/폴더/glob 패턴 목록 (기본: TOUR_CSV_FILES)")
+    parser.add_argument("--encoding", default=None, help="CSV 인코딩 (기본: 파일마다 자동 감지)")
+    parser.add_argument("--workers", type=int, default=None, help="병렬 파싱 프로세스 수 (기본: 파일 크기에 따라 자동)")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR, help="스냅샷 저장 폴더")
+    args = parser.parse_args()
+
+    tour_df, load_warnings = load_tour_dataset(args.files, args.encoding, args.workers)
+    for message in load_warnings:
+        print(f"[경고] {message}")
+    write_tour_snapshot(tour_df, args.files, args.encoding, args.snapshot_dir)
+    print(f"스냅샷 저장 완료: {args.snapshot_dir} ({len(tour_df)}개 관광지)")
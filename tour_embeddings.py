@@ -0,0 +1,163 @@
+"""
+임베딩 백엔드 및 디스크 캐시 모듈.
+
+(모델, 텍스트 해시)를 키로 임베딩 벡터를 SQLite에 저장하는 캐시 래퍼와,
+네트워크 없이 동작하는 결정적(deterministic) 문자 n-gram 해싱 임베더를 제공합니다.
+`TOUR_EMBEDDING_BACKEND` 환경 변수로 백엔드를 선택합니다 ("openai" 또는 "hash").
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_PATH = "embedding_cache.sqlite3"  # 기본 임베딩 캐시 파일 경로
+EMBEDDING_BACKEND_ENV = "TOUR_EMBEDDING_BACKEND"  # 임베딩 백엔드 선택 환경 변수
+_SQLITE_MAX_PARAMS = 500  # 한 번의 IN (...) 질의에 넣을 최대 키 수
+
+
+def text_hash(text):
+    """임베딩 캐시 키로 사용하는 텍스트의 SHA-256 해시."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SQLiteEmbeddingCache:
+    """(모델, 텍스트 해시) -> float32 벡터를 저장하는 SQLite 캐시입니다. 여러 스레드에서 공유할 수 있습니다."""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")  # 읽기와 쓰기가 서로 막지 않도록 WAL 사용
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+            )
+
+    def get_many(self, model, hashes):
+        """여러 해시를 묶어서 조회합니다. 캐시에 있는 것만 {해시: 벡터} 딕셔너리로 반환합니다."""
+        found = {}
+        hashes = list(dict.fromkeys(hashes))  # 중복 제거 (순서 유지)
+        with self._lock:
+            for start in range(0, len(hashes), _SQLITE_MAX_PARAMS):
+                batch = hashes[start:start + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                )
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model, items):
+        """(해시, 벡터) 목록을 하나의 트랜잭션으로 저장합니다."""
+        rows = [(model, h, np.asarray(vec, dtype=np.float32).tobytes()) for h, vec in items]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)", rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    다른 임베딩 백엔드를 감싸서 디스크 캐시를 먼저 조회하고, 없는 텍스트만 배치로 임베딩하는 래퍼입니다.
+    `model` 속성은 감싼 백엔드의 모델명을 그대로 노출하므로 인덱스 매니페스트의 모델 비교에 영향을 주지 않습니다.
+    """
+
+    def __init__(self, underlying, cache, model=None, batch_size=256):
+        self.underlying = underlying  # 실제 임베딩 백엔드
+        self.cache = cache  # SQLiteEmbeddingCache
+        self.model = model or getattr(underlying, "model", None) or type(underlying).__name__  # 캐시 키에 쓰는 모델명
+        self.batch_size = batch_size  # 백엔드 호출 한 번에 보낼 텍스트 수
+        self.hits = 0  # 캐시 적중 수
+        self.misses = 0  # 캐시 미적중(실제 임베딩) 수
+
+    def embed_documents(self, texts):
+        """캐시에 없는 고유 텍스트만 배치로 임베딩하고 결과를 캐시에 저장합니다."""
+        hashes = [text_hash(t) for t in texts]
+        cached = self.cache.get_many(self.model, hashes)
+
+        missing = {}  # 해시 -> 텍스트 (중복 텍스트는 한 번만 임베딩)
+        for h, t in zip(hashes, texts):
+            if h not in cached:
+                missing.setdefault(h, t)
+        self.hits += len(texts) - sum(1 for h in hashes if h not in cached)
+        self.misses += len(missing)
+
+        missing_items = list(missing.items())
+        for start in range(0, len(missing_items), self.batch_size):
+            batch = missing_items[start:start + self.batch_size]
+            vectors = self.underlying.embed_documents([t for _, t in batch])
+            new_entries = [(h, np.asarray(vec, dtype=np.float32)) for (h, _), vec in zip(batch, vectors)]
+            self.cache.put_many(self.model, new_entries)  # 배치마다 저장하여 중간 실패 시에도 진행분 보존
+            cached.update(new_entries)
+
+        return [cached[h].tolist() for h in hashes]
+
+    def embed_query(self, text):
+        """질의 임베딩도 같은 캐시를 사용합니다 (반복 질문은 API를 호출하지 않음)."""
+        h = text_hash(text)
+        cached = self.cache.get_many(self.model, [h])
+        if h in cached:
+            self.hits += 1
+            return cached[h].tolist()
+        self.misses += 1
+        vector = np.asarray(self.underlying.embed_query(text), dtype=np.float32)
+        self.cache.put_many(self.model, [(h, vector)])
+        return vector.tolist()
+
+
+class HashEmbeddings(Embeddings):
+    """
+    문자 n-gram 해싱(feature hashing) 기반의 결정적 로컬 임베더입니다.
+    네트워크와 API 키 없이 같은 텍스트에 항상 같은 벡터를 만들며, 글자 조각이 겹치는 텍스트끼리
+    유사도가 높아지므로 오프라인 인덱스 생성, CI, 벤치마크에 사용할 수 있습니다.
+    """
+
+    def __init__(self, size=256, ngram_range=(1, 3)):
+        self.size = size  # 벡터 차원
+        self.ngram_range = ngram_range  # 사용할 n-gram 길이 범위
+        self.model = f"hash-ngram-{size}-{ngram_range[0]}-{ngram_range[1]}"  # 매니페스트/캐시용 모델명
+
+    def _embed(self, text):
+        vec = np.zeros(self.size, dtype=np.float32)
+        text = " ".join(text.lower().split())  # 공백 정규화
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            for i in range(len(text) - n + 1):
+                h = zlib.crc32(text[i:i + n].encode("utf-8"))
+                vec[h % self.size] += 1.0 if (h >> 31) & 1 else -1.0  # 부호 해싱으로 충돌 편향 완화
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm > 0 else vec).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def get_embeddings(backend=None, cache_path=EMBEDDING_CACHE_PATH):
+    """
+    설정된 임베딩 백엔드를 생성합니다.
+    - "openai": OpenAIEmbeddings를 SQLite 캐시로 감싸서 반환 (`cache_path=None`이면 캐시 없이 반환)
+    - "hash": 네트워크가 필요 없는 HashEmbeddings 반환 (계산이 저렴하므로 캐시하지 않음)
+    """
+    backend = (backend or os.getenv(EMBEDDING_BACKEND_ENV, "openai")).lower()
+    if backend == "hash":
+        return HashEmbeddings()
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings  # 오프라인 환경에서는 불러오지 않도록 지연 import
+
+        underlying = OpenAIEmbeddings()
+        return CachedEmbeddings(underlying, SQLiteEmbeddingCache(cache_path)) if cache_path else underlying
+    raise ValueError(f"알 수 없는 임베딩 백엔드입니다: {backend} (openai 또는 hash)")
@@ -0,0 +1,698 @@
+"""
+관광지 추천 엔진 모듈.
+
+데이터 로드 -> 벡터스토어 구축/로드 -> 위치 기반 검색 -> LLM 답변 생성 -> 후처리(거리 계산, 여행 계획표 파싱)
+전체 파이프라인을 Streamlit 없이 호출할 수 있게 묶은 `TripEngine`을 제공합니다.
+한 번에 하나의 질문을 처리하는 동기 메서드(`plan`)와, 여러 요청을 제한된 동시성으로 처리하는
+asyncio 배치 메서드(`plan_batch`)가 있어 워커, 야간 사전 생성 작업, 여러 프론트엔드가 같은 엔진을 공유할 수 있습니다.
+각 요청의 단계별 소요 시간과 토큰 수는 `tour_trace`로 추적되어 결과의 "trace"에 담기고, `metrics`에 집계됩니다.
+
+    python tour_engine.py requests.jsonl results.jsonl --concurrency 4 --metrics tour_metrics.jsonl
+    python tour_engine.py --warm-up    # 워커 시작 전: 스냅샷/인덱스/공간 인덱스를 준비하고 페이지 캐시에 올림
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+from operator import itemgetter
+
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda, RunnableParallel
+
+from tour_answer import (
+    ANSWER_JSON_SCHEMA, DAYS_JSON_SCHEMA, PLACES_JSON_SCHEMA, annotate_recommendations, merge_structured_answers,
+    parse_any_answer,
+)
+from tour_context import CONTEXT_DOCUMENT_SEPARATOR, CONTEXT_TOKEN_BUDGET, ContextBudgeter
+from tour_data import (
+    APP_DIR, DOCUMENT_SCHEMA, FILE_HASHES_ATTR, SNAPSHOT_DIR, TOUR_CSV_FILES, dataset_row_loader, discover_tour_files,
+    load_or_build_tour_dataset, load_snapshot_spatial_index,
+)
+from tour_embeddings import get_embeddings
+from tour_geo import DistanceMatrixCache, SpatialIndex
+from tour_lexical import LexicalIndex
+from tour_llm import wrap_with_gateway
+from tour_planner import places_from_documents, plan_itinerary
+from tour_names import PlaceNameIndex
+from tour_retrieval import HybridRetriever, create_geo_retrieval_chain, load_geo_retriever
+from tour_shards import (
+    MAX_LOADED_SHARDS, RegionResolver, RegionShards, ShardedGeoRetriever, place_regions, region_keys, shard_root,
+)
+from tour_trace import RequestTrace, trace_attribute, trace_count, trace_stage, tracing
+from tour_vectorstore import DEFAULT_INDEX_TYPE, INDEX_TYPE_ENV, INDEX_TYPES, prefault_index, sync_vectorstore
+
+VECTOR_DB_PATH = os.path.join(APP_DIR, "faiss_tourist_attractions")  # 벡터스토어 저장 폴더 (스냅샷과 같이 앱 폴더 기준)
+DEFAULT_CHAT_MODEL = "gpt-4o"
+NO_ITINERARY_TEXT = "없음 (관광지 데이터를 참고하여 직접 계획)"  # 골격을 만들 수 없을 때 프롬프트에 넣는 문구
+
+OUTPUT_FORMATS = ("markdown", "json")  # 답변 형식: 마크다운 추천 목록 + 표, 또는 스키마를 지정한 JSON
+OUTPUT_FORMAT_ENV = "TOUR_OUTPUT_FORMAT"  # 답변 형식을 지정하는 환경 변수
+GENERATION_MODES = ("single", "parallel")  # 답변 생성: 한 번의 호출, 또는 추천 관광지/일차별 일정 동시 생성
+GENERATION_MODE_ENV = "TOUR_GENERATION_MODE"  # 생성 방식을 지정하는 환경 변수
+FAST_MODEL_ENV = "TOUR_FAST_MODEL"  # 병렬 생성에서 추천 관광지 부분에 쓸 (저렴한) 모델 이름
+SHARD_ENV = "TOUR_SHARD_BY_REGION"  # "1"이면 지역(시군)별 샤드 벡터스토어 사용
+
+_PROMPT_CONTEXT_TEMPLATE = """
+당신은 사용자 위치 기반 여행지 추천 및 상세 여행 계획 수립 챗봇입니다.
+사용자의 나이대, 여행 성향, 현재 위치 정보, 그리고 다음의 추가 정보를 참고하여 사용자가 입력한 질문에 가장 적합한 관광지를 추천하고, 이를 바탕으로 상세한 여행 계획을 수립해 주세요.
+**관광지 추천 시 사용자 위치로부터의 거리는 시스템이 자동으로 계산하여 추가할 것이므로, 답변에서 거리를 직접 언급하지 마십시오.**
+특히, 사용자의 현재 위치({user_lat}, {user_lon})에서 가까운 장소들을 우선적으로 고려하여 추천하고 사용자가 선택한 성향에 맞게 추천해주세요.
+
+[관광지 데이터]
+{context}
+
+[사용자 정보]
+나이대: {age}
+여행 성향: {travel_style}
+현재 위치 (위도, 경도): {user_lat}, {user_lon}
+여행 기간: {trip_duration_days}일
+예상 예산: {estimated_budget}원
+여행 인원: {num_travelers}명
+특별 고려사항: {special_requests}
+
+[사용자 질문]
+{input}
+
+[일정 골격]
+{itinerary}
+"""
+
+QA_PROMPT_TEMPLATE = _PROMPT_CONTEXT_TEMPLATE + """
+다음 지침에 따라 상세한 여행 계획을 세워주세요:
+1.  **관광지 추천:** 질문에 부합하고, 사용자 위치에서 가까운 1~3개의 주요 관광지를 추천하고, 각 관광지에 대한 다음 정보를 제공하세요.
+    * 관광지 이름: [관광지명]
+    * 주소: [주소]
+    * 주요 시설/특징: [정보]
+    **[참고: 사용자 위치 기준 거리는 시스템이 자동으로 계산하여 추가할 것이므로, 이 항목은 제외합니다.]**
+    
+2.  **추천된 관광지를 포함하여, 사용자 정보와 질문에 기반한 {trip_duration_days}일간의 상세 여행 계획을 일자별로 구성해 주세요.**
+    * 각 날짜별로 방문할 장소(식당, 카페, 기타 활동 포함), 예상 시간, 간단한 활동 내용을 포함하세요.
+    * 예산을 고려하여 적절한 식사 장소나 활동을 제안할 수 있습니다.
+    * [일정 골격]이 주어지면 일차별 방문 순서, 시간, 이동 방법은 골격을 그대로 따르고, 식사/카페 등 필요한 활동만 사이에 추가하세요. 이동 시간을 새로 추정하지 마세요.
+    * 골격이 없으면 이동 경로(예: "도보 15분", "버스 30분")를 간략하게 언급해 주세요.
+    * 계획은 명확하고 이해하기 쉽게 작성되어야 합니다.
+
+[답변 예시]
+**추천 관광지:**
+- 관광지 이름: [관광지명 1]
+  - 주소: [주소 1]
+  - 주요 시설/특징: [정보 1]
+- 관광지 이름: [관광지명 2]
+  - 주소: [주소 2]
+  - 주요 시설/특징: [정보 2]
+
+**상세 여행 계획 ({trip_duration_days}일):**
+다음 표 형식으로 일자별 상세 계획을 작성해 주세요. 컬럼명은 '일차', '시간', '활동', '예상 장소', '이동 방법'으로 해주세요.
+| 일차 | 시간 | 활동 | 예상 장소 | 이동 방법 |
+|---|---|---|---|---|
+| 1일차 | 오전 (9:00 - 12:00) | [활동 내용] | [장소명] | [이동 방법] |
+| 1일차 | 점심 (12:00 - 13:00) | [식사] | [식당명] | - |
+| 1일차 | 오후 (13:00 - 17:00) | [활동 내용] | [장소명] | [이동 방법] |
+| 1일차 | 저녁 (17:00 이후) | [활동 내용] | [장소명 또는 자유 시간] | - |
+| 2일차 | ... | ... | ... | ... |
+**중요: '일차' 컬럼의 경우, 같은 일차의 여러 활동이 있을 경우 첫 번째 활동에만 해당 '일차'를 명시하고, 나머지 활동 행의 '일차' 셀은 비워두세요 (예: "| | 시간 | 활동 | 예상 장소 | 이동 방법 |"). 이렇게 해야 표에서 '일차'가 자동으로 병합되어 보입니다.**
+"""
+
+
+QA_JSON_PROMPT_TEMPLATE = _PROMPT_CONTEXT_TEMPLATE + """
+질문에 부합하고 사용자 위치에서 가까운 1~3개의 관광지를 추천하고, 이를 포함한 {trip_duration_days}일간의 일자별 계획을 JSON으로만 답하세요.
+- places: 추천 관광지마다 name(관광지명), address(주소), features(주요 시설/특징 한 문장). 거리는 시스템이 계산하므로 쓰지 마세요.
+- days: 일차마다 day(숫자)와 items. items의 각 항목은 [시간, 활동, 예상 장소, 이동 방법] 문자열 배열입니다 (이동이 없으면 "-").
+- 식당, 카페 등 활동을 포함하고 예산을 고려하세요. [일정 골격]이 주어지면 방문 순서, 시간, 이동 방법은 그대로 따르고 필요한 활동만 사이에 추가하세요.
+예: {{"places": [{{"name": "...", "address": "...", "features": "..."}}], "days": [{{"day": 1, "items": [["09:00-12:00", "...", "...", "도보 10분"]]}}]}}
+"""
+
+
+PLACES_PROMPT_TEMPLATE = _PROMPT_CONTEXT_TEMPLATE + """
+질문에 부합하고 사용자 위치에서 가까운 1~3개의 관광지를 추천하여 JSON으로만 답하세요 (여행 계획은 따로 작성되므로 쓰지 마세요).
+- places: 추천 관광지마다 name(관광지명), address(주소), features(주요 시설/특징 한 문장). 거리는 시스템이 계산하므로 쓰지 마세요.
+- [일정 골격]이 주어지면 골격에 포함된 관광지 중에서 추천하세요.
+예: {{"places": [{{"name": "...", "address": "...", "features": "..."}}]}}
+"""
+
+DAY_PROMPT_TEMPLATE = _PROMPT_CONTEXT_TEMPLATE + """
+전체 {trip_duration_days}일 여행 중 {day_numbers}일차의 상세 일정만 JSON으로 답하세요 (다른 일차는 따로 작성됩니다).
+- days: 요청한 일차마다 순서대로 day(숫자)와 items. items의 각 항목은 [시간, 활동, 예상 장소, 이동 방법] 문자열 배열입니다 (이동이 없으면 "-").
+- 식당, 카페 등 활동을 포함하고 예산을 고려하세요. [일정 골격]이 주어지면 방문 순서, 시간, 이동 방법은 그대로 따르고 필요한 활동만 사이에 추가하세요.
+- 골격에 없는 관광지가 필요하면 [관광지 데이터]에서 고르되 다른 일차의 골격 관광지와 겹치지 않게 하세요.
+예: {{"days": [{{"day": 1, "items": [["09:00-12:00", "...", "...", "도보 10분"]]}}]}}
+"""
+
+
+class TripEngineError(RuntimeError):
+    """데이터나 인덱스가 없어 추천을 수행할 수 없을 때 발생합니다."""
+
+
+def build_chain_inputs(question, age, travel_style, user_lat, user_lon, trip_duration_days,
+                       estimated_budget, num_travelers, special_requests=""):
+    """검색 체인이 받는 입력 딕셔너리를 만듭니다. `travel_style`은 리스트 또는 쉼표로 구분한 문자열입니다."""
+    if not isinstance(travel_style, str):
+        travel_style = ", ".join(travel_style)
+    return {
+        "input": question,
+        "age": age,
+        "travel_style": travel_style,
+        "user_lat": user_lat,
+        "user_lon": user_lon,
+        "trip_duration_days": trip_duration_days,
+        "estimated_budget": estimated_budget,
+        "num_travelers": num_travelers,
+        "special_requests": special_requests or "",
+    }
+
+
+def _default_llm(model_name=DEFAULT_CHAT_MODEL):
+    from langchain_openai import ChatOpenAI  # 가짜 LLM을 주입하는 환경에서는 불러오지 않도록 지연 import
+
+    return ChatOpenAI(model_name=model_name, temperature=0.7, max_retries=0,  # 재시도는 LLMGateway가 담당
+                      stream_usage=True)  # 스트리밍에서도 토큰 사용량을 받아 추적에 기록
+
+
+def _json_schema_format(name, schema):
+    """OpenAI `response_format` 인자: 답변을 `schema`로 제한 (strict)."""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+class TripEngine:
+    """
+    Streamlit에 의존하지 않는 관광지 추천 엔진입니다.
+
+    데이터셋, 공간/이름 인덱스, 벡터스토어, 검색 체인은 처음 필요할 때 한 번만 만들어지며
+    (`warm_up()`으로 미리 만들 수 있음) 이후 모든 요청과 스레드가 공유합니다.
+    `embeddings`, `llm`을 주입하면 OpenAI 없이도 전체 파이프라인을 실행할 수 있습니다.
+    `use_planner=True`이면 검색된 관광지로 `tour_planner`의 일정 골격(방문 순서, 시간, 이동 방법)을 계산해
+    프롬프트에 넣어 LLM은 활동 설명만 채우게 합니다. LLM은 `tour_llm.LLMGateway`로 감싸 동시성/속도 제한, 재시도, 동일 요청 병합을 적용합니다 (`llm_options`로 조정).
+    `metrics`(tour_trace.MetricsRecorder)를 주면 `plan`/`aplan` 요청의 추적을 집계하고 파일/Prometheus로 내보냅니다.
+    `mmap_index=True`이면 FAISS 벡터와 공간 인덱스 배열을 읽기 전용 메모리 매핑으로 열어, 한 서버의 여러 워커
+    프로세스가 같은 페이지를 공유하고 시작 시 로드 시간이 줄어듭니다 (DataFrame과 문서 저장소는 프로세스별).
+    `index_type`(tour_vectorstore.INDEX_TYPES, 생략하면 TOUR_INDEX_TYPE 환경 변수 또는 "flat")으로 SQ8/PQ/IVF/HNSW
+    근사 인덱스를 선택할 수 있고, `index_options`로 nlist, nprobe, pq_m, ef_search 등을 조정합니다. 위치가 있는 질의는
+    반경 후보를 전수 비교하므로 근사 탐색(nprobe/ef_search)은 위치 없는 질의에만 쓰이고, 이 경우 인덱스 종류는 메모리만 줄입니다.
+    `output_format="json"`(생략하면 TOUR_OUTPUT_FORMAT 환경 변수 또는 "markdown")이면 답변을 `ANSWER_JSON_SCHEMA`로
+    제한된 JSON으로 받아 한 번에 검증/변환합니다. 후처리는 답변 형식을 자동으로 구분하므로 캐시된 두 형식의 답변이 섞여도 됩니다.
+    `generation_mode="parallel"`(또는 TOUR_GENERATION_MODE)이면 일정 골격으로 관광지 배치를 먼저 정한 뒤 추천 관광지와
+    `days_per_request`일씩의 일정을 같은 컨텍스트로 동시에 요청하고 하나의 JSON 답변으로 합칩니다. 여행 일수가 늘어도
+    지연 시간은 하루치 생성 시간 정도로 유지됩니다. 추천 관광지 부분은 `fast_llm`(채팅 모델 또는 모델 이름,
+    생략하면 TOUR_FAST_MODEL 환경 변수 또는 기본 모델)으로 생성할 수 있습니다.
+    `shard_by_region=True`(또는 TOUR_SHARD_BY_REGION=1)이면 벡터스토어를 지역(시/도 + 시/군)별 샤드로 나누어
+    (`tour_shards`) 사용자 주변 지역의 샤드만 검색 시점에 불러오고, 최근 사용한 `max_loaded_shards`개만 유지합니다.
+    """
+
+    def __init__(self, file_paths=TOUR_CSV_FILES, index_path=VECTOR_DB_PATH, encoding=None,
+                 snapshot_dir=SNAPSHOT_DIR, embeddings=None, llm=None, response_cache=None,
+                 retriever_k=8, radius_km=30.0, llm_options=None, use_planner=True, travel_mode="car", hybrid=True,
+                 context_token_budget=CONTEXT_TOKEN_BUDGET, metrics=None, mmap_index=True, index_type=None,
+                 index_options=None, output_format=None, generation_mode=None, days_per_request=1, fast_llm=None,
+                 shard_by_region=None, max_loaded_shards=MAX_LOADED_SHARDS):
+        self.file_paths = list(file_paths)  # CSV 파일/폴더/glob 패턴 (로드할 때마다 다시 찾음)
+        self.index_path = index_path
+        self.encoding = encoding  # None이면 파일마다 자동 감지
+        self.snapshot_dir = snapshot_dir
+        self.response_cache = response_cache  # tour_cache.ResponseCache (None이면 캐시 없이 항상 생성)
+        self.retriever_k = retriever_k  # 프롬프트에 넣을 검색 문서 수
+        self.radius_km = radius_km  # 검색 후보 반경 (km)
+        self.context_budgeter = ContextBudgeter(context_token_budget)  # 검색 문서 중복 제거/압축/토큰 예산
+        self.hybrid = hybrid  # 벡터 검색에 관광지명/시군명/주소 n-gram BM25 검색을 RRF로 합칠지 여부
+        self.use_planner = use_planner  # 일정 골격을 미리 계산하여 프롬프트에 넣을지 여부
+        self.travel_mode = travel_mode  # 골격의 이동 수단 (tour_planner.TRAVEL_MODES)
+        self.llm_options = llm_options or {}  # LLMGateway 옵션 (max_concurrency, requests_per_minute, max_retries 등)
+        self.metrics = metrics  # tour_trace.MetricsRecorder (None이면 요청 추적을 집계하지 않음)
+        self.mmap_index = mmap_index  # 인덱스를 읽기 전용 메모리 매핑으로 열지 여부
+        self.index_type = index_type or os.getenv(INDEX_TYPE_ENV, DEFAULT_INDEX_TYPE)  # FAISS 인덱스 종류
+        self.index_options = index_options or {}  # 인덱스 종류별 옵션 (tour_vectorstore.DEFAULT_INDEX_OPTIONS)
+        self.output_format = output_format or os.getenv(OUTPUT_FORMAT_ENV, OUTPUT_FORMATS[0])  # 답변 형식 (OUTPUT_FORMATS)
+        if self.output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"알 수 없는 답변 형식입니다: {self.output_format} (선택: {', '.join(OUTPUT_FORMATS)})")
+        self.generation_mode = generation_mode or os.getenv(GENERATION_MODE_ENV, GENERATION_MODES[0])  # 답변 생성 방식
+        if self.generation_mode not in GENERATION_MODES:
+            raise ValueError(f"알 수 없는 생성 방식입니다: {self.generation_mode} (선택: {', '.join(GENERATION_MODES)})")
+        self.days_per_request = max(1, int(days_per_request))  # 병렬 생성에서 요청 하나가 맡을 일수
+        if shard_by_region is None:
+            shard_by_region = os.getenv(SHARD_ENV, "").lower() in ("1", "true", "yes")
+        self.shard_by_region = shard_by_region  # 지역별 샤드 벡터스토어 사용 여부
+        self.max_loaded_shards = max_loaded_shards  # 메모리에 유지할 최대 샤드 수
+        self.startup_trace = RequestTrace("startup")  # warm_up()의 데이터/인덱스/체인 준비 단계별 소요 시간
+
+        self.load_warnings = []  # 데이터 로드 중 건너뛴 파일 등 안내 메시지
+        self.index_stats = None  # 마지막 벡터스토어 동기화 통계
+        self.distance_cache = DistanceMatrixCache()  # 후보 관광지 집합별 거리 행렬 (일정 재계획 시 재사용)
+
+        self._embeddings = embeddings
+        self._llm = llm
+        self._fast_llm = fast_llm or os.getenv(FAST_MODEL_ENV)  # 추천 관광지 부분 모델 (None이면 기본 모델)
+        self._lock = threading.RLock()  # 지연 초기화 보호 (여러 스레드/세션이 같은 엔진을 공유)
+        self._dataset = None
+        self._spatial_index = None
+        self._place_index = None
+        self._lexical_index = None
+        self._vectorstore = None  # FAISS 벡터스토어 (샤드 모드이면 tour_shards.RegionShards)
+        self._regions = None
+        self._retriever = None
+        self._qa_chain = None
+        self._document_chain = None  # 검색된 문서로 답변만 생성하는 체인
+        self._fanout_chain = None  # 병렬 생성 체인 (generation_mode="parallel")
+        self._fanout_generation = None  # 추천 관광지/일차별 일정 동시 생성
+
+    # --- 1. 데이터 로드 ---
+    def load_data(self):
+        """관광지 데이터셋을 로드(스냅샷 우선)하고 반환합니다. 유효한 행이 없으면 TripEngineError."""
+        with self._lock:
+            if self._dataset is None:
+                with trace_stage("load_data"):
+                    dataset, self.load_warnings = load_or_build_tour_dataset(self.file_paths, self.encoding, self.snapshot_dir)
+                if dataset.empty:
+                    raise TripEngineError("지정된 파일들에서 유효한 관광지 데이터를 불러오지 못했습니다.")
+                self._dataset = dataset
+            return self._dataset
+
+    @property
+    def dataset(self):
+        return self.load_data()
+
+    @property
+    def spatial_index(self):
+        """관광지 좌표 공간 인덱스 (반경/최근접 검색용)."""
+        with self._lock:
+            if self._spatial_index is None:
+                dataset = self.dataset
+                with trace_stage("build_spatial_index"):
+                    if self.snapshot_dir and self.mmap_index:  # 스냅샷에 저장된 인덱스를 메모리 매핑으로 재사용
+                        self._spatial_index = load_snapshot_spatial_index(dataset, self.snapshot_dir)
+                    if self._spatial_index is None:
+                        self._spatial_index = SpatialIndex.from_dataframe(dataset)
+            return self._spatial_index
+
+    @property
+    def place_index(self):
+        """관광지 이름 -> 좌표 조회 인덱스 (답변의 관광지명 거리 계산용)."""
+        with self._lock:
+            if self._place_index is None:
+                dataset = self.dataset
+                with trace_stage("build_name_index"):
+                    self._place_index = PlaceNameIndex.from_dataframe(dataset)
+            return self._place_index
+
+    @property
+    def lexical_index(self):
+        """관광지명/시군명/주소 문자 n-gram BM25 색인 (지역명, 정확한 관광지명 질의용)."""
+        with self._lock:
+            if self._lexical_index is None:
+                dataset = self.dataset
+                with trace_stage("build_lexical_index"):
+                    self._lexical_index = LexicalIndex.from_dataframe(dataset)
+            return self._lexical_index
+
+    @property
+    def regions(self):
+        """데이터셋 행별 지역 키 배열 (tour_shards.region_keys)."""
+        with self._lock:
+            if self._regions is None:
+                dataset = self.dataset
+                with trace_stage("assign_regions"):
+                    self._regions = region_keys(dataset)
+            return self._regions
+
+    # --- 2. 인덱스 구축/로드 ---
+    @property
+    def embeddings(self):
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = get_embeddings()
+            return self._embeddings
+
+    def load_index(self):
+        """
+        저장된 벡터스토어를 로드하고 CSV 변경분만 증분 반영합니다. 색인할 문서가 없으면 TripEngineError.
+        샤드 모드이면 지역별 샤드를 모두 증분 갱신한 `RegionShards`를 반환합니다 (샤드는 검색할 때 불러옴).
+        """
+        with self._lock:
+            if self._vectorstore is None:
+                dataset = self.dataset
+                existing_files = [path for path in discover_tour_files(self.file_paths) if os.path.exists(path)]
+                embeddings = self.embeddings
+                if self.shard_by_region:
+                    regions = self.regions
+                    shards = RegionShards(shard_root(self.index_path), embeddings, mmap=self.mmap_index,
+                                          max_loaded=self.max_loaded_shards,
+                                          retriever_options={"k": self.retriever_k, "radius_km": self.radius_km})
+                    with trace_stage("load_index"):
+                        self.index_stats = shards.sync(
+                            existing_files, dataset, regions,
+                            document_schema=DOCUMENT_SCHEMA,
+                            file_hashes=dataset.attrs.get(FILE_HASHES_ATTR),
+                            index_type=self.index_type,
+                            index_options=self.index_options,
+                        )
+                    if not len(shards):
+                        raise TripEngineError("벡터스토어를 생성할 문서가 없습니다. CSV 파일 경로와 내용을 확인해주세요.")
+                    self._vectorstore = shards
+                    return self._vectorstore
+                with trace_stage("load_index"):
+                    vectorstore, self.index_stats = sync_vectorstore(
+                        self.index_path,
+                        existing_files,
+                        dataset_row_loader(dataset),
+                        embeddings,
+                        document_schema=DOCUMENT_SCHEMA,
+                        file_hashes=dataset.attrs.get(FILE_HASHES_ATTR),
+                        mmap=self.mmap_index,
+                        index_type=self.index_type,
+                        index_options=self.index_options,
+                    )
+                if vectorstore is None:
+                    raise TripEngineError("벡터스토어를 생성할 문서가 없습니다. CSV 파일 경로와 내용을 확인해주세요.")
+                self._vectorstore = vectorstore
+            return self._vectorstore
+
+    @property
+    def vectorstore(self):
+        return self.load_index()
+
+    @property
+    def structured_output(self):
+        """답변이 JSON(`ANSWER_JSON_SCHEMA`)으로 생성되는지 여부 (병렬 생성은 항상 JSON)."""
+        return self.output_format == "json" or self.generation_mode == "parallel"
+
+    def get_qa_chain(self):
+        """
+        위치 기반 검색 + 문서 결합(stuff) 체인을 반환합니다. 입력은 `build_chain_inputs` 형식입니다.
+        병렬 생성 모드이면 같은 입력/출력("context", "answer")을 가진 병렬 생성 체인을 반환합니다.
+        """
+        with self._lock:
+            if self._qa_chain is None:
+                self._llm = wrap_with_gateway(self._llm or _default_llm(), **self.llm_options)
+                if self.structured_output:  # 스키마를 벗어난 출력이 나오지 않도록 모델 쪽에서 제한
+                    llm = self._llm.bind(response_format=_json_schema_format("trip_plan", ANSWER_JSON_SCHEMA))
+                    template = QA_JSON_PROMPT_TEMPLATE
+                else:
+                    llm, template = self._llm, QA_PROMPT_TEMPLATE
+                document_chain = create_stuff_documents_chain(
+                    llm, PromptTemplate.from_template(template), document_separator=CONTEXT_DOCUMENT_SEPARATOR,
+                )
+                vectorstore = self.vectorstore
+                with trace_stage("build_geo_retriever"):
+                    if self.shard_by_region:  # 사용자 주변 지역의 샤드만 검색 (지역은 데이터셋 좌표로 판별)
+                        self._retriever = ShardedGeoRetriever(
+                            vectorstore, RegionResolver(self.spatial_index, self.regions),
+                            place_regions(self.dataset, self.regions), k=self.retriever_k, radius_km=self.radius_km,
+                        )
+                    else:
+                        self._retriever = load_geo_retriever(vectorstore, self.index_path, mmap=self.mmap_index,
+                                                             k=self.retriever_k, radius_km=self.radius_km)
+                if self.hybrid:
+                    self._retriever = HybridRetriever(self._retriever, self.lexical_index,
+                                                      self.dataset["관광지ID"].tolist(), k=self.retriever_k)
+                self._document_chain = document_chain
+                self._qa_chain = create_geo_retrieval_chain(
+                    self._retriever, document_chain, self._itinerary_text, context_builder=self.context_budgeter,
+                )
+            if self.generation_mode == "parallel":
+                return self._get_fanout_chain()
+            return self._qa_chain
+
+    def _get_fanout_chain(self):
+        """추천 관광지 요청과 일차별 일정 요청을 동시에 실행하는 체인 (`get_qa_chain`에서 잠금을 잡은 채 호출)."""
+        if self._fanout_chain is None:
+            fast_llm = _default_llm(self._fast_llm) if isinstance(self._fast_llm, str) else self._fast_llm
+            # 빠른 모델도 기본 모델과 같은 게이트웨이를 거치게 하여 동시성/속도 제한을 함께 적용
+            fast_llm = wrap_with_gateway(fast_llm, gateway=self._llm.gateway) if fast_llm is not None else self._llm
+            places_chain = (PromptTemplate.from_template(PLACES_PROMPT_TEMPLATE)
+                            | fast_llm.bind(response_format=_json_schema_format("trip_places", PLACES_JSON_SCHEMA))
+                            | StrOutputParser())
+            day_chain = (PromptTemplate.from_template(DAY_PROMPT_TEMPLATE)
+                         | self._llm.bind(response_format=_json_schema_format("trip_days", DAYS_JSON_SCHEMA))
+                         | StrOutputParser())
+            self._fanout_generation = RunnableParallel(
+                places=itemgetter("places") | places_chain,
+                days=itemgetter("days") | day_chain.map(),  # 일차(묶음)별 요청을 동시에 실행
+            )
+            self._fanout_chain = RunnableLambda(self._fanout_answer, afunc=self._afanout_answer).with_config(
+                run_name="fanout_generation_chain")
+        return self._fanout_chain
+
+    def _fanout_requests(self, inputs):
+        """
+        병렬 생성 준비: 검색 -> 컨텍스트 압축 -> 일정 골격 계산 후 (문서, 요청) 튜플을 반환합니다.
+        요청은 (추천 관광지 요청 입력, 일차 번호 묶음 리스트, 묶음별 일정 요청 입력)이고, 골격이 없으면
+        (관광지 배치를 미리 정할 수 없으므로) None입니다.
+        """
+        with trace_stage("retrieve"):
+            documents = self._retriever.retrieve(inputs["input"], inputs.get("user_lat"), inputs.get("user_lon"))
+        trace_count("retrieved_docs", len(documents))
+        with trace_stage("assemble_context"):
+            documents = self.context_budgeter(documents)
+        trace_count("context_docs", len(documents))
+        if not self.use_planner:
+            return documents, None
+        with trace_stage("build_itinerary"):
+            itinerary = self.build_itinerary(documents, inputs.get("user_lat"), inputs.get("user_lon"),
+                                             inputs.get("trip_duration_days"))
+        if not itinerary:
+            return documents, None
+
+        shared = {**inputs, "context": CONTEXT_DOCUMENT_SEPARATOR.join(doc.page_content for doc in documents)}
+        day_numbers = list(range(1, itinerary.days + 1))
+        chunks = [day_numbers[i:i + self.days_per_request] for i in range(0, len(day_numbers), self.days_per_request)]
+        day_requests = [
+            {**shared, "day_numbers": ", ".join(map(str, chunk)),
+             "itinerary": itinerary.for_days(chunk).to_prompt_text() or NO_ITINERARY_TEXT}
+            for chunk in chunks
+        ]
+        return documents, ({**shared, "itinerary": itinerary.to_prompt_text()}, chunks, day_requests)
+
+    def _fanout_answer(self, inputs):
+        documents, requests = self._fanout_requests(inputs)
+        if requests is None:  # 골격이 없으면 한 번의 호출로 생성
+            answer = self._document_chain.invoke({**inputs, "context": documents, "itinerary": NO_ITINERARY_TEXT})
+            return {**inputs, "context": documents, "answer": answer}
+        places_request, chunks, day_requests = requests
+        trace_count("generation_requests", len(day_requests) + 1)
+        with trace_stage("generate_parallel"):  # 동시 요청 전체의 경과 시간 (llm_generate는 요청별 시간의 합)
+            generated = self._fanout_generation.invoke({"places": places_request, "days": day_requests},
+                                                       config={"max_concurrency": len(day_requests) + 1})
+        return {**inputs, "context": documents,
+                "answer": merge_structured_answers(generated["places"], zip(chunks, generated["days"]))}
+
+    async def _afanout_answer(self, inputs):
+        documents, requests = await asyncio.to_thread(self._fanout_requests, inputs)
+        if requests is None:
+            answer = await self._document_chain.ainvoke({**inputs, "context": documents, "itinerary": NO_ITINERARY_TEXT})
+            return {**inputs, "context": documents, "answer": answer}
+        places_request, chunks, day_requests = requests
+        trace_count("generation_requests", len(day_requests) + 1)
+        with trace_stage("generate_parallel"):
+            generated = await self._fanout_generation.ainvoke({"places": places_request, "days": day_requests},
+                                                              config={"max_concurrency": len(day_requests) + 1})
+        return {**inputs, "context": documents,
+                "answer": merge_structured_answers(generated["places"], zip(chunks, generated["days"]))}
+
+    def warm_up(self, prefault=False):
+        """
+        데이터, 인덱스, 체인을 미리 만들어 첫 요청의 지연을 없앱니다. 단계별 소요 시간은 `startup_trace`에 남습니다.
+        `prefault=True`이면 인덱스 파일을 끝까지 읽어 페이지 캐시에 올립니다 (메모리 매핑을 쓰는 워커가 공유).
+        """
+        with self._lock, tracing(self.startup_trace):
+            self.load_data()
+            self.load_index()
+            self.get_qa_chain()
+            _ = self.spatial_index, self.place_index  # 지연 생성되는 조회 인덱스
+            if prefault:
+                with trace_stage("prefault_index"):
+                    prefault_index(shard_root(self.index_path) if self.shard_by_region else self.index_path)
+        return self
+
+    @property
+    def llm_gateway(self):
+        """LLM 호출 게이트웨이 (호출/재시도/병합 통계 확인용). 체인을 아직 만들지 않았으면 None (인덱스를 불러오지 않음)."""
+        return getattr(self._llm, "gateway", None)
+
+    # --- 3. 검색 ---
+    def retrieve(self, question, user_lat=None, user_lon=None):
+        """질문과 위치로 프롬프트에 들어갈 관광지 문서를 검색합니다 (중복 제거/압축/토큰 예산 적용 후)."""
+        self.get_qa_chain()  # 검색기 생성
+        return self.context_budgeter(self._retriever.retrieve(question, user_lat, user_lon))
+
+    def build_itinerary(self, documents, user_lat, user_lon, trip_duration_days):
+        """검색된 문서의 관광지로 일정 골격(Itinerary)을 계산합니다. 위치가 없으면 None."""
+        if user_lat is None or user_lon is None:
+            return None
+        places = places_from_documents(documents)
+        return plan_itinerary(places, float(user_lat), float(user_lon), trip_duration_days or 1, self.travel_mode,
+                              distance_cache=self.distance_cache)
+
+    def _itinerary_text(self, inputs):
+        """검색 체인에서 호출: 검색 결과(`context`)로 만든 골격의 마크다운 표."""
+        if not self.use_planner:
+            return NO_ITINERARY_TEXT
+        itinerary = self.build_itinerary(inputs["context"], inputs.get("user_lat"), inputs.get("user_lon"),
+                                         inputs.get("trip_duration_days"))
+        return itinerary.to_prompt_text() if itinerary else NO_ITINERARY_TEXT
+
+    # --- 4. 답변 생성 ---
+    def generate(self, inputs, use_cache=True):
+        """답변 텍스트를 생성합니다 (캐시 우선). (답변, 캐시 적중 여부)를 반환합니다."""
+        if use_cache and self.response_cache is not None:
+            with trace_stage("cache_lookup"):
+                answer = self.response_cache.get(inputs)
+            trace_attribute("cached", answer is not None)
+            if answer is not None:
+                return answer, True
+        answer = self.get_qa_chain().invoke(inputs)["answer"]
+        if self.response_cache is not None:
+            with trace_stage("cache_store"):
+                self.response_cache.put(inputs, answer)
+        return answer, False
+
+    async def agenerate(self, inputs, use_cache=True):
+        """`generate`의 비동기 버전. 캐시(SQLite) 접근은 스레드에서, LLM 호출은 `ainvoke`로 수행합니다."""
+        if use_cache and self.response_cache is not None:
+            with trace_stage("cache_lookup"):
+                answer = await asyncio.to_thread(self.response_cache.get, inputs)
+            trace_attribute("cached", answer is not None)
+            if answer is not None:
+                return answer, True
+        qa_chain = await asyncio.to_thread(self.get_qa_chain)  # 첫 호출 시 인덱스 로드가 이벤트 루프를 막지 않도록
+        answer = (await qa_chain.ainvoke(inputs))["answer"]
+        if self.response_cache is not None:
+            with trace_stage("cache_store"):
+                await asyncio.to_thread(self.response_cache.put, inputs, answer)
+        return answer, False
+
+    # --- 5. 후처리 ---
+    def postprocess(self, answer, user_lat=None, user_lon=None):
+        """
+        답변을 추천 관광지 텍스트(거리 줄 포함), 관광지별 좌표/거리, 여행 계획표 DataFrame으로 정리합니다.
+        JSON 답변은 스키마 검증 후 바로 변환하고, 마크다운 답변의 표 형식이 예상과 다르면 `plan_df`는 None이고
+        원문은 `plan_text`에 남습니다.
+        """
+        place_index = self.place_index
+        with trace_stage("postprocess"):
+            parsed = parse_any_answer(answer)
+            lines, places = annotate_recommendations(parsed.recommendation_lines, place_index, user_lat, user_lon)
+        return {
+            "answer": answer,
+            "recommendation_text": "\n".join(lines),
+            "places": places,
+            "plan_df": parsed.to_dataframe(),
+            "plan_text": parsed.plan_text,
+        }
+
+    def record_trace(self, trace):
+        """끝난 요청 추적을 `metrics`에 집계하고 JSON으로 저장할 수 있는 딕셔너리로 반환합니다."""
+        if self.metrics is not None:
+            return self.metrics.record(trace)
+        return trace.finish().to_dict()
+
+    def plan(self, inputs, use_cache=True):
+        """
+        질문 하나를 처리하여 `postprocess` 결과에 `inputs`, `cached`, `trace`(단계별 소요 시간(ms)과
+        토큰/문서 수 카운터)를 더한 딕셔너리를 반환합니다.
+        """
+        with tracing(name="plan") as trace:
+            answer, cached = self.generate(inputs, use_cache)
+            result = self.postprocess(answer, inputs.get("user_lat"), inputs.get("user_lon"))
+        return {"inputs": inputs, "cached": cached, **result, "trace": self.record_trace(trace)}
+
+    async def aplan(self, inputs, use_cache=True):
+        """`plan`의 비동기 버전."""
+        with tracing(name="plan") as trace:
+            answer, cached = await self.agenerate(inputs, use_cache)
+            result = self.postprocess(answer, inputs.get("user_lat"), inputs.get("user_lon"))
+        return {"inputs": inputs, "cached": cached, **result, "trace": self.record_trace(trace)}
+
+    async def plan_batch(self, inputs_list, max_concurrency=4, use_cache=True, return_exceptions=True):
+        """
+        여러 요청을 최대 `max_concurrency`개씩 동시에 처리하고 입력 순서대로 결과를 반환합니다.
+        `return_exceptions=True`이면 실패한 요청 자리에 예외 객체를 넣고 나머지는 계속 처리합니다.
+        """
+        await asyncio.to_thread(self.warm_up)  # 동시 요청이 초기화를 기다리며 이벤트 루프를 막지 않도록 먼저 준비
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_one(inputs):
+            async with semaphore:
+                return await self.aplan(inputs, use_cache)
+
+        return await asyncio.gather(*(run_one(inputs) for inputs in inputs_list), return_exceptions=return_exceptions)
+
+    def run_batch(self, inputs_list, max_concurrency=4, use_cache=True):
+        """이벤트 루프 밖(스크립트, 스케줄러)에서 `plan_batch`를 실행합니다."""
+        return asyncio.run(self.plan_batch(inputs_list, max_concurrency, use_cache))
+
+
+def result_to_record(result):
+    """`plan` 결과를 JSON으로 저장할 수 있는 딕셔너리로 변환합니다."""
+    if isinstance(result, BaseException):
+        return {"error": f"{type(result).__name__}: {result}"}
+    plan_df = result["plan_df"]
+    return {
+        **{key: value for key, value in result.items() if key != "plan_df"},
+        "plan": plan_df.to_dict("records") if plan_df is not None else None,
+    }
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    from tour_cache import ResponseCache
+    from tour_trace import MetricsRecorder
+
+    parser = argparse.ArgumentParser(description="여러 여행 계획 요청(JSON Lines)을 한 번에 생성합니다.")
+    parser.add_argument("requests", nargs="?", help="한 줄에 하나씩 build_chain_inputs 형식의 JSON 객체가 있는 파일")
+    parser.add_argument("output", nargs="?", help="결과를 JSON Lines로 저장할 파일")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 처리할 요청 수")
+    parser.add_argument("--no-cache", action="store_true", help="답변 캐시를 사용하지 않음")
+    parser.add_argument("--metrics", help="요청별 단계 소요 시간/토큰 추적을 JSON Lines로 덧붙일 파일")
+    parser.add_argument("--index-type", choices=list(INDEX_TYPES), default=None,
+                        help=f"FAISS 인덱스 종류 (기본: {INDEX_TYPE_ENV} 환경 변수 또는 {DEFAULT_INDEX_TYPE})")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default=None,
+                        help=f"답변 형식 (기본: {OUTPUT_FORMAT_ENV} 환경 변수 또는 {OUTPUT_FORMATS[0]})")
+    parser.add_argument("--generation-mode", choices=GENERATION_MODES, default=None,
+                        help=f"답변 생성 방식 (기본: {GENERATION_MODE_ENV} 환경 변수 또는 {GENERATION_MODES[0]})")
+    parser.add_argument("--fast-model", default=None,
+                        help=f"병렬 생성에서 추천 관광지 부분에 쓸 모델 (기본: {FAST_MODEL_ENV} 환경 변수 또는 {DEFAULT_CHAT_MODEL})")
+    parser.add_argument("--shard-by-region", action="store_true", default=None,
+                        help=f"지역(시군)별 샤드 벡터스토어 사용 (기본: {SHARD_ENV} 환경 변수)")
+    parser.add_argument("--warm-up", action="store_true",
+                        help="요청 없이 스냅샷, 벡터스토어, 공간 인덱스를 준비하고 페이지 캐시에 올린 뒤 종료 (워커 시작 전 실행)")
+    args = parser.parse_args()
+    if not args.warm_up and not (args.requests and args.output):
+        parser.error("requests와 output 파일을 지정하거나 --warm-up을 사용하세요.")
+
+    load_dotenv()
+    if args.warm_up:
+        engine = TripEngine(response_cache=None, index_type=args.index_type, shard_by_region=args.shard_by_region)
+        try:
+            engine.warm_up(prefault=True)
+        except TripEngineError as e:
+            raise SystemExit(f"[오류] {e}")
+        for message in engine.load_warnings:
+            print(f"[경고] {message}")
+        if engine.shard_by_region:
+            print(f"준비 완료: 관광지 {len(engine.dataset)}곳, 지역 샤드 {len(engine.vectorstore)}개, 벡터 {engine.vectorstore.ntotal}개")
+        else:
+            print(f"준비 완료: 관광지 {len(engine.dataset)}곳, 벡터 {engine.vectorstore.index.ntotal}개")
+        for stage, ms in engine.startup_trace.to_dict()["stages_ms"].items():
+            print(f"  {stage:<20} {ms:>10.1f} ms")
+        raise SystemExit(0)
+    with open(args.requests, encoding="utf-8") as f:
+        batch_inputs = [json.loads(line) for line in f if line.strip()]
+
+    engine = TripEngine(response_cache=None if args.no_cache else ResponseCache(),
+                        metrics=MetricsRecorder(args.metrics), index_type=args.index_type,
+                        output_format=args.output_format, generation_mode=args.generation_mode,
+                        fast_llm=args.fast_model, shard_by_region=args.shard_by_region)
+    engine.load_data()
+    for message in engine.load_warnings:
+        print(f"[경고] {message}")
+    results = engine.run_batch(batch_inputs, max_concurrency=args.concurrency, use_cache=not args.no_cache)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result_to_record(result), ensure_ascii=False, default=str) + "\n")
+    failures = sum(isinstance(result, BaseException) for result in results)
+    print(f"{len(results)}건 처리 완료 (실패 {failures}건): {args.output}")
+    for stage, stats in engine.metrics.summary().items():
+        print(f"  {stage:<20} p50 {stats['p50_ms']:>9.1f} ms  p95 {stats['p95_ms']:>9.1f} ms  ({stats['count']}건)")
@@ -0,0 +1,274 @@
+"""
+관광지 좌표 기반 공간 연산 모듈.
+
+`tour_data.load_tour_dataset`이 정규화한 '위도'/'경도' 컬럼 위에
+한 번만 구축하는 격자(grid) 공간 인덱스와 NumPy 벡터화 하버사인 거리 계산,
+일대다/다대다 거리 행렬(float32)과 후보 ID 집합별 거리 행렬 LRU 캐시를 제공합니다.
+공간 인덱스는 .npy 파일로 저장해 두고 메모리 매핑으로 열 수 있어, 한 서버의 여러 워커 프로세스가 같은 페이지를 공유합니다.
+Streamlit에 의존하지 않으므로 앱, 테스트, 벤치마크 어디서나 재사용할 수 있습니다.
+"""
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0  # 지구 반지름 (킬로미터)
+SPATIAL_INDEX_META_FILE = "spatial_index.json"  # 저장된 공간 인덱스의 격자 정보와 원본 표시(stamp)
+
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    """
+    하버사인 공식을 NumPy 배열에 벡터화하여 적용합니다 (단위: km).
+    입력은 도(degree) 단위이며 스칼라/배열 모두 브로드캐스팅 규칙에 따라 계산됩니다.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1  # 위도 차이
+    dlon = lon2 - lon1  # 경도 차이
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))  # 중심각 * 반지름
+
+
+def _haversine_rad(lat1, lon1, lat2_rad, lon2_rad, cos_lat2):
+    """미리 라디안/코사인으로 변환해 둔 배열에 대한 하버사인 거리 (인덱스 내부용)."""
+    lat1, lon1 = np.radians(lat1), np.radians(lon1)
+    a = np.sin((lat2_rad - lat1) / 2) ** 2 + np.cos(lat1) * cos_lat2 * np.sin((lon2_rad - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distances_from(lat, lon, lats, lons):
+    """한 지점에서 여러 지점까지의 거리 (km, float32 배열)."""
+    return haversine_np(lat, lon, lats, lons).astype(np.float32)
+
+
+def distance_matrix(lats1, lons1, lats2=None, lons2=None, block_elements=1 << 22):
+    """
+    (n, m) 거리 행렬 (km, float32). `lats2`/`lons2`를 생략하면 첫 번째 점 집합끼리의 (n, n) 전체 행렬입니다.
+    점마다 라디안/코사인을 한 번만 계산하고, 중간 배열이 `block_elements`를 넘지 않도록 행 블록 단위로 계산합니다.
+    """
+    lat1 = np.radians(np.asarray(lats1, dtype=np.float64)).ravel()
+    lon1 = np.radians(np.asarray(lons1, dtype=np.float64)).ravel()
+    if lats2 is None:
+        lat2, lon2 = lat1, lon1
+    else:
+        lat2 = np.radians(np.asarray(lats2, dtype=np.float64)).ravel()
+        lon2 = np.radians(np.asarray(lons2, dtype=np.float64)).ravel()
+    cos1, cos2 = np.cos(lat1), np.cos(lat2)
+
+    result = np.empty((lat1.size, lat2.size), dtype=np.float32)
+    step = max(1, block_elements // max(lat2.size, 1))
+    for start in range(0, lat1.size, step):
+        block = slice(start, start + step)
+        a = (np.sin((lat2[None, :] - lat1[block, None]) / 2) ** 2
+             + cos1[block, None] * cos2[None, :] * np.sin((lon2[None, :] - lon1[block, None]) / 2) ** 2)
+        result[block] = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return result
+
+
+class DistanceMatrixCache:
+    """
+    후보 관광지 ID 집합 -> 거리 행렬 LRU 캐시입니다. 여러 세션(스레드)이 공유할 수 있습니다.
+
+    같은 후보 집합이면 순서가 달라도 한 번만 계산하며(ID 정렬 순으로 저장), 요청한 순서로 행/열을 맞춰 반환합니다.
+    화면 재실행이나 일정 재계획 때 같은 후보에 대한 거리 계산을 반복하지 않습니다.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize  # 보관할 최대 행렬 수
+        self.stats = {"hits": 0, "misses": 0}
+        self._entries = OrderedDict()  # frozenset(ID) -> (ID -> 행 번호, 읽기 전용 float32 행렬)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def matrix(self, ids, lats, lons):
+        """`ids` 순서대로 행/열이 놓인 (n, n) 거리 행렬을 반환합니다. ID는 서로 달라야 합니다."""
+        ids = list(ids)
+        key = frozenset(ids)
+        if len(key) != len(ids):
+            raise ValueError("거리 행렬의 후보 ID가 중복되었습니다.")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+        if entry is None:
+            order = sorted(range(len(ids)), key=lambda i: str(ids[i]))
+            matrix = distance_matrix(np.asarray(lats, dtype=np.float64)[order], np.asarray(lons, dtype=np.float64)[order])
+            matrix.setflags(write=False)  # 공유되는 행렬이므로 수정 금지
+            entry = ({ids[i]: row for row, i in enumerate(order)}, matrix)
+            with self._lock:
+                self.stats["misses"] += 1
+                self._entries[key] = entry
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        row_of, matrix = entry
+        rows = np.fromiter((row_of[i] for i in ids), dtype=np.int64, count=len(ids))
+        if np.array_equal(rows, np.arange(len(ids))):
+            return matrix  # 이미 같은 순서면 복사하지 않음
+        return matrix[np.ix_(rows, rows)]
+
+
+class SpatialIndex:
+    """
+    위도/경도 배열 위에 구축하는 균일 격자 공간 인덱스입니다.
+
+    각 좌표를 `cell_deg` 크기의 격자 칸 번호로 변환한 뒤 칸 번호 순으로 정렬해 두고,
+    질의 시에는 반경에 걸치는 격자 행마다 `np.searchsorted`로 연속 구간만 잘라
+    하버사인 거리를 벡터 연산으로 계산합니다. 결과는 원본 배열의 위치(position)로 반환되므로
+    `df.iloc[positions]`로 바로 행을 가져올 수 있습니다.
+    (한국 영역 데이터를 전제로 하여 경도 ±180° 경계 넘김은 고려하지 않습니다.)
+    """
+
+    def __init__(self, lats, lons, cell_deg=0.1):
+        lats = np.asarray(lats, dtype=np.float64)  # 위도 배열
+        lons = np.asarray(lons, dtype=np.float64)  # 경도 배열
+        if lats.shape != lons.shape:
+            raise ValueError("위도와 경도 배열의 길이가 다릅니다.")
+
+        valid = np.isfinite(lats) & np.isfinite(lons)  # 좌표 누락(NaN) 행 제외
+        positions = np.flatnonzero(valid)
+        lat, lon = lats[valid], lons[valid]
+
+        self.cell_deg = float(cell_deg)  # 격자 한 칸의 크기 (도)
+        self.size = int(positions.size)  # 인덱싱된 좌표 수
+        self._lat0 = float(lat.min()) if self.size else 0.0  # 격자 원점 (최소 위도)
+        self._lon0 = float(lon.min()) if self.size else 0.0  # 격자 원점 (최소 경도)
+
+        rows = self._row_of(lat)
+        cols = self._col_of(lon)
+        self._n_rows = int(rows.max()) + 1 if self.size else 0
+        self._n_cols = int(cols.max()) + 1 if self.size else 0
+
+        keys = rows * self._n_cols + cols  # 행 우선(row-major) 격자 칸 번호
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._positions = positions[order]  # 원본 배열에서의 위치
+        self._lat_rad = np.radians(lat[order])
+        self._lon_rad = np.radians(lon[order])
+        self._cos_lat = np.cos(self._lat_rad)  # 질의마다 반복되는 코사인 계산을 미리 수행
+
+    @classmethod
+    def from_dataframe(cls, df, lat_col="위도", lon_col="경도", cell_deg=0.1):
+        """관광지 DataFrame의 위도/경도 컬럼으로 인덱스를 생성합니다."""
+        lats = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+        lons = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+        return cls(lats, lons, cell_deg=cell_deg)
+
+    _ARRAYS = ("_keys", "_positions", "_lat_rad", "_lon_rad", "_cos_lat")  # 저장/메모리 매핑 대상 배열
+
+    def save(self, directory, stamp=None):
+        """
+        인덱스 배열을 `directory`에 .npy 파일로 저장합니다. `stamp`(JSON 값)는 원본 데이터 표시로,
+        `load()` 때 같은 값을 요구하여 오래된 인덱스를 쓰지 않게 합니다. 임시 폴더에 쓴 뒤 교체합니다.
+        """
+        tmp_dir = directory.rstrip("/\\") + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name in self._ARRAYS:
+            np.save(os.path.join(tmp_dir, name.lstrip("_") + ".npy"), getattr(self, name))
+        meta = {"cell_deg": self.cell_deg, "size": self.size, "lat0": self._lat0, "lon0": self._lon0,
+                "n_rows": self._n_rows, "n_cols": self._n_cols, "stamp": stamp}
+        with open(os.path.join(tmp_dir, SPATIAL_INDEX_META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_dir, directory)
+
+    @classmethod
+    def load(cls, directory, stamp=None, mmap=True):
+        """
+        `save()`로 저장한 인덱스를 엽니다. 파일이 없거나 손상되었거나 `stamp`가 다르면 None을 반환합니다.
+        `mmap=True`이면 배열을 읽기 전용 메모리 매핑으로 열어 같은 파일을 연 프로세스끼리 메모리를 공유합니다.
+        """
+        try:
+            with open(os.path.join(directory, SPATIAL_INDEX_META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("stamp") != stamp:
+                return None
+            arrays = {name: np.load(os.path.join(directory, name.lstrip("_") + ".npy"), mmap_mode="r" if mmap else None)
+                      for name in cls._ARRAYS}
+        except (OSError, ValueError):
+            return None
+        if any(array.shape[0] != meta["size"] for array in arrays.values()):
+            return None
+
+        index = cls.__new__(cls)
+        index.cell_deg, index.size = float(meta["cell_deg"]), int(meta["size"])
+        index._lat0, index._lon0 = float(meta["lat0"]), float(meta["lon0"])
+        index._n_rows, index._n_cols = int(meta["n_rows"]), int(meta["n_cols"])
+        for name, array in arrays.items():
+            setattr(index, name, array)
+        return index
+
+    def __len__(self):
+        return self.size
+
+    def _row_of(self, lat):
+        return np.floor((np.asarray(lat) - self._lat0) / self.cell_deg).astype(np.int64)
+
+    def _col_of(self, lon):
+        return np.floor((np.asarray(lon) - self._lon0) / self.cell_deg).astype(np.int64)
+
+    def _candidate_slots(self, lat, lon, radius_km):
+        """반경을 덮는 격자 칸들에 속한 정렬 배열 상의 슬롯 번호를 반환합니다. 좌표가 NaN/무한대면 빈 배열."""
+        if self.size == 0 or not np.isfinite([lat, lon]).all():
+            return np.empty(0, dtype=np.int64)
+
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)  # 반경에 해당하는 위도 폭
+        max_abs_lat = min(abs(lat) + dlat, 89.9)  # 고위도 쪽이 경도 폭이 가장 넓음
+        dlon = dlat / np.cos(np.radians(max_abs_lat))  # 반경에 해당하는 경도 폭
+
+        r0 = max(int(self._row_of(lat - dlat)), 0)
+        r1 = min(int(self._row_of(lat + dlat)), self._n_rows - 1)
+        c0 = max(int(self._col_of(lon - dlon)), 0)
+        c1 = min(int(self._col_of(lon + dlon)), self._n_cols - 1)
+        if r0 > r1 or c0 > c1:
+            return np.empty(0, dtype=np.int64)
+
+        rows = np.arange(r0, r1 + 1, dtype=np.int64)
+        starts = np.searchsorted(self._keys, rows * self._n_cols + c0, side="left")
+        ends = np.searchsorted(self._keys, rows * self._n_cols + c1, side="right")
+        spans = [np.arange(s, e) for s, e in zip(starts, ends) if e > s]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    def query_radius(self, lat, lon, radius_km, sort=True):
+        """
+        (lat, lon)에서 `radius_km` 이내의 좌표를 찾습니다.
+        반환값은 (원본 위치 배열, 거리(km) 배열)이며 `sort=True`이면 가까운 순으로 정렬됩니다.
+        """
+        slots = self._candidate_slots(lat, lon, radius_km)
+        dists = _haversine_rad(lat, lon, self._lat_rad[slots], self._lon_rad[slots], self._cos_lat[slots])
+        inside = dists <= radius_km  # 격자 사각형 중 실제 반경 안에 있는 것만 남김
+        slots, dists = slots[inside], dists[inside]
+        if sort:
+            order = np.argsort(dists, kind="stable")
+            slots, dists = slots[order], dists[order]
+        return self._positions[slots], dists
+
+    def query_knn(self, lat, lon, k):
+        """
+        (lat, lon)에서 가장 가까운 `k`개의 좌표를 찾습니다.
+        격자 한 칸 크기에서 시작해 반경을 두 배씩 넓히며, 반경 안에 k개 이상이 모이면
+        그 안에 최근접 k개가 모두 포함되므로 거기서 멈춥니다.
+        """
+        k = min(int(k), self.size)
+        if k <= 0 or not np.isfinite([lat, lon]).all():  # 좌표가 없으면 반경을 넓혀도 찾을 수 없음
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        radius_km = self.cell_deg * 111.0  # 격자 한 칸에 해당하는 대략적인 거리
+        max_radius_km = np.pi * EARTH_RADIUS_KM  # 지구 반대편까지의 거리
+        while True:
+            positions, dists = self.query_radius(lat, lon, radius_km, sort=False)
+            if positions.size >= k or radius_km >= max_radius_km:
+                break
+            radius_km *= 2
+
+        nearest = np.argpartition(dists, k - 1)[:k] if positions.size > k else np.arange(positions.size)
+        order = nearest[np.argsort(dists[nearest], kind="stable")]
+        return positions[order], dists[order]
@@ -0,0 +1,138 @@
+"""
+대화 기록 저장소 모듈.
+
+세션별 대화(질문, 답변, 입력값, 처리 추적)를 `__slots__` 데이터클래스 레코드로 최대 `max_conversations`개까지만
+메모리에 유지하고(초과 시 가장 오래된 대화부터 제거), 사이드바는 한 페이지씩만 읽어 표시합니다.
+`path`를 지정하면 SQLite에 세션 ID별로 저장하여 브라우저 새로고침이나 앱 재시작 후에도 기록이 복원됩니다.
+Streamlit에 의존하지 않습니다.
+"""
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, fields
+
+MAX_CONVERSATIONS = 50  # 세션당 보관할 최대 대화 수
+PREVIEW_CHARS = 20  # 사이드바 미리보기에 표시할 질문 길이
+
+
+@dataclass(slots=True)
+class Conversation:
+    """대화 한 건. 답변은 원문만 보관하고 거리/계획표 후처리는 표시할 때 다시 계산합니다."""
+
+    conv_id: int
+    question: str
+    answer: str
+    user_lat: float = None
+    user_lon: float = None
+    travel_style: str = ""  # 쉼표로 구분한 여행 스타일 (없으면 빈 문자열)
+    trip_duration: int = None
+    budget: int = None
+    num_travelers: int = None
+    special_requests: str = ""
+    created_at: float = 0.0
+    trace: dict = None  # tour_trace.RequestTrace.to_dict() (단계별 소요 시간, 토큰 수)
+
+    def preview(self, max_chars=PREVIEW_CHARS):
+        """사이드바 버튼에 표시할 '성향: …\\n질문: …' 미리보기."""
+        lines = []
+        if self.travel_style:
+            lines.append(f"성향: {self.travel_style}")
+        question = self.question.strip()
+        if question:
+            if len(question) > max_chars:
+                question = question[:max_chars - 3] + "..."
+            lines.append(f"질문: {question}")
+        return "\n".join(lines) or f"대화 {self.conv_id}"
+
+
+_FIELD_NAMES = [field.name for field in fields(Conversation)]
+
+
+class ConversationStore:
+    """
+    세션 하나의 대화 기록입니다. 대화는 추가된 순서로 `conv_id`가 증가하며, 최대 개수를 넘으면 가장 오래된
+    대화가 메모리와 SQLite에서 함께 제거됩니다. `page()`는 최신 대화부터 한 페이지 분량만 반환합니다.
+    """
+
+    def __init__(self, session_id=None, max_conversations=MAX_CONVERSATIONS, path=None):
+        self.session_id = session_id  # SQLite 저장 키 (path가 없으면 사용하지 않음, 기록을 읽을 수 있으므로 URL 등에 노출 금지)
+        self.max_conversations = max(1, int(max_conversations))
+        self._records = OrderedDict()  # conv_id -> Conversation (오래된 순)
+        self._next_id = 1
+        self._lock = threading.Lock()  # Streamlit 재실행은 다른 스레드에서 일어날 수 있음
+        self._conn = None
+        if path and session_id:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._lock, self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS conversations ("
+                    " session_id TEXT NOT NULL, conv_id INTEGER NOT NULL, record TEXT NOT NULL, created_at REAL NOT NULL,"
+                    " PRIMARY KEY (session_id, conv_id))"
+                )
+            self._load()
+
+    def _load(self):
+        """SQLite에서 이 세션의 최근 대화를 최대 개수만큼 불러옵니다."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT record FROM conversations WHERE session_id = ? ORDER BY conv_id DESC LIMIT ?",
+                (self.session_id, self.max_conversations),
+            ).fetchall()
+            for (record,) in reversed(rows):
+                data = json.loads(record)
+                conversation = Conversation(**{name: data.get(name) for name in _FIELD_NAMES if name in data})
+                self._records[conversation.conv_id] = conversation
+            if self._records:
+                self._next_id = next(reversed(self._records)) + 1
+
+    def add(self, question, answer, **fields):
+        """대화를 추가하고 반환합니다. 최대 개수를 넘으면 가장 오래된 대화를 제거합니다."""
+        with self._lock:
+            conversation = Conversation(self._next_id, question, answer, created_at=time.time(), **fields)
+            self._next_id += 1
+            self._records[conversation.conv_id] = conversation
+            while len(self._records) > self.max_conversations:
+                self._records.popitem(last=False)  # 가장 오래된 대화 제거
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO conversations (session_id, conv_id, record, created_at) VALUES (?, ?, ?, ?)",
+                        (self.session_id, conversation.conv_id,
+                         json.dumps(asdict(conversation), ensure_ascii=False, default=str), conversation.created_at),
+                    )
+                    self._conn.execute(  # 제거된 대화와 (다른 탭에서 쌓인) 보관 개수 초과분 정리
+                        "DELETE FROM conversations WHERE session_id = ? AND conv_id <= ?",
+                        (self.session_id, conversation.conv_id - self.max_conversations),
+                    )
+        return conversation
+
+    def get(self, conv_id):
+        """`conv_id`의 대화 (없거나 제거되었으면 None)."""
+        with self._lock:
+            return self._records.get(conv_id)
+
+    def page(self, page=0, page_size=10):
+        """최신 대화부터 `page`번째(0부터) 페이지의 대화 리스트."""
+        with self._lock:
+            ids = list(self._records)
+            end = len(ids) - page * page_size
+            return [self._records[conv_id] for conv_id in reversed(ids[max(0, end - page_size):max(0, end)])]
+
+    def page_count(self, page_size=10):
+        return max(1, math.ceil(len(self) / page_size))
+
+    def clear(self):
+        """이 세션의 모든 대화를 지웁니다 (SQLite 포함). 대화 번호는 이어서 증가합니다."""
+        with self._lock:
+            self._records.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM conversations WHERE session_id = ?", (self.session_id,))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
@@ -0,0 +1,345 @@
+"""
+LLM 호출 게이트웨이 모듈.
+
+프로세스 전체(모든 Streamlit 세션, 배치 작업)가 공유하는 하나의 이벤트 루프 스레드에서 LLM 호출을 실행하여
+1) 전역 세마포어로 동시 호출 수를 제한하고, 2) 토큰 버킷으로 분당 요청 수를 맞추며,
+3) 속도 제한(429)/타임아웃/일시적 서버 오류는 지터를 준 지수 백오프로 재시도하고(429 응답이 오면 버킷 전체를 잠시 멈춤),
+4) 완전히 같은 프롬프트가 동시에 들어오면 한 번만 호출하여 결과를 나눠 줍니다(single-flight).
+
+`GatewayChatModel`은 게이트웨이를 LangChain 채팅 모델로 감싸므로 기존 체인(`create_stuff_documents_chain`)에
+그대로 넣을 수 있고, 감싸는 모델은 `FakeListChatModel` 같은 로컬 가짜 모델이어도 됩니다.
+여러 모델(기본 모델과 빠른 모델 등)이 같은 게이트웨이를 공유하면 동시성/속도 제한도 함께 적용됩니다.
+호출마다 생성 시간과 프롬프트/완성 토큰 수를 현재 요청 추적(tour_trace)에 기록합니다.
+"""
+import asyncio
+import hashlib
+import json
+import queue
+import random
+import threading
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from tour_context import estimate_tokens
+from tour_trace import trace_attribute, trace_count, trace_duration, trace_stage
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})  # 재시도할 HTTP 상태 코드
+_RETRYABLE_ERROR_NAMES = frozenset({"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"})
+_DONE = object()  # 스트림 종료 표시
+
+
+def _status_code(exc):
+    return getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def is_rate_limit_error(exc):
+    """속도 제한(HTTP 429) 오류인지 확인합니다."""
+    return _status_code(exc) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def is_retryable_error(exc):
+    """다시 시도하면 성공할 수 있는 일시적 오류인지 확인합니다 (openai 패키지가 없어도 동작)."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return _status_code(exc) in RETRYABLE_STATUS_CODES or type(exc).__name__ in _RETRYABLE_ERROR_NAMES
+
+
+def retry_after_seconds(exc):
+    """오류 응답의 Retry-After 헤더(초)를 반환합니다. 없으면 None."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        value = float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 0 else None
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0, rng=random):
+    """지수 백오프 상한 안에서 균등 분포로 뽑은 대기 시간(full jitter)을 반환합니다."""
+    return rng.uniform(0.0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def request_key(messages, stop=None, kwargs=None, model=None):
+    """요청 병합(single-flight)용 키: 메시지 종류/내용, 호출 옵션, (공유 게이트웨이에서) 모델 식별자의 해시."""
+    payload = [[message.type, message.content] for message in messages], stop, sorted((kwargs or {}).items()), model
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class TokenBucket:
+    """
+    초당 `rate`개씩 채워지고 최대 `capacity`개까지 쌓이는 토큰 버킷입니다.
+    게이트웨이 이벤트 루프 안에서만 사용하므로 별도 잠금이 필요 없습니다.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = float(rate)  # 초당 채워지는 토큰 수
+        self.capacity = float(capacity)  # 최대 버스트 크기
+        self.tokens = float(capacity)
+        self._clock = clock
+        self._updated = clock()
+        self._blocked_until = 0.0  # 429 응답 후 모든 호출을 멈출 시각
+
+    def defer(self, seconds):
+        """`seconds` 동안 토큰 발급을 멈춥니다 (서버가 속도 제한을 알려온 경우)."""
+        self._blocked_until = max(self._blocked_until, self._clock() + seconds)
+
+    async def acquire(self):
+        """토큰 하나를 받을 때까지 기다리고, 기다린 시간(초)을 반환합니다."""
+        waited = 0.0
+        while True:
+            now = self._clock()
+            if now < self._blocked_until:
+                delay = self._blocked_until - now
+            else:
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                delay = (1.0 - self.tokens) / self.rate
+            waited += delay
+            await asyncio.sleep(delay)
+
+
+class LLMGateway:
+    """
+    채팅 모델 호출을 전용 이벤트 루프 스레드에서 동시성 제한/속도 제한/재시도/요청 병합을 거쳐 실행합니다.
+
+    동기 코드(Streamlit 세션 스레드)는 `invoke`/`stream`을, 비동기 코드(다른 이벤트 루프)는 `ainvoke`/`astream`을
+    호출하며, 어느 쪽이든 같은 세마포어와 토큰 버킷을 공유합니다. 호출마다 `llm`을 주면 기본 모델 대신 그 모델을
+    같은 제한 아래에서 호출합니다. 스트리밍은 첫 조각이 오기 전의 실패만 재시도하고 병합하지 않습니다. `stats`로 호출/병합/재시도/속도 제한 횟수와 누적 대기 시간을 확인할 수 있습니다.
+    """
+
+    def __init__(self, llm, max_concurrency=8, requests_per_minute=120, burst=None, max_retries=5,
+                 base_delay=1.0, max_delay=30.0, request_timeout=60.0):
+        self.llm = llm  # 실제 호출할 채팅 모델 (자체 재시도는 끄는 것을 권장: ChatOpenAI(max_retries=0))
+        self.max_concurrency = max_concurrency  # 동시에 진행할 수 있는 호출 수
+        self.max_retries = max_retries  # 일시적 오류 재시도 횟수
+        self.base_delay = base_delay  # 첫 재시도 대기 상한 (초)
+        self.max_delay = max_delay  # 재시도 대기 상한 (초)
+        self.request_timeout = request_timeout  # 시도 한 번의 제한 시간 (초, None이면 무제한)
+        self.stats = {"calls": 0, "coalesced": 0, "retries": 0, "rate_limit_errors": 0, "failures": 0, "throttle_wait_s": 0.0}
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = (
+            TokenBucket(requests_per_minute / 60.0, burst or max_concurrency) if requests_per_minute else None
+        )
+        self._inflight = {}  # 요청 키 -> 진행 중인 Task (게이트웨이 루프에서만 접근)
+        self._loop = None
+        self._thread = None
+        self._loop_lock = threading.Lock()
+
+    # --- 전용 이벤트 루프 ---
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def _check_not_on_loop(self):
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("게이트웨이 이벤트 루프 안에서는 동기 호출을 할 수 없습니다. ainvoke/astream을 사용하세요.")
+
+    # --- 재시도/속도 제한 (게이트웨이 루프 안에서 실행) ---
+    async def _throttle(self):
+        if self._bucket is not None:
+            self.stats["throttle_wait_s"] += await self._bucket.acquire()
+        self.stats["calls"] += 1
+
+    async def _wait_before_retry(self, error, attempt):
+        """재시도할 오류면 백오프만큼 기다리고, 아니면 오류를 다시 발생시킵니다."""
+        if attempt >= self.max_retries or not is_retryable_error(error):
+            self.stats["failures"] += 1
+            raise error
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        if is_rate_limit_error(error):
+            self.stats["rate_limit_errors"] += 1
+            if self._bucket is not None:
+                self._bucket.defer(delay)  # 다른 호출도 함께 물러나 429 폭주를 막음
+        self.stats["retries"] += 1
+        await asyncio.sleep(delay)
+
+    async def _call_with_retry(self, messages, stop, kwargs, llm):
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                await self._throttle()
+                try:
+                    return await asyncio.wait_for(llm.ainvoke(messages, stop=stop, **kwargs), self.request_timeout)
+                except Exception as exc:
+                    error = exc
+            await self._wait_before_retry(error, attempt)  # 대기 중에는 세마포어를 놓아 둠
+            attempt += 1
+
+    async def _coalesced_call(self, messages, stop, kwargs, llm=None):
+        llm = llm or self.llm
+        key = request_key(messages, stop, kwargs, model=None if llm is self.llm else id(llm))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call_with_retry(messages, stop, kwargs, llm))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)  # 기다리던 한 호출자가 취소되어도 다른 호출자의 요청은 계속 진행
+
+    async def _stream_with_retry(self, messages, stop, kwargs, emit, llm=None):
+        attempt = 0
+        while True:
+            started = False
+            async with self._semaphore:
+                await self._throttle()
+                try:
+                    async for chunk in (llm or self.llm).astream(messages, stop=stop, **kwargs):
+                        started = True
+                        emit(chunk)
+                    return
+                except Exception as exc:
+                    if started:
+                        raise  # 이미 일부를 내보냈으면 재시도하지 않음
+                    error = exc
+            await self._wait_before_retry(error, attempt)
+            attempt += 1
+
+    # --- 공개 API ---
+    def invoke(self, messages, stop=None, llm=None, **kwargs):
+        """동기 호출. 응답 메시지(AIMessage)를 반환합니다. `llm`을 주면 기본 모델 대신 그 모델을 호출합니다."""
+        self._check_not_on_loop()
+        return self._submit(self._coalesced_call(messages, stop, kwargs, llm)).result()
+
+    async def ainvoke(self, messages, stop=None, llm=None, **kwargs):
+        """비동기 호출. 어느 이벤트 루프에서 호출해도 게이트웨이 루프에서 실행됩니다."""
+        if asyncio.get_running_loop() is self._loop:
+            return await self._coalesced_call(messages, stop, kwargs, llm)
+        return await asyncio.wrap_future(self._submit(self._coalesced_call(messages, stop, kwargs, llm)))
+
+    def stream(self, messages, stop=None, llm=None, **kwargs):
+        """동기 스트리밍. 응답 조각(AIMessageChunk)을 도착하는 대로 내보냅니다."""
+        self._check_not_on_loop()
+        chunks = queue.Queue()
+        future = self._submit(self._stream_with_retry(messages, stop, kwargs, chunks.put, llm))
+        future.add_done_callback(lambda _: chunks.put(_DONE))
+        try:
+            while (item := chunks.get()) is not _DONE:
+                yield item
+            future.result()  # 실패했으면 예외 전달
+        finally:
+            future.cancel()  # 호출자가 중간에 멈추면 생성도 중단
+
+    async def astream(self, messages, stop=None, llm=None, **kwargs):
+        """비동기 스트리밍."""
+        caller_loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        def emit(item):
+            caller_loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+        future = self._submit(self._stream_with_retry(messages, stop, kwargs, emit, llm))
+        future.add_done_callback(lambda _: emit(_DONE))
+        try:
+            while (item := await chunks.get()) is not _DONE:
+                yield item
+            future.result()
+        finally:
+            future.cancel()
+
+
+def _message_text(message):
+    content = message.content
+    return content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+
+
+def record_llm_usage(messages, message):
+    """
+    LLM 호출 한 번의 프롬프트/완성 토큰 수를 현재 요청 추적에 더합니다.
+    모델이 사용량(`usage_metadata`)을 돌려주지 않으면(스트리밍, 가짜 모델 등) 텍스트로 추정합니다.
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        prompt_tokens, completion_tokens, source = usage.get("input_tokens", 0), usage.get("output_tokens", 0), "usage"
+    else:
+        prompt_tokens = sum(estimate_tokens(_message_text(m)) for m in messages)
+        completion_tokens, source = estimate_tokens(_message_text(message)), "estimate"
+    trace_count("llm_calls")
+    trace_count("prompt_tokens", prompt_tokens)
+    trace_count("completion_tokens", completion_tokens)
+    trace_attribute("token_source", source)
+
+
+class GatewayChatModel(BaseChatModel):
+    """`LLMGateway`를 거쳐 호출하는 LangChain 채팅 모델입니다. 체인에서 일반 채팅 모델처럼 사용합니다."""
+
+    gateway: Any
+    llm: Any = None  # 게이트웨이로 호출할 모델 (None이면 게이트웨이의 기본 모델)
+
+    @property
+    def _llm_type(self):
+        return "llm-gateway"
+
+    @property
+    def _identifying_params(self):
+        return {"llm": type(self.llm or self.gateway.llm).__name__, "max_concurrency": self.gateway.max_concurrency}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with trace_stage("llm_generate"):
+            message = self.gateway.invoke(messages, stop, self.llm, **kwargs)
+        record_llm_usage(messages, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        with trace_stage("llm_generate"):
+            message = await self.gateway.ainvoke(messages, stop, self.llm, **kwargs)
+        record_llm_usage(messages, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        start, merged = time.perf_counter(), None
+        with trace_stage("llm_generate"):  # 첫 조각까지의 시간은 llm_first_token 단계로 따로 기록
+            for chunk in self.gateway.stream(messages, stop, self.llm, **kwargs):
+                if merged is None:
+                    trace_duration("llm_first_token", time.perf_counter() - start)
+                merged = chunk if merged is None else merged + chunk
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.content)
+                yield ChatGenerationChunk(message=chunk)
+        if merged is not None:
+            record_llm_usage(messages, merged)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        start, merged = time.perf_counter(), None
+        with trace_stage("llm_generate"):
+            async for chunk in self.gateway.astream(messages, stop, self.llm, **kwargs):
+                if merged is None:
+                    trace_duration("llm_first_token", time.perf_counter() - start)
+                merged = chunk if merged is None else merged + chunk
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.content)
+                yield ChatGenerationChunk(message=chunk)
+        if merged is not None:
+            record_llm_usage(messages, merged)
+
+
+def wrap_with_gateway(llm, gateway=None, **gateway_options):
+    """
+    채팅 모델을 게이트웨이로 감쌉니다. 이미 감싼 모델은 그대로 반환합니다.
+    `gateway`를 주면 새 게이트웨이를 만들지 않고 그 게이트웨이의 동시성/속도 제한을 함께 쓰도록 감쌉니다.
+    """
+    if gateway is not None:
+        if isinstance(llm, GatewayChatModel):
+            if llm.gateway is gateway:
+                return llm
+            llm = llm.llm or llm.gateway.llm  # 다른 게이트웨이에 감싸인 모델은 원래 모델만 꺼내 다시 감쌈
+        return GatewayChatModel(gateway=gateway, llm=None if llm is gateway.llm else llm)
+    if isinstance(llm, GatewayChatModel):
+        return llm
+    return GatewayChatModel(gateway=LLMGateway(llm, **gateway_options))
@@ -0,0 +1,124 @@
+"""
+관광지 이름 조회 모듈.
+
+정규화된 이름 -> 데이터셋 행 위치 딕셔너리로 O(1) 정확 조회를 하고, 실패하면
+문자 n-gram 역색인과 편집 거리(difflib) 기반의 유사 이름 조회로 대체합니다.
+LLM이 이름을 조금 바꿔 쓴 경우("수원화성" vs "수원 화성 [유네스코 세계유산]")에도 좌표를 찾을 수 있습니다.
+"""
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from difflib import SequenceMatcher
+
+import numpy as np
+
+PlaceMatch = namedtuple("PlaceMatch", ["position", "name", "lat", "lon", "score"])  # 조회 결과 (score 1.0 = 정확 일치)
+
+_BRACKETED = re.compile(r"\([^)]*\)|\[[^\]]*\]|（[^）]*）|<[^>]*>")  # 괄호로 묶인 부가 설명
+_NON_WORD = re.compile(r"[\W_]+")  # 공백과 문장 부호
+
+
+def normalize_place_name(name):
+    """이름 비교용 키: 유니코드 정규화(NFKC), 소문자화 후 공백/문장 부호를 모두 제거합니다."""
+    return _NON_WORD.sub("", unicodedata.normalize("NFKC", str(name)).lower())
+
+
+def base_place_name(name):
+    """괄호 속 부가 설명을 뺀 이름 키 ("수원 화성 [유네스코 세계유산]" -> "수원화성")."""
+    return normalize_place_name(_BRACKETED.sub("", unicodedata.normalize("NFKC", str(name))))
+
+
+def char_ngrams(text, n=2):
+    """문자 n-gram 집합. 텍스트가 n보다 짧으면 텍스트 전체를 하나의 n-gram으로 취급합니다."""
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class PlaceNameIndex:
+    """
+    관광지 이름 -> 좌표 조회 인덱스입니다. 데이터 로드 시 한 번 구축합니다.
+
+    1) 정규화 이름 키, 2) 괄호 설명을 뺀 기본 이름 키 순서로 딕셔너리를 조회하고,
+    둘 다 실패하면 3) 문자 bigram 역색인으로 Dice 계수 상위 후보를 고른 뒤
+    SequenceMatcher 비율로 최종 후보를 정해 `min_score` 이상일 때만 반환합니다.
+    """
+
+    def __init__(self, names, lats, lons, ngram=2, min_score=0.6, max_fuzzy_candidates=10, min_fuzzy_length=3):
+        self.names = [str(n) for n in names]
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.ngram = ngram
+        self.min_score = min_score  # 유사 조회 허용 최소 점수
+        self.max_fuzzy_candidates = max_fuzzy_candidates  # 편집 거리로 재확인할 후보 수
+        self.min_fuzzy_length = min_fuzzy_length  # 이보다 짧은 이름은 유사 조회하지 않음 ("서울" -> "서울랜드" 방지)
+
+        self._exact = {}  # 이름 키 -> 행 위치 (좌표가 있는 첫 행)
+        base_keys = {}
+        for position, name in enumerate(self.names):
+            if not (np.isfinite(self.lats[position]) and np.isfinite(self.lons[position])):
+                continue
+            self._exact.setdefault(normalize_place_name(name), position)
+            base_keys.setdefault(base_place_name(name), position)
+        for key, position in base_keys.items():  # 전체 이름 키가 우선, 기본 이름 키는 빈 자리에만
+            if key:
+                self._exact.setdefault(key, position)
+
+        # 유사 조회용 역색인: n-gram -> 키 번호 배열
+        self._keys = list(self._exact)
+        self._key_gram_counts = np.array([len(char_ngrams(k, ngram)) for k in self._keys], dtype=np.float64)
+        postings = defaultdict(list)
+        for key_id, key in enumerate(self._keys):
+            for gram in char_ngrams(key, ngram):
+                postings[gram].append(key_id)
+        self._postings = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+        self._fuzzy_cache = {}  # 유사 조회 결과 메모 (Streamlit 재실행마다 같은 이름을 다시 계산하지 않음)
+
+    @classmethod
+    def from_dataframe(cls, df, name_col="관광지명", lat_col="위도", lon_col="경도", **kwargs):
+        """관광지 DataFrame으로 인덱스를 생성합니다. 반환되는 위치는 `df.iloc` 기준입니다."""
+        return cls(df[name_col].tolist(), df[lat_col].to_numpy(), df[lon_col].to_numpy(), **kwargs)
+
+    def __len__(self):
+        return len(self._exact)
+
+    def _match(self, position, score):
+        return PlaceMatch(position, self.names[position], float(self.lats[position]), float(self.lons[position]), score)
+
+    def lookup(self, name, fuzzy=True):
+        """이름에 해당하는 관광지를 PlaceMatch로 반환합니다. 찾지 못하면 None."""
+        cleaned = str(name).strip().strip("*_`\"'")  # LLM 답변의 마크다운 강조 기호 제거
+        for key in (normalize_place_name(cleaned), base_place_name(cleaned)):
+            if key and key in self._exact:
+                return self._match(self._exact[key], 1.0)
+        return self._fuzzy_lookup(base_place_name(cleaned) or normalize_place_name(cleaned)) if fuzzy else None
+
+    def _fuzzy_lookup(self, key):
+        if key not in self._fuzzy_cache:
+            if len(self._fuzzy_cache) >= 4096:  # 메모 크기 제한
+                self._fuzzy_cache.clear()
+            self._fuzzy_cache[key] = self._compute_fuzzy_lookup(key)
+        return self._fuzzy_cache[key]
+
+    def _compute_fuzzy_lookup(self, key):
+        if len(key) < self.min_fuzzy_length:
+            return None
+        query_grams = char_ngrams(key, self.ngram)
+        hits = [self._postings[g] for g in query_grams if g in self._postings]
+        if not hits:
+            return None
+
+        overlap = np.bincount(np.concatenate(hits), minlength=len(self._keys))  # 키별 공유 n-gram 수
+        dice = 2.0 * overlap / (len(query_grams) + self._key_gram_counts)
+        top = np.argsort(-dice, kind="stable")[:self.max_fuzzy_candidates]
+
+        best_key_id, best_score = None, 0.0
+        for key_id in top:
+            if overlap[key_id] == 0:
+                break
+            score = SequenceMatcher(None, key, self._keys[key_id]).ratio()
+            if score > best_score:
+                best_key_id, best_score = int(key_id), score
+        if best_key_id is None or best_score < self.min_score:
+            return None
+        return self._match(self._exact[self._keys[best_key_id]], round(best_score, 3))
@@ -0,0 +1,239 @@
+"""
+결정적(deterministic) 여행 일정 골격 생성 모듈.
+
+검색된 후보 관광지를 좌표 기준으로 일차별로 나누고(용량 제한 k-medoids 군집),
+각 일차의 방문 순서를 출발지에서 시작하는 최근접 이웃 경로 + 2-opt 개선으로 정한 뒤,
+하버사인 거리에 도로 우회 계수와 이동 수단별 평균 속도를 적용해 이동 시간을 계산합니다.
+LLM은 이 골격(순서, 시간, 이동 방법)을 그대로 사용해 활동 설명만 채우면 됩니다.
+"""
+import math
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from tour_data import LAT_KEY, LON_KEY, PLACE_ID_KEY
+from tour_geo import distance_matrix, distances_from
+from tour_names import normalize_place_name
+
+ROAD_DETOUR_FACTOR = 1.3  # 직선거리 대비 실제 이동 거리 비율
+WALK_THRESHOLD_KM = 1.0  # 직선거리가 이 이하이면 도보 이동
+TRAVEL_MODES = {  # 이동 수단: (표시 이름, 평균 속도 km/h, 대기/주차 등 고정 시간 분)
+    "car": ("자동차", 40.0, 5),
+    "transit": ("대중교통", 20.0, 10),
+    "walk": ("도보", 4.5, 0),
+}
+
+PlannedStop = namedtuple(
+    "PlannedStop",
+    ["day", "order", "name", "lat", "lon", "arrive", "depart", "leg_km", "leg_minutes", "leg_mode", "place_id"],
+)  # arrive/depart는 하루 시작 기준 분(0시 기준), leg_*는 이전 지점(또는 출발지)에서 오는 이동
+
+
+def estimate_travel(distance_km, travel_mode="car"):
+    """직선거리(km)로 (이동 수단 표시 이름, 예상 이동 시간(분, 5분 단위 올림))을 계산합니다."""
+    mode = "walk" if distance_km <= WALK_THRESHOLD_KM else travel_mode
+    label, speed_kmh, overhead_min = TRAVEL_MODES[mode]
+    minutes = distance_km * ROAD_DETOUR_FACTOR / speed_kmh * 60.0 + overhead_min
+    return label, max(5, int(math.ceil(minutes / 5.0)) * 5)
+
+
+def _assign_with_capacity(cost, capacity):
+    """각 점을 비용이 가장 낮은 군집에 배정하되, 군집별 최대 `capacity`개를 넘지 않게 합니다."""
+    n, k = cost.shape
+    ranked = np.argsort(cost, axis=1, kind="stable")
+    if k > 1:  # 최선/차선 차이(regret)가 큰 점부터 배정해야 용량 초과로 멀리 밀려나는 점이 줄어듦
+        regret = cost[np.arange(n), ranked[:, 1]] - cost[np.arange(n), ranked[:, 0]]
+        order = np.argsort(-regret, kind="stable")
+    else:
+        order = np.arange(n)
+    labels = np.full(n, -1, dtype=np.int64)
+    remaining = np.full(k, capacity, dtype=np.int64)
+    for i in order:
+        for cluster in ranked[i]:
+            if remaining[cluster] > 0:
+                labels[i] = cluster
+                remaining[cluster] -= 1
+                break
+    return labels
+
+
+def cluster_by_proximity(dist, k, capacity, max_iter=20):
+    """
+    거리 행렬 `dist`(n x n)의 점들을 최대 `capacity`개씩 `k`개 군집으로 나눈 군집 번호 배열을 반환합니다.
+    0번 점에서 시작하는 최원점(farthest-point) 초기화와 용량 제한 k-medoids 반복으로 항상 같은 결과를 냅니다.
+    """
+    n = len(dist)
+    k = max(1, min(k, n))
+    medoids = [0]
+    while len(medoids) < k:
+        medoids.append(int(np.argmax(dist[:, medoids].min(axis=1))))
+
+    labels = _assign_with_capacity(dist[:, medoids], capacity)
+    for _ in range(max_iter):
+        new_medoids = []
+        for cluster, medoid in enumerate(medoids):
+            members = np.flatnonzero(labels == cluster)
+            if members.size == 0:
+                new_medoids.append(medoid)  # 빈 군집은 기존 중심 유지
+                continue
+            within = dist[np.ix_(members, members)].sum(axis=1)
+            new_medoids.append(int(members[np.argmin(within)]))
+        if new_medoids == medoids:
+            break
+        medoids = new_medoids
+        labels = _assign_with_capacity(dist[:, medoids], capacity)
+    return labels
+
+
+def path_length(dist, path):
+    """경로(노드 번호 리스트)의 총 거리. 출발점으로 돌아오지 않는 열린 경로입니다."""
+    return float(sum(dist[a, b] for a, b in zip(path, path[1:])))
+
+
+def nearest_neighbor_path(dist, start, nodes):
+    """`start`에서 출발해 매번 가장 가까운 미방문 노드로 이동하는 경로 (start 포함)."""
+    path, remaining = [start], list(nodes)
+    while remaining:
+        last = path[-1]
+        nearest = min(remaining, key=lambda node: (dist[last, node], node))
+        path.append(nearest)
+        remaining.remove(nearest)
+    return path
+
+
+def two_opt(dist, path, max_rounds=50):
+    """첫 노드(출발지)를 고정한 열린 경로를 2-opt 구간 뒤집기로 더 이상 줄지 않을 때까지 개선합니다."""
+    path = list(path)
+    for _ in range(max_rounds):
+        improved = False
+        for i in range(1, len(path) - 1):
+            for j in range(i + 1, len(path)):
+                before = dist[path[i - 1], path[i]] + (dist[path[j], path[j + 1]] if j + 1 < len(path) else 0.0)
+                after = dist[path[i - 1], path[j]] + (dist[path[i], path[j + 1]] if j + 1 < len(path) else 0.0)
+                if after < before - 1e-9:
+                    path[i:j + 1] = reversed(path[i:j + 1])
+                    improved = True
+        if not improved:
+            break
+    return path
+
+
+def _clock(minutes):
+    return f"{int(minutes) // 60:02d}:{int(minutes) % 60:02d}"
+
+
+class Itinerary:
+    """일차별 방문 순서와 시간이 정해진 일정 골격입니다."""
+
+    def __init__(self, days, stops, travel_mode):
+        self.days = days  # 여행 일수 (방문지가 없는 일차는 LLM이 자유롭게 채움)
+        self.stops = stops  # PlannedStop 리스트 (일차, 순서 순)
+        self.travel_mode = travel_mode
+
+    def __len__(self):
+        return len(self.stops)
+
+    @property
+    def total_km(self):
+        """출발지에서 방문지로 가는 이동을 포함한 직선거리 합계."""
+        return round(sum(stop.leg_km for stop in self.stops), 2)
+
+    def for_days(self, day_numbers):
+        """`day_numbers` 일차의 방문지만 남긴 골격 (일차별 부분 일정을 따로 생성할 때)."""
+        day_numbers = set(day_numbers)
+        return Itinerary(self.days, [stop for stop in self.stops if stop.day in day_numbers], self.travel_mode)
+
+    def to_dataframe(self):
+        """'일차 | 시간 | 활동 | 예상 장소 | 이동 방법' 형식의 DataFrame (같은 일차는 첫 행에만 표시)."""
+        rows, previous_day = [], None
+        for stop in self.stops:
+            rows.append({
+                "일차": f"{stop.day}일차" if stop.day != previous_day else "",
+                "시간": f"{_clock(stop.arrive)} - {_clock(stop.depart)}",
+                "활동": "관광",
+                "예상 장소": stop.name,
+                "이동 방법": f"{stop.leg_mode} 약 {stop.leg_minutes}분 ({stop.leg_km:.1f}km)",
+            })
+            previous_day = stop.day
+        return pd.DataFrame(rows, columns=["일차", "시간", "활동", "예상 장소", "이동 방법"])
+
+    def to_prompt_text(self):
+        """프롬프트에 넣을 마크다운 표. 방문지가 없으면 빈 문자열."""
+        if not self.stops:
+            return ""
+        plan_df = self.to_dataframe()
+        lines = ["| " + " | ".join(plan_df.columns) + " |", "|" + "---|" * len(plan_df.columns)]
+        lines += ["| " + " | ".join(str(value) for value in row) + " |" for row in plan_df.itertuples(index=False)]
+        return "\n".join(lines)
+
+
+def places_from_documents(documents):
+    """검색된 관광지 문서에서 좌표가 있는 후보 {name, lat, lon, place_id} 리스트를 만듭니다 (같은 관광지 ID는 한 번만)."""
+    places, seen = [], set()
+    for doc in documents:
+        metadata = doc.metadata
+        key = metadata.get(PLACE_ID_KEY) or metadata.get("name")
+        if key in seen or metadata.get(LAT_KEY) is None or metadata.get(LON_KEY) is None:
+            continue
+        seen.add(key)
+        places.append({"name": metadata.get("name", ""), "lat": metadata[LAT_KEY], "lon": metadata[LON_KEY],
+                       "place_id": metadata.get(PLACE_ID_KEY)})
+    return places
+
+
+def plan_itinerary(places, origin_lat, origin_lon, days, travel_mode="car", day_start="09:00",
+                   visit_minutes=120, max_stops_per_day=4, distance_cache=None):
+    """
+    후보 관광지(`name`, `lat`, `lon` 키를 가진 딕셔너리)를 `days`일 일정 골격(Itinerary)으로 만듭니다.
+
+    출발지에서 가까운 순으로 최대 `days * max_stops_per_day`곳을 고르고, 일차별로 비슷한 수의
+    가까운 관광지끼리 묶은 뒤 출발지에서 가까운 묶음부터 1일차로 배치합니다. 매일 출발지에서
+    `day_start`에 출발하며 관광지마다 `visit_minutes`분 머무는 것으로 시간을 계산합니다.
+    `distance_cache`(tour_geo.DistanceMatrixCache)를 주면 같은 후보 집합의 관광지 간 거리 행렬을 재사용합니다.
+    """
+    if travel_mode not in TRAVEL_MODES:
+        raise ValueError(f"알 수 없는 이동 수단입니다: {travel_mode} ({', '.join(TRAVEL_MODES)})")
+    days = max(1, int(days))
+    candidates, seen_names = [], set()
+    for place in places:  # 좌표가 없는 후보와 (다른 CSV에서 온) 같은 이름의 관광지 제외
+        name_key = normalize_place_name(place["name"])
+        if name_key in seen_names or not (np.isfinite(place["lat"]) and np.isfinite(place["lon"])):
+            continue
+        seen_names.add(name_key)
+        candidates.append(place)
+    if not candidates:
+        return Itinerary(days, [], travel_mode)
+
+    lats = np.array([p["lat"] for p in candidates], dtype=np.float64)
+    lons = np.array([p["lon"] for p in candidates], dtype=np.float64)
+    dist = np.empty((len(candidates) + 1,) * 2, dtype=np.float32)  # 0번 = 출발지
+    dist[0, 0] = 0.0
+    dist[0, 1:] = dist[1:, 0] = distances_from(origin_lat, origin_lon, lats, lons)
+    if distance_cache is not None:
+        ids = [p.get("place_id") or normalize_place_name(p["name"]) for p in candidates]
+        dist[1:, 1:] = distance_cache.matrix(ids, lats, lons)
+    else:
+        dist[1:, 1:] = distance_matrix(lats, lons)
+
+    by_origin = np.argsort(dist[0, 1:], kind="stable")[:days * max_stops_per_day] + 1  # 가까운 후보만 사용
+    capacity = min(max_stops_per_day, math.ceil(len(by_origin) / days))
+    labels = cluster_by_proximity(dist[np.ix_(by_origin, by_origin)], days, capacity)
+
+    day_groups = [by_origin[labels == cluster].tolist() for cluster in np.unique(labels)]
+    day_groups.sort(key=lambda nodes: (float(dist[0, nodes].mean()), nodes))  # 출발지에서 가까운 묶음이 먼저
+
+    start_hour, start_minute = (int(part) for part in day_start.split(":"))
+    stops = []
+    for day, nodes in enumerate(day_groups, start=1):
+        path = two_opt(dist, nearest_neighbor_path(dist, 0, nodes))
+        clock = start_hour * 60 + start_minute
+        for order, (prev, node) in enumerate(zip(path, path[1:]), start=1):
+            leg_km = float(dist[prev, node])
+            leg_mode, leg_minutes = estimate_travel(leg_km, travel_mode)
+            place = candidates[node - 1]
+            arrive = clock + leg_minutes
+            clock = arrive + visit_minutes
+            stops.append(PlannedStop(day, order, place["name"], float(place["lat"]), float(place["lon"]),
+                                     arrive, clock, round(leg_km, 2), leg_minutes, leg_mode, place.get("place_id")))
+    return Itinerary(days, stops, travel_mode)
@@ -0,0 +1,274 @@
+"""
+관광지 문서 검색(retrieval) 모듈.
+
+사용자 위치와의 거리를 고려하는 위치 기반 검색기, 여기에 문자 n-gram BM25 결과를 RRF로 합치는
+하이브리드 검색기, 그리고 이를 LangChain 문서 결합 체인에 연결하는 검색 체인 생성 함수를 제공합니다.
+Streamlit에 의존하지 않습니다.
+"""
+import os
+
+import numpy as np
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+
+from tour_data import LAT_KEY, LON_KEY, PLACE_ID_KEY
+from tour_geo import SpatialIndex, haversine_np
+from tour_names import base_place_name, normalize_place_name
+from tour_trace import trace_count, trace_stage
+from tour_vectorstore import index_signature, resolve_index_dir, vectorstore_dir
+
+DISTANCE_KEY = "distance_km"  # 검색 결과 문서에 붙는 사용자 위치 기준 거리 키
+GEO_INDEX_DIR = "geo_index"  # 벡터스토어 폴더 안에 저장하는 FAISS 위치 기준 공간 인덱스
+
+
+def _as_float(value):
+    """메타데이터 값을 float으로 변환합니다. 변환할 수 없으면 NaN을 반환합니다."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class GeoRetriever:
+    """
+    사용자 위치 기반 FAISS 검색기입니다.
+
+    문서 메타데이터의 좌표로 공간 인덱스를 만들어 두고, 질의 시에는
+    1) 사용자 위치 반경 `radius_km` 이내(부족하면 가장 가까운 순)로 후보 집합을 제한한 뒤
+    2) FAISS에 저장된 후보 벡터와 질문 임베딩의 코사인 유사도에서 거리 벌점을 빼서 재정렬하고
+    3) 상위 `k`개만 반환합니다.
+    좌표가 없는 벡터스토어이거나 사용자 위치가 없으면 일반 유사도 검색으로 대체합니다.
+    `spatial_index`(FAISS 위치 순서 좌표로 만든 SpatialIndex)를 주면 문서 메타데이터에서 다시 만들지 않습니다.
+    """
+
+    def __init__(self, vectorstore, k=8, radius_km=30.0, distance_weight=0.3, min_candidates=40, max_candidates=400,
+                 spatial_index=None):
+        self.vectorstore = vectorstore  # LangChain FAISS 벡터스토어
+        self.k = k  # 최종 반환 문서 수
+        self.radius_km = radius_km  # 후보 검색 반경 (km)
+        self.distance_weight = distance_weight  # 반경 끝에 있는 문서에 주는 유사도 벌점
+        self.min_candidates = min_candidates  # 반경 안 후보가 이보다 적으면 최근접 순으로 보충
+        self.max_candidates = max_candidates  # 유사도 계산 대상 후보 수 상한
+
+        # FAISS 내부 위치(0..ntotal-1)별 좌표 배열 구성
+        self._index_ids = dict(vectorstore.index_to_docstore_id)  # FAISS 위치 -> docstore ID
+        self._docstore_ids_by_place = {}  # 관광지 ID -> docstore ID (어휘 검색 결과를 문서로 변환할 때 사용)
+        positions = np.array(sorted(self._index_ids), dtype=np.int64)
+        lats, lons = [], []
+        for pos in positions:
+            metadata = vectorstore.docstore.search(self._index_ids[int(pos)]).metadata
+            if spatial_index is None:
+                lats.append(_as_float(metadata.get(LAT_KEY)))
+                lons.append(_as_float(metadata.get(LON_KEY)))
+            if metadata.get(PLACE_ID_KEY) is not None:
+                self._docstore_ids_by_place.setdefault(metadata[PLACE_ID_KEY], self._index_ids[int(pos)])
+        self._faiss_positions = positions
+        self._spatial_index = spatial_index if spatial_index is not None else SpatialIndex(lats, lons)
+
+    @property
+    def spatial_index(self):
+        """FAISS 위치 순서 좌표의 공간 인덱스 (저장/재사용용)."""
+        return self._spatial_index
+
+    @property
+    def has_coordinates(self):
+        """좌표 메타데이터를 가진 문서가 하나라도 있는지 여부."""
+        return len(self._spatial_index) > 0
+
+    def _candidates(self, user_lat, user_lon, k):
+        """반경 내 후보를 찾고, 부족하면 최근접 후보로 보충합니다. (FAISS 위치, 거리) 반환."""
+        slots, dists = self._spatial_index.query_radius(user_lat, user_lon, self.radius_km)
+        if slots.size < max(self.min_candidates, k):
+            slots, dists = self._spatial_index.query_knn(user_lat, user_lon, max(self.min_candidates, k))
+        return self._faiss_positions[slots[:self.max_candidates]], dists[:self.max_candidates]
+
+    def _reconstruct(self, faiss_positions):
+        """FAISS 인덱스에서 후보 위치의 벡터를 복원합니다."""
+        index = self.vectorstore.index
+        if hasattr(index, "reconstruct_batch"):
+            return np.asarray(index.reconstruct_batch(faiss_positions), dtype=np.float32)
+        return np.vstack([index.reconstruct(int(pos)) for pos in faiss_positions]).astype(np.float32)
+
+    def embed_query(self, query):
+        """질문 임베딩 벡터 (float32)."""
+        with trace_stage("embed_query"):
+            return np.asarray(self.vectorstore.embeddings.embed_query(query), dtype=np.float32)
+
+    def scored_documents(self, query_vec, user_lat, user_lon, k):
+        """
+        위치 기반 점수(코사인 유사도 - 거리 벌점) 상위 `k`개의 (점수, 문서) 리스트를 반환합니다. 좌표가 있는 후보가
+        없으면 빈 리스트입니다. 점수는 같은 `radius_km`/`distance_weight`를 쓰는 검색기끼리 비교할 수 있습니다.
+        """
+        if not self.has_coordinates:
+            return []
+        faiss_positions, dists = self._candidates(float(user_lat), float(user_lon), k)
+        if faiss_positions.size == 0:
+            return []
+
+        vectors = self._reconstruct(faiss_positions)
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vec)
+        similarity = (vectors @ query_vec) / np.where(norms > 0, norms, 1.0)  # 코사인 유사도
+        scores = similarity - self.distance_weight * (dists / self.radius_km)  # 거리 벌점 적용
+
+        top = np.argsort(-scores, kind="stable")[:k]
+        results = []
+        for i in top:
+            doc = self.vectorstore.docstore.search(self._index_ids[int(faiss_positions[i])])
+            doc = doc.model_copy(update={"metadata": {**doc.metadata, DISTANCE_KEY: round(float(dists[i]), 2)}})
+            results.append((float(scores[i]), doc))
+        return results
+
+    def retrieve(self, query, user_lat=None, user_lon=None, k=None):
+        """질문과 사용자 위치로 관련 문서를 검색합니다 (`k`를 생략하면 `self.k`개). 각 문서 메타데이터에 거리(km)가 추가됩니다."""
+        k = k or self.k
+        if user_lat is None or user_lon is None or not self.has_coordinates:
+            return self.vectorstore.similarity_search(query, k=k)  # 위치 정보가 없으면 순수 유사도 검색
+
+        scored = self.scored_documents(self.embed_query(query), user_lat, user_lon, k)
+        if not scored:
+            return self.vectorstore.similarity_search(query, k=k)
+        return [doc for _, doc in scored]
+
+    def document_for_place(self, place_id, user_lat=None, user_lon=None):
+        """관광지 ID의 문서를 반환합니다 (위치가 있으면 거리 추가). 벡터스토어에 없으면 None."""
+        docstore_id = self._docstore_ids_by_place.get(place_id)
+        if docstore_id is None:
+            return None
+        doc = self.vectorstore.docstore.search(docstore_id)
+        lat, lon = _as_float(doc.metadata.get(LAT_KEY)), _as_float(doc.metadata.get(LON_KEY))
+        if user_lat is None or user_lon is None or not (np.isfinite(lat) and np.isfinite(lon)):
+            return doc
+        distance = float(haversine_np(float(user_lat), float(user_lon), lat, lon))
+        return doc.model_copy(update={"metadata": {**doc.metadata, DISTANCE_KEY: round(distance, 2)}})
+
+
+def load_geo_retriever(vectorstore, index_path, mmap=True, **kwargs):
+    """
+    `index_path`(저장된 벡터스토어 폴더)에 있는 공간 인덱스를 재사용하여 `GeoRetriever`를 만듭니다.
+    공간 인덱스는 벡터스토어를 불러온 버전 폴더에 두므로 그 사이 새 버전이 공개되어도 FAISS 위치가 어긋나지 않습니다.
+    저장된 공간 인덱스가 없거나 인덱스 파일이 바뀌었으면 새로 만들어 저장합니다(저장 실패는 무시).
+    `mmap=True`이면 공간 인덱스 배열을 메모리 매핑으로 열어 여러 워커 프로세스가 공유합니다.
+    """
+    index_dir = vectorstore_dir(vectorstore) or resolve_index_dir(index_path)
+    geo_index_dir = os.path.join(index_dir, GEO_INDEX_DIR)
+    stamp = index_signature(index_dir)
+    spatial_index = SpatialIndex.load(geo_index_dir, stamp, mmap=mmap) if stamp is not None else None
+    retriever = GeoRetriever(vectorstore, spatial_index=spatial_index, **kwargs)
+    if spatial_index is None and stamp is not None:
+        try:
+            retriever.spatial_index.save(geo_index_dir, stamp)
+        except OSError:  # 읽기 전용 배포 환경 등
+            pass
+    return retriever
+
+
+class HybridRetriever:
+    """
+    위치 기반 벡터 검색(`GeoRetriever`)과 문자 n-gram BM25 어휘 검색(`tour_lexical.LexicalIndex`)을
+    상호 순위 융합(Reciprocal Rank Fusion, 점수 = Σ weight / (rrf_k + 순위))으로 합쳐 상위 `k`개를 반환합니다.
+
+    질문에 지역명/관광지명이 있으면 어휘 검색이 해당 관광지를 끌어올리고(사용자 위치 반경과 무관),
+    없으면 벡터 검색 순위가 그대로 유지됩니다. `GeoRetriever`와 같은 `retrieve()` 인터페이스를 가집니다.
+
+    사용자 위치가 있으면 질문에 이름/지역이 나오지 않은 어휘 결과("근처 공원"의 "공원" 일치 등)는 반경 `radius_km`
+    (생략하면 `geo_retriever.radius_km`) 안에 있을 때만 그대로 반영하고, 반경 밖이면 거리에 반비례하여 가중치를 줄입니다.
+    """
+
+    def __init__(self, geo_retriever, lexical_index, place_ids, k=8, vector_k=30, lexical_k=30,
+                 rrf_k=60, lexical_weight=1.0, radius_km=None):
+        self.geo_retriever = geo_retriever
+        self.lexical_index = lexical_index
+        self.place_ids = list(place_ids)  # 어휘 색인 위치 -> 관광지 ID
+        self.k = k  # 최종 반환 문서 수
+        self.vector_k = vector_k  # 융합에 쓸 벡터 검색 결과 수
+        self.lexical_k = lexical_k  # 융합에 쓸 어휘 검색 결과 수
+        self.rrf_k = rrf_k  # RRF 순위 완화 상수
+        self.lexical_weight = lexical_weight  # 어휘 검색 순위의 가중치
+        self.radius_km = radius_km or getattr(geo_retriever, "radius_km", 30.0)  # 이 반경 밖 어휘 결과는 감쇠
+
+    @property
+    def vectorstore(self):
+        return self.geo_retriever.vectorstore
+
+    def retrieve(self, query, user_lat=None, user_lon=None, k=None):
+        """벡터/어휘 검색 결과를 RRF로 합친 상위 문서를 반환합니다."""
+        k = k or self.k
+        fused = {}  # 관광지 ID -> [RRF 점수, 문서]
+        for rank, doc in enumerate(self.geo_retriever.retrieve(query, user_lat, user_lon, k=max(self.vector_k, k)), start=1):
+            key = doc.metadata.get(PLACE_ID_KEY) or doc.id or doc.page_content
+            fused.setdefault(key, [0.0, doc])[0] += 1.0 / (self.rrf_k + rank)
+
+        with trace_stage("lexical_search"):
+            positions, _ = self.lexical_index.search(query, self.lexical_k)
+        located = user_lat is not None and user_lon is not None
+        query_key = normalize_place_name(query)
+        for rank, position in enumerate(positions, start=1):
+            entry = fused.setdefault(self.place_ids[position], [0.0, None])
+            weight = self.lexical_weight
+            if located:
+                if entry[1] is None:  # 어휘 검색에서만 찾은 관광지: 거리 확인용 문서
+                    entry[1] = self.geo_retriever.document_for_place(self.place_ids[position], user_lat, user_lon)
+                weight *= self._proximity_weight(entry[1], query_key)
+            entry[0] += weight / (self.rrf_k + rank)
+
+        results = []
+        for place_id, (score, doc) in sorted(fused.items(), key=lambda item: -item[1][0]):
+            if score <= 0:
+                break  # 위치를 알 수 없어 제외한 어휘 결과
+            if doc is None:  # 어휘 검색에서만 찾은 관광지
+                doc = self.geo_retriever.document_for_place(place_id, user_lat, user_lon)
+            if doc is not None:
+                results.append(doc)
+            if len(results) >= k:
+                break
+        return results
+
+    def _proximity_weight(self, doc, query_key):
+        """
+        위치가 있는 질의에서 어휘 결과의 가중치 배율: 질문에 관광지명/지역명이 있거나 반경 안이면 1,
+        반경 밖이면 반경/거리, 거리를 알 수 없으면 0.
+        """
+        if doc is None:
+            return 0.0
+        name = base_place_name(doc.metadata.get("name", ""))
+        region = normalize_place_name(doc.metadata.get("region", ""))
+        region_stem = region[:-1] if len(region) > 2 and region[-1] in "시군구" else region  # "수원시" -> "수원"
+        if (len(name) >= 2 and name in query_key) or (len(region_stem) >= 2 and region_stem in query_key):
+            return 1.0
+        distance = doc.metadata.get(DISTANCE_KEY)
+        if distance is None:
+            return 0.0
+        return 1.0 if distance <= self.radius_km else self.radius_km / distance
+
+
+def create_geo_retrieval_chain(geo_retriever, combine_docs_chain, itinerary_builder=None, context_builder=None):
+    """
+    `create_retrieval_chain`과 같은 입력/출력 형식("input" -> "context", "answer")을 가지되,
+    입력 딕셔너리의 `user_lat`/`user_lon`을 검색기에 함께 넘기는 검색 체인을 생성합니다.
+    `context_builder(documents)`가 주어지면 검색 결과를 프롬프트에 넣기 전에 변환(중복 제거, 압축 등)하고,
+    `itinerary_builder(inputs)`가 주어지면 검색 결과로 만든 일정 골격 텍스트를 "itinerary" 키로 추가합니다.
+    각 단계의 소요 시간과 검색/컨텍스트 문서 수는 현재 요청 추적(tour_trace)에 기록됩니다.
+    """
+    def retrieve(inputs):
+        with trace_stage("retrieve"):
+            documents = geo_retriever.retrieve(inputs["input"], inputs.get("user_lat"), inputs.get("user_lon"))
+        trace_count("retrieved_docs", len(documents))
+        return documents
+
+    def build_context(documents):
+        with trace_stage("assemble_context"):
+            documents = context_builder(documents)
+        trace_count("context_docs", len(documents))
+        return documents
+
+    def build_itinerary(inputs):
+        with trace_stage("build_itinerary"):
+            return itinerary_builder(inputs)
+
+    retrieve_documents = RunnableLambda(retrieve).with_config(run_name="retrieve_documents")
+    if context_builder is not None:
+        retrieve_documents = retrieve_documents | RunnableLambda(build_context).with_config(run_name="assemble_context")
+
+    chain = RunnablePassthrough.assign(context=retrieve_documents)
+    if itinerary_builder is not None:
+        chain = chain.assign(itinerary=RunnableLambda(build_itinerary).with_config(run_name="build_itinerary"))
+    return chain.assign(answer=combine_docs_chain).with_config(run_name="geo_retrieval_chain")
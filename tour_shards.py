@@ -0,0 +1,324 @@
+"""
+지역(시군)별 벡터스토어 샤딩 모듈.
+
+관광지를 주소의 시/도 + 시/군(광역시/특별시는 시 전체, 주소로 알 수 없으면 가장 가까운 관광지의 지역)으로 나누어
+지역마다 별도의 FAISS 벡터스토어(샤드)를 `tour_vectorstore.sync_vectorstore`로 증분 관리합니다.
+사용자 지역은 외부 서비스 없이 데이터셋 좌표의 공간 인덱스로 가장 가까운 관광지와 검색 반경 안 관광지의 지역으로 정하고,
+필요한 샤드만 처음 검색할 때 불러와 최근 사용 순(LRU)으로 최대 `max_loaded`개만 유지합니다.
+상주 메모리는 전국 데이터가 아니라 활성 지역 수에 비례하고, 검색은 작은 인덱스 몇 개만 훑습니다.
+Streamlit에 의존하지 않습니다.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from tour_data import FILE_HASHES_ATTR, build_attraction_documents
+from tour_geo import SpatialIndex
+from tour_retrieval import load_geo_retriever
+from tour_trace import trace_count, trace_stage
+from tour_vectorstore import load_vectorstore, manifest_vector_count, sync_vectorstore
+
+SHARD_DIR_SUFFIX = "_shards"  # 샤드 폴더: 벡터스토어 폴더 이름 + 접미사
+SHARD_INDEX_FILE = "shards.json"  # 샤드 폴더 안의 지역 -> 하위 폴더/벡터 수 목록
+UNKNOWN_REGION = "기타"  # 주소와 좌표로 지역을 정할 수 없는 관광지
+MAX_LOADED_SHARDS = 16  # 메모리에 유지할 최대 샤드 수 (기본값)
+MAX_SHARDS_PER_QUERY = 4  # 위치 기반 검색 한 번에 훑을 최대 지역 수 (가까운 순)
+
+_PROVINCE = re.compile(r"^(\S+(?:특별시|광역시|특별자치시|특별자치도|도))(?:\s|$)")  # 주소 첫 단어의 시/도
+_SIGUNGU = re.compile(r"^(?:\S+(?:특별시|광역시|특별자치시|특별자치도|도)\s+)?(\S+[시군])(?:\s|$)")  # 시/도 다음의 시/군
+_METROPOLITAN = re.compile(r"(?:특별시|광역시|특별자치시)$")  # 구 단위로 나누지 않는 시
+_UNSAFE_PATH_CHARS = re.compile(r"[^\w-]+")
+
+
+def region_keys(dataset):
+    """
+    데이터셋 행마다 '시/도 시/군' 지역 키 배열(object)을 만듭니다. 시군명 컬럼이 있으면 우선 사용하고,
+    주소로도 정할 수 없는 행은 지역을 아는 가장 가까운 관광지의 지역을, 좌표도 없으면 `UNKNOWN_REGION`을 씁니다.
+    """
+    address = dataset["소재지도로명주소"].fillna("").astype(str).str.strip()
+    province = address.str.extract(_PROVINCE, expand=False).fillna("")
+    sigungu = dataset["시군명"].fillna("").astype(str).str.strip()
+    sigungu = sigungu.where(sigungu != "", address.str.extract(_SIGUNGU, expand=False).fillna(""))
+    keys = (province + " " + sigungu).str.strip()
+    keys = keys.where(~province.str.contains(_METROPOLITAN), province).to_numpy(dtype=object)
+
+    unknown = np.flatnonzero(keys == "")
+    if unknown.size:
+        lats, lons = dataset["위도"].to_numpy(dtype=np.float64), dataset["경도"].to_numpy(dtype=np.float64)
+        known = np.flatnonzero(keys != "")
+        known_index = SpatialIndex(lats[known], lons[known])
+        for position in unknown:
+            keys[position] = UNKNOWN_REGION
+            if np.isfinite(lats[position]) and np.isfinite(lons[position]):
+                nearest, _ = known_index.query_knn(lats[position], lons[position], 1)
+                if nearest.size:
+                    keys[position] = keys[known[nearest[0]]]
+    return keys
+
+
+def shard_root(index_path):
+    """벡터스토어 폴더에 대응하는 샤드 폴더 경로."""
+    return index_path.rstrip("/\\") + SHARD_DIR_SUFFIX
+
+
+def _shard_dir_name(region):
+    return _UNSAFE_PATH_CHARS.sub("_", region).strip("_") or "_"
+
+
+def region_row_loader(dataset, regions, region):
+    """
+    `sync_vectorstore`의 `load_rows`: 한 지역의 행만 파일별 문서로 만듭니다. 읽은 파일에 이 지역 행이 없으면
+    빈 리스트(기존 샤드 내용 삭제), 읽지 못한 파일이면 None(기존 내용 유지)을 반환합니다.
+    """
+    frame = dataset[regions == region]
+    rows_by_source = {source: rows for source, rows in frame.groupby("출처", sort=False)}
+    loaded_files = dataset.attrs.get(FILE_HASHES_ATTR)
+    loaded_sources = set(dataset["출처"].unique())
+
+    def load_rows(file_path):
+        if loaded_files is not None and os.path.normpath(file_path) not in loaded_files:
+            return None
+        source = os.path.basename(file_path)
+        if source not in rows_by_source:
+            return [] if source in loaded_sources else None
+        return build_attraction_documents(rows_by_source[source])
+
+    return load_rows
+
+
+class RegionResolver:
+    """
+    사용자 좌표 -> 지역 키 변환기입니다. 데이터셋 행 기준 공간 인덱스와 행별 지역 키 배열로 동작하므로
+    경계 데이터나 외부 지오코딩 없이 오프라인으로 동작합니다.
+    """
+
+    def __init__(self, spatial_index, regions):
+        self.spatial_index = spatial_index  # 데이터셋 행 위치를 반환하는 tour_geo.SpatialIndex
+        self.regions = np.asarray(regions, dtype=object)  # 데이터셋 행별 지역 키
+
+    def nearest(self, lat, lon):
+        """가장 가까운 관광지의 지역 (관광지가 없으면 None)."""
+        positions, _ = self.spatial_index.query_knn(float(lat), float(lon), 1)
+        return self.regions[positions[0]] if positions.size else None
+
+    def regions_near(self, lat, lon, radius_km, max_regions=MAX_SHARDS_PER_QUERY):
+        """반경 안 관광지들의 지역을 가장 가까운 관광지 순으로 최대 `max_regions`개 반환합니다 (없으면 최근접 지역)."""
+        positions, _ = self.spatial_index.query_radius(float(lat), float(lon), radius_km)
+        regions = list(dict.fromkeys(self.regions[positions].tolist()))[:max_regions]
+        if not regions:
+            nearest = self.nearest(lat, lon)
+            regions = [nearest] if nearest is not None else []
+        return regions
+
+
+class RegionShards:
+    """
+    지역별 샤드 벡터스토어 묶음입니다. `sync()`로 모든 샤드를 증분 갱신하고, `retriever(region)`은 샤드를
+    처음 요청될 때 불러와(메모리 매핑) 최근 사용 순으로 최대 `max_loaded`개만 유지합니다. 여러 스레드가 공유할 수 있습니다.
+    """
+
+    def __init__(self, root, embeddings, mmap=True, max_loaded=MAX_LOADED_SHARDS, retriever_options=None):
+        self.root = root  # 샤드 폴더
+        self.embeddings = embeddings
+        self.mmap = mmap  # 샤드를 읽기 전용 메모리 매핑으로 열지 여부
+        self.max_loaded = max(1, int(max_loaded))
+        self.retriever_options = retriever_options or {}  # GeoRetriever 옵션 (k, radius_km 등)
+        self.stats = {"loads": 0, "hits": 0, "evictions": 0}
+        self._shards = self._read_index()  # 지역 -> {"dir": 하위 폴더, "vectors": 벡터 수}
+        self._loaded = OrderedDict()  # 지역 -> GeoRetriever (오래 안 쓴 순)
+        self._lock = threading.Lock()
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.root, SHARD_INDEX_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @property
+    def regions(self):
+        return list(self._shards)
+
+    @property
+    def ntotal(self):
+        """전체 샤드의 벡터 수 합계."""
+        return sum(entry["vectors"] for entry in self._shards.values())
+
+    @property
+    def loaded_regions(self):
+        with self._lock:
+            return list(self._loaded)
+
+    @property
+    def sizes(self):
+        """지역 -> 샤드 벡터 수."""
+        return {region: entry["vectors"] for region, entry in self._shards.items()}
+
+    def __len__(self):
+        return len(self._shards)
+
+    def sync(self, file_paths, dataset, regions, **sync_options):
+        """
+        데이터셋을 지역별로 나누어 샤드마다 `sync_vectorstore`로 증분 갱신하고 합산 통계를 반환합니다.
+        `sync_options`는 `sync_vectorstore`의 document_schema, file_hashes, index_type, index_options입니다.
+        행 수/임베딩 수는 샤드 합계이고, 파일 수는 샤드 중 최댓값(변경)/최솟값(변경 없음)입니다.
+        바뀐 것이 없는 샤드는 매니페스트만 비교하고 열지 않으며, 이미 올라온 상태로 유지합니다.
+        """
+        regions = np.asarray(regions, dtype=object)
+        totals = {"unchanged_files": None, "changed_files": 0, "added_rows": 0, "removed_rows": 0, "embedded_chunks": 0}
+        shards = {}
+        changed = set()  # 다시 저장된 샤드
+        for region in sorted(set(regions.tolist())):
+            entry = self._shards.get(region) or {"dir": _shard_dir_name(region)}
+            vectorstore, stats = sync_vectorstore(os.path.join(self.root, entry["dir"]), file_paths,
+                                                  region_row_loader(dataset, regions, region), self.embeddings,
+                                                  mmap=self.mmap, load_unchanged=False, **sync_options)
+            for key, value in stats.items():
+                if key == "unchanged_files":
+                    totals[key] = value if totals[key] is None else min(totals[key], value)
+                elif key == "changed_files":
+                    totals[key] = max(totals[key], value)
+                else:
+                    totals[key] += value
+            if vectorstore is not None:
+                shards[region] = {"dir": entry["dir"], "vectors": int(vectorstore.index.ntotal)}
+                changed.add(region)
+            elif region in self._shards:  # 변경 없음: 인덱스를 열지 않고 기존 벡터 수 사용
+                shards[region] = self._shards[region]
+            else:
+                vectors = manifest_vector_count(os.path.join(self.root, entry["dir"]))
+                if vectors:  # shards.json에 없던 기존 샤드
+                    shards[region] = {"dir": entry["dir"], "vectors": vectors}
+
+        for region in self._shards.keys() - shards.keys():  # 데이터에서 사라진 지역
+            totals["removed_rows"] += self._shards[region]["vectors"]
+            shutil.rmtree(os.path.join(self.root, self._shards[region]["dir"]), ignore_errors=True)
+        if shards != self._shards:
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = os.path.join(self.root, SHARD_INDEX_FILE + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(shards, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, os.path.join(self.root, SHARD_INDEX_FILE))
+        with self._lock:
+            self._shards = shards
+            for region in list(self._loaded):
+                if region in changed or region not in shards:
+                    del self._loaded[region]  # 갱신/삭제된 샤드는 다시 읽도록
+        totals["unchanged_files"] = totals["unchanged_files"] or 0
+        totals["shards"] = len(shards)
+        return totals
+
+    def _load(self, region):
+        path = os.path.join(self.root, self._shards[region]["dir"])
+        with trace_stage("load_shard"):
+            vectorstore = load_vectorstore(path, self.embeddings, mmap=self.mmap)
+            return load_geo_retriever(vectorstore, path, mmap=self.mmap, **self.retriever_options)
+
+    def retriever(self, region, cache=True):
+        """
+        지역 샤드의 GeoRetriever (샤드가 없으면 None). 처음 요청되면 불러오고, 최대 개수를 넘으면 가장 오래 안 쓴
+        샤드를 내립니다. `cache=False`이면 이미 올라온 샤드는 재사용하되 새로 불러온 샤드는 보관하지 않습니다.
+        """
+        if region not in self._shards:
+            return None
+        with self._lock:
+            retriever = self._loaded.get(region)
+            if retriever is not None:
+                self._loaded.move_to_end(region)
+                self.stats["hits"] += 1
+                return retriever
+        retriever = self._load(region)  # 파일 읽기는 잠금 밖에서 (다른 지역 검색을 막지 않도록)
+        with self._lock:
+            self.stats["loads"] += 1
+            if not cache:
+                return retriever
+            retriever = self._loaded.setdefault(region, retriever)  # 동시에 불러왔으면 먼저 넣은 것 사용
+            self._loaded.move_to_end(region)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+                self.stats["evictions"] += 1
+        return retriever
+
+
+class ShardedGeoRetriever:
+    """
+    사용자 위치 주변 지역의 샤드만 검색하는 위치 기반 검색기입니다. `GeoRetriever`와 같은 `retrieve()`,
+    `document_for_place()` 인터페이스를 가지므로 `HybridRetriever`와 검색 체인에 그대로 연결됩니다.
+
+    위치가 있으면 검색 반경 안 관광지의 지역(가까운 순 최대 `max_regions`개)의 샤드에서 같은 질문 임베딩으로
+    위치 기반 점수를 계산해 합치고, 위치가 없으면 이미 올라온 샤드(부족하면 큰 샤드 순) 최대 `max_regions`개만
+    유사도 검색합니다. 전국 샤드를 모두 훑지 않으므로 위치 없는 질문의 관광지명 매칭은 하이브리드 검색의 어휘 검색이 맡습니다.
+    """
+
+    def __init__(self, shards, resolver, place_regions, k=8, radius_km=30.0, max_regions=MAX_SHARDS_PER_QUERY):
+        self.shards = shards  # RegionShards
+        self.resolver = resolver  # RegionResolver
+        self.place_regions = place_regions  # 관광지 ID -> 지역 (어휘 검색 결과의 샤드 찾기)
+        self.k = k
+        self.radius_km = radius_km
+        self.max_regions = max_regions
+
+    @property
+    def vectorstore(self):
+        return self.shards
+
+    def _embed_query(self, query):
+        with trace_stage("embed_query"):
+            return np.asarray(self.shards.embeddings.embed_query(query), dtype=np.float32)
+
+    def retrieve(self, query, user_lat=None, user_lon=None, k=None):
+        """주변 지역 샤드에서 질문과 위치로 문서를 검색합니다. 각 문서 메타데이터에 거리(km)가 추가됩니다."""
+        k = k or self.k
+        query_vec = self._embed_query(query)
+        if user_lat is None or user_lon is None:
+            return self._scan_without_location(query_vec, k)
+
+        with trace_stage("resolve_region"):
+            regions = self.resolver.regions_near(user_lat, user_lon, self.radius_km, self.max_regions)
+        trace_count("shards_searched", len(regions))
+        scored = []
+        for region in regions:
+            retriever = self.shards.retriever(region)
+            if retriever is not None:
+                scored.extend(retriever.scored_documents(query_vec, user_lat, user_lon, k))
+        scored.sort(key=lambda item: -item[0])
+        return [doc for _, doc in scored[:k]]
+
+    def _scan_regions(self):
+        """위치가 없을 때 훑을 지역: 최근에 쓴 샤드부터, 부족하면 벡터 수가 많은 샤드 순으로 최대 `max_regions`개."""
+        regions = self.shards.loaded_regions[::-1][:self.max_regions]
+        if len(regions) < self.max_regions:
+            sizes = self.shards.sizes
+            rest = sorted(sizes.keys() - set(regions), key=lambda region: (-sizes[region], region))
+            regions += rest[:self.max_regions - len(regions)]
+        return regions
+
+    def _scan_without_location(self, query_vec, k):
+        """제한된 수의 샤드에서 유사도 검색 결과를 거리(작을수록 유사) 순으로 합칩니다."""
+        regions = self._scan_regions()
+        trace_count("shards_searched", len(regions))
+        scored = []
+        for region in regions:
+            retriever = self.shards.retriever(region)
+            if retriever is None:
+                continue
+            vectorstore = retriever.vectorstore
+            scored.extend((score, doc) for doc, score in vectorstore.similarity_search_with_score_by_vector(query_vec, k=k))
+        scored.sort(key=lambda item: item[0])
+        return [doc for _, doc in scored[:k]]
+
+    def document_for_place(self, place_id, user_lat=None, user_lon=None):
+        """관광지 ID의 문서를 해당 지역 샤드에서 찾습니다 (샤드가 없거나 색인되지 않았으면 None)."""
+        region = self.place_regions.get(place_id)
+        retriever = self.shards.retriever(region) if region is not None else None
+        return retriever.document_for_place(place_id, user_lat, user_lon) if retriever is not None else None
+
+
+def place_regions(dataset, regions):
+    """관광지 ID -> 지역 딕셔너리."""
+    return dict(zip(dataset["관광지ID"].tolist(), np.asarray(regions, dtype=object).tolist()))
@@ -0,0 +1,243 @@
+"""
+요청 단위 지연 시간/토큰 추적 모듈.
+
+한 요청을 처리하는 동안 `tracing()` 블록 안에서 실행되는 코드는 `trace_stage("이름")`으로 단계별 소요 시간을,
+`trace_count("이름", 값)`으로 토큰 수, 검색 문서 수 같은 카운터를 현재 요청의 `RequestTrace`에 기록합니다.
+추적 중이 아니면 두 함수는 아무 일도 하지 않습니다. 현재 추적은 contextvars로 전달되므로 LangChain 체인의
+작업 스레드와 asyncio 태스크에서도 같은 요청의 추적에 기록됩니다.
+
+`MetricsRecorder`는 끝난 요청의 추적을 JSON Lines 파일에 한 줄씩 남기고, 단계별 히스토그램과 카운터를
+Prometheus 텍스트 형식으로 내보냅니다 (`serve()`로 /metrics HTTP 엔드포인트 제공).
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+METRICS_PATH = "tour_metrics.jsonl"  # 요청 추적을 덧붙일 기본 파일
+METRICS_PREFIX = "tour"  # Prometheus 지표 이름 접두사
+DURATION_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # 히스토그램 구간 (초)
+
+_current_trace = contextvars.ContextVar("tour_trace", default=None)
+
+
+class RequestTrace:
+    """
+    요청 하나의 단계별 소요 시간(ms)과 카운터입니다.
+    같은 단계가 여러 번 실행되면 시간이 합산되고, 단계는 중첩될 수 있습니다
+    (예: `retrieve` 안의 `embed_query`). 전체 시간은 `finish()`까지의 경과 시간입니다.
+    """
+
+    def __init__(self, name="request", **attributes):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attributes = dict(attributes)  # 캐시 적중 여부, 스트리밍 여부, 모델명 등 숫자가 아닌 정보
+        self.started_at = time.time()
+        self.stages = {}  # 단계 이름 -> 누적 소요 시간 (ms), 처음 실행된 순서 유지
+        self.counters = defaultdict(float)  # prompt_tokens, completion_tokens, retrieved_docs 등
+        self.total_ms = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()  # 체인의 병렬 단계가 동시에 기록할 수 있음
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds * 1000.0
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def finish(self):
+        """전체 소요 시간을 확정합니다. 여러 번 호출해도 처음 값이 유지됩니다."""
+        if self.total_ms is None:
+            self.total_ms = (time.perf_counter() - self._start) * 1000.0
+        return self
+
+    def to_dict(self):
+        """JSON으로 저장/표시할 수 있는 딕셔너리 (시간은 ms, 소수점 셋째 자리까지)."""
+        total_ms = self.total_ms if self.total_ms is not None else (time.perf_counter() - self._start) * 1000.0
+        with self._lock:
+            return {
+                "trace_id": self.trace_id,
+                "name": self.name,
+                "started_at": round(self.started_at, 3),
+                "total_ms": round(total_ms, 3),
+                "stages_ms": {stage: round(ms, 3) for stage, ms in self.stages.items()},
+                "counters": {key: int(value) if float(value).is_integer() else value for key, value in self.counters.items()},
+                "attributes": dict(self.attributes),
+            }
+
+
+def current_trace():
+    """현재 실행 흐름의 `RequestTrace` (추적 중이 아니면 None)."""
+    return _current_trace.get()
+
+
+@contextlib.contextmanager
+def tracing(trace=None, name="request", **attributes):
+    """블록 안의 코드를 `trace`(생략하면 새 RequestTrace)에 기록합니다. 블록을 나가면 전체 시간이 확정됩니다."""
+    trace = trace or RequestTrace(name, **attributes)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.finish()
+
+
+@contextlib.contextmanager
+def trace_stage(name):
+    """현재 추적에 단계 `name`의 소요 시간을 더합니다 (추적 중이 아니면 아무것도 하지 않음)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.stage(name):
+        yield trace
+
+
+def trace_duration(name, seconds):
+    """이미 측정한 소요 시간(초)을 현재 추적의 단계 `name`에 더합니다 (스트리밍 첫 토큰 지연 등)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_stage(name, seconds)
+
+
+def trace_count(name, value=1):
+    """현재 추적의 카운터 `name`에 `value`를 더합니다."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, value)
+
+
+def trace_attribute(name, value):
+    """현재 추적에 숫자가 아닌 속성(캐시 적중 여부, 모델명 등)을 기록합니다."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes[name] = value
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+class MetricsRecorder:
+    """
+    끝난 요청 추적을 모아 단계별 지연 시간 히스토그램과 카운터 합계를 유지합니다.
+
+    `path`를 주면 `record()`마다 추적 딕셔너리를 JSON Lines로 덧붙이고,
+    `prometheus_text()`는 Prometheus 텍스트 형식을, `summary()`는 최근 `window`건 기준 단계별 p50/p95를 반환합니다.
+    """
+
+    def __init__(self, path=None, window=500, buckets=DURATION_BUCKETS_S):
+        self.path = path  # JSON Lines 파일 경로 (None이면 파일에 쓰지 않음)
+        self.buckets = tuple(buckets)
+        self.requests = defaultdict(int)  # (name, cached) -> 요청 수
+        self.counters = defaultdict(float)  # 카운터 이름 -> 누적 합계
+        self._histograms = {}  # 단계 -> [구간별 개수 배열, 합계(초), 개수]
+        self._recent = defaultdict(lambda: deque(maxlen=window))  # 단계 -> 최근 소요 시간 (ms)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def record(self, trace):
+        """끝난 `RequestTrace`(또는 그 딕셔너리)를 집계하고 파일에 기록합니다."""
+        data = trace.finish().to_dict() if isinstance(trace, RequestTrace) else trace
+        stages = {**data["stages_ms"], "total": data["total_ms"]}
+        with self._lock:
+            self.requests[(data["name"], bool(data["attributes"].get("cached", False)))] += 1
+            for key, value in data["counters"].items():
+                self.counters[key] += value
+            for stage, ms in stages.items():
+                counts, total, n = self._histograms.get(stage, (np.zeros(len(self.buckets), dtype=np.int64), 0.0, 0))
+                counts += np.asarray(self.buckets) >= ms / 1000.0  # 누적(le) 구간
+                self._histograms[stage] = (counts, total + ms / 1000.0, n + 1)
+                self._recent[stage].append(ms)
+            if self.path:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(data, ensure_ascii=False, default=str) + "\n")
+        return data
+
+    def summary(self):
+        """단계별 {건수, 평균/p50/p95 ms} (최근 window건 기준). 전체 시간은 'total' 단계입니다."""
+        with self._lock:
+            recent = {stage: np.asarray(values) for stage, values in self._recent.items() if values}
+        return {
+            stage: {
+                "count": int(values.size),
+                "mean_ms": round(float(values.mean()), 2),
+                "p50_ms": round(float(np.percentile(values, 50)), 2),
+                "p95_ms": round(float(np.percentile(values, 95)), 2),
+            }
+            for stage, values in recent.items()
+        }
+
+    def prometheus_text(self):
+        """Prometheus 텍스트 노출 형식의 지표 문자열."""
+        prefix = METRICS_PREFIX
+        with self._lock:
+            lines = [
+                f"# HELP {prefix}_requests_total 처리한 요청 수",
+                f"# TYPE {prefix}_requests_total counter",
+            ]
+            for (name, cached), value in sorted(self.requests.items()):
+                lines.append(f'{prefix}_requests_total{{name="{_label(name)}",cached="{str(cached).lower()}"}} {value}')
+
+            lines += [
+                f"# HELP {prefix}_stage_duration_seconds 요청 처리 단계별 소요 시간",
+                f"# TYPE {prefix}_stage_duration_seconds histogram",
+            ]
+            for stage, (counts, total, n) in sorted(self._histograms.items()):
+                label = f'stage="{_label(stage)}"'
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f'{prefix}_stage_duration_seconds_bucket{{{label},le="{bound}"}} {int(count)}')
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{{label},le="+Inf"}} {n}')
+                lines.append(f"{prefix}_stage_duration_seconds_sum{{{label}}} {total:.6f}")
+                lines.append(f"{prefix}_stage_duration_seconds_count{{{label}}} {n}")
+
+            for key, value in sorted(self.counters.items()):
+                metric = f"{prefix}_{key}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value:g}"]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """백그라운드 스레드에서 `GET /metrics` HTTP 엔드포인트를 시작합니다 (이미 실행 중이면 그대로 둠)."""
+        if self._server is not None:
+            return self._server
+        recorder = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = recorder.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # 요청마다 stderr에 로그를 남기지 않음
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="tour-metrics", daemon=True).start()
+        return self._server
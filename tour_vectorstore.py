@@ -0,0 +1,402 @@
+"""
+관광지 벡터스토어(FAISS) 생성 및 증분 갱신 모듈.
+
+인덱스 폴더 옆에 파일별/행별 콘텐츠 해시를 기록한 매니페스트(manifest.json)를 두고,
+시작 시 변경된 파일만 다시 읽어 추가/변경된 행만 임베딩하고 삭제된 행은 인덱스에서 제거합니다.
+변경이 없으면 인덱스를 읽기 전용 메모리 매핑으로 열 수 있어, 한 서버의 여러 워커 프로세스가 벡터 페이지를 공유합니다.
+저장할 때마다 인덱스/문서 저장소/매니페스트를 새 버전 폴더에 모두 쓴 뒤 포인터 파일(CURRENT)을 원자적으로 바꾸므로,
+읽는 쪽은 포인터를 한 번 읽어 항상 서로 맞는 파일 묶음을 엽니다.
+인덱스 종류(`INDEX_TYPES`)로 정확 검색(flat) 대신 스칼라/곱 양자화(SQ8/PQ), IVF, HNSW 인덱스를 선택하여
+메모리와 검색 시간을 줄일 수 있습니다 (재현율 손실은 benchmarks/run_benchmarks.py --index-report로 확인).
+단, 사용자 위치가 있는 질의(`tour_retrieval.GeoRetriever`)는 반경 후보 벡터를 복원해 직접 점수를 매기므로
+IVF/HNSW의 근사 탐색을 쓰지 않습니다. 이 경로에서 인덱스 종류는 메모리와 양자화 오차에만 영향을 주며,
+근사 탐색으로 빨라지는 것은 위치 없는 질의(유사도 검색)뿐입니다.
+Streamlit에 의존하지 않습니다.
+"""
+import hashlib
+import json
+import math
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+MANIFEST_FILE = "manifest.json"  # 인덱스 폴더 안에 저장되는 매니페스트 파일명
+MANIFEST_VERSION = 1  # 매니페스트 형식 버전 (형식이 바뀌면 전체 재생성)
+INDEX_NAME = "index"  # FAISS.save_local 기본 파일명 (index.faiss, index.pkl)
+CURRENT_FILE = "CURRENT"  # 인덱스 폴더 안에서 현재 버전 폴더 이름을 가리키는 포인터 파일
+VERSION_PREFIX = "v"  # 버전 폴더 이름 접두사
+INDEX_DIR_ATTR = "tour_index_dir"  # 불러온 벡터스토어에 기록하는 버전 폴더 경로 (파생 파일을 같은 버전에 두기 위함)
+
+# 인덱스 종류 -> (faiss.index_factory 형식 문자열, 제자리 추가/삭제 가능 여부)
+# 제자리 수정이 안 되는 종류(IVF 계열: 삭제 후 위치가 당겨지지 않음, HNSW: 삭제 미지원)는 변경이 있으면
+# 남은 문서와 새 문서로 다시 학습/생성합니다 (기존 문서 임베딩은 임베딩 캐시에서 재사용).
+INDEX_TYPES = {
+    "flat": ("Flat", True),  # 정확 검색, float32 원본 (기본값)
+    "sq8": ("SQ8", True),  # 8비트 스칼라 양자화: 메모리 1/4
+    "pq": ("PQ{pq_m}x{pq_bits}", True),  # 곱 양자화: 벡터당 pq_m바이트
+    "ivf": ("IVF{nlist},Flat", False),  # 역파일: nprobe개 군집만 탐색
+    "ivfsq8": ("IVF{nlist},SQ8", False),
+    "ivfpq": ("IVF{nlist},PQ{pq_m}x{pq_bits}", False),
+    "hnsw": ("HNSW{hnsw_m}", False),  # 그래프 기반 근사 검색
+    "hnswsq8": ("HNSW{hnsw_m},SQ8", False),
+}
+DEFAULT_INDEX_TYPE = "flat"
+INDEX_TYPE_ENV = "TOUR_INDEX_TYPE"  # 인덱스 종류 선택 환경 변수 (TripEngine 기본값, 위치 기반 검색은 항상 후보 전수 비교)
+DEFAULT_INDEX_OPTIONS = {
+    "nlist": None,  # IVF 군집 수 (None: 문서 수에 맞게 약 4*sqrt(N), 군집당 학습 벡터 39개 이상)
+    "nprobe": 8,  # IVF 검색 시 탐색할 군집 수 (클수록 재현율↑ 지연↑)
+    "pq_m": None,  # PQ 부분 벡터 수 = 벡터당 바이트 수 (None: 차원/8에 가까운 약수)
+    "pq_bits": 8,  # PQ 부분 벡터당 비트 수 (문서 수가 적으면 faiss 권장 학습량에 맞게 낮춤)
+    "hnsw_m": 32,  # HNSW 노드당 연결 수
+    "ef_construction": 80,  # HNSW 생성 시 탐색 폭
+    "ef_search": 64,  # HNSW 검색 시 탐색 폭 (클수록 재현율↑ 지연↑)
+}
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    """파일 내용의 SHA-256 해시를 계산합니다."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_hash(file_key, page_content):
+    """행 문서의 콘텐츠 해시입니다. 같은 내용이라도 파일이 다르면 다른 해시가 됩니다."""
+    return hashlib.sha256(f"{file_key}\x1f{page_content}".encode("utf-8")).hexdigest()[:32]
+
+
+def embedding_model_name(embeddings):
+    """매니페스트에 기록할 임베딩 모델 식별자를 반환합니다."""
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def resolve_index_dir(index_path):
+    """
+    포인터 파일(CURRENT)이 가리키는 현재 버전 폴더를 반환합니다. 포인터가 없으면(이전 형식, 아직 저장 전)
+    `index_path` 자체입니다. 읽는 쪽은 한 번만 해석하고 그 폴더의 파일만 사용해야 합니다.
+    """
+    try:
+        with open(os.path.join(index_path, CURRENT_FILE), encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return index_path
+    return os.path.join(index_path, name) if name else index_path
+
+
+def vectorstore_dir(vectorstore):
+    """벡터스토어를 불러온(또는 저장한) 버전 폴더 (`load_vectorstore`/`save_vectorstore`를 거치지 않았으면 None)."""
+    return getattr(vectorstore, INDEX_DIR_ATTR, None)
+
+
+def manifest_vector_count(index_path):
+    """매니페스트에 기록된 청크(벡터) 수. 인덱스를 열지 않고 확인합니다."""
+    return sum(len(chunk_ids) for entry in load_manifest(index_path)["files"].values()
+               for chunk_ids in entry["rows"].values())
+
+
+def load_manifest(index_path):
+    """인덱스 폴더(현재 버전)의 매니페스트를 읽습니다. 없거나 형식이 다르면 빈 매니페스트를 반환합니다."""
+    manifest_path = os.path.join(resolve_index_dir(index_path), MANIFEST_FILE)
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "embedding": None, "schema": None, "files": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "embedding": None, "schema": None, "files": {}}
+    return manifest
+
+
+def _write_atomic(path, text):
+    """임시 파일에 쓴 뒤 교체하여 중간에 중단되어도 깨지지 않게 저장합니다."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def save_manifest(index_dir, manifest):
+    """매니페스트를 (아직 공개하지 않은) 버전 폴더에 저장합니다."""
+    _write_atomic(os.path.join(index_dir, MANIFEST_FILE), json.dumps(manifest, ensure_ascii=False))
+
+
+def index_config(index_type=DEFAULT_INDEX_TYPE, index_options=None):
+    """매니페스트에 기록하는 인덱스 설정. 설정이 바뀌면 전체를 다시 생성합니다 (flat은 옵션 무시)."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"알 수 없는 인덱스 종류입니다: {index_type} ({', '.join(INDEX_TYPES)})")
+    options = {} if index_type == "flat" else {key: value for key, value in sorted((index_options or {}).items())}
+    return {"type": index_type, "options": options}
+
+
+def resolve_index_options(index_type, dim, n_vectors, index_options=None):
+    """기본값과 `index_options`를 합치고 문서 수/차원에 맞게 nlist, pq_m, pq_bits를 정합니다."""
+    options = {**DEFAULT_INDEX_OPTIONS, **(index_options or {})}
+    if options["nlist"] is None:
+        options["nlist"] = max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+    if options["pq_m"] is None:
+        options["pq_m"] = next(m for m in range(max(1, dim // 8), 0, -1) if dim % m == 0)
+    options["pq_bits"] = max(1, min(options["pq_bits"], int(math.log2(max(n_vectors // 39, 2)))))  # 중심점당 학습 벡터 39개 이상
+    return options
+
+
+def configure_index(index, nprobe=None, ef_search=None):
+    """
+    검색 시점 파라미터를 설정합니다: IVF의 nprobe, HNSW의 efSearch.
+    IVF 인덱스에는 위치별 벡터 복원(GeoRetriever의 후보 재정렬)에 필요한 direct map을 만들어 둡니다.
+    """
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        if nprobe is not None:
+            ivf.nprobe = min(int(nprobe), ivf.nlist)
+        if ivf.direct_map.no():
+            ivf.make_direct_map()
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None and ef_search is not None:
+        hnsw.efSearch = int(ef_search)
+    return index
+
+
+def build_faiss_index(vectors, index_type=DEFAULT_INDEX_TYPE, index_options=None):
+    """
+    `vectors`(float32 (N, D))로 학습한 빈 FAISS 인덱스를 만듭니다 (L2 거리, FAISS.from_documents와 같음).
+    벡터 추가는 호출한 쪽(LangChain FAISS.add_embeddings)이 합니다.
+    """
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    options = resolve_index_options(index_type, vectors.shape[1], len(vectors), index_options)
+    index = faiss.index_factory(vectors.shape[1], INDEX_TYPES[index_type][0].format(**options), faiss.METRIC_L2)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efConstruction = int(options["ef_construction"])
+    if not index.is_trained:
+        index.train(vectors)
+    return configure_index(index, options["nprobe"], options["ef_search"])
+
+
+def create_vectorstore(documents, embeddings, ids=None, index_type=DEFAULT_INDEX_TYPE, index_options=None):
+    """문서를 임베딩하여 `index_type` 인덱스의 FAISS 벡터스토어를 만듭니다."""
+    texts = [doc.page_content for doc in documents]
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    index = build_faiss_index(vectors, index_type, index_options)
+    vectorstore = FAISS(embeddings, index, InMemoryDocstore(), {})
+    vectorstore.add_embeddings(zip(texts, vectors), metadatas=[doc.metadata for doc in documents], ids=ids)
+    return vectorstore
+
+
+def index_signature(index_dir):
+    """버전 폴더에 저장된 FAISS 인덱스 파일의 (크기, 수정 시각). 인덱스에서 파생한 파일의 신선도 확인용이며, 없으면 None."""
+    try:
+        stat = os.stat(os.path.join(index_dir, f"{INDEX_NAME}.faiss"))
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_vectorstore(index_path, embeddings, mmap=False):
+    """
+    저장된 FAISS 벡터스토어를 로드합니다. `mmap=True`이면 벡터를 읽기 전용 메모리 매핑으로 열어(페이지 캐시 공유)
+    로드 시간과 프로세스별 메모리를 줄입니다. 메모리 매핑된 인덱스에 문서를 추가/삭제하면 프로세스가 중단되므로
+    수정이 필요하면 `mmap=False`로 다시 로드해야 합니다. 설치된 faiss가 지원하지 않으면 일반 로드로 대체합니다.
+    포인터는 한 번만 해석하며, 읽은 버전 폴더는 `vectorstore_dir()`로 확인할 수 있습니다.
+    """
+    index_dir = resolve_index_dir(index_path)
+    vectorstore = None
+    if mmap:
+        import faiss
+
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        try:
+            index = faiss.read_index(os.path.join(index_dir, f"{INDEX_NAME}.faiss"), flags)
+        except RuntimeError:  # 메모리 매핑을 지원하지 않는 인덱스 형식
+            index = None
+        if index is not None:
+            with open(os.path.join(index_dir, f"{INDEX_NAME}.pkl"), "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)  # FAISS.load_local과 같은 형식 (직접 만든 파일만 읽음)
+            vectorstore = FAISS(embeddings, configure_index(index), docstore, index_to_docstore_id)
+    if vectorstore is None:
+        vectorstore = FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+        configure_index(vectorstore.index)
+    setattr(vectorstore, INDEX_DIR_ATTR, index_dir)
+    return vectorstore
+
+
+def save_vectorstore(vectorstore, index_path, manifest=None):
+    """
+    벡터스토어(index.faiss, index.pkl)와 매니페스트를 새 버전 폴더에 모두 쓴 뒤 포인터 파일을 원자적으로 바꿔 공개하고,
+    새 버전 폴더 경로를 반환합니다. 공개된 버전 폴더는 다시 수정하지 않으므로 포인터를 먼저 읽은 워커는 교체 전
+    파일 묶음을 계속 안전하게 읽습니다. 현재와 직전 버전(포인터를 막 읽은 워커가 열 수 있도록)을 제외한 이전 버전과
+    이전 형식의 최상위 파일은 지웁니다.
+    """
+    os.makedirs(index_path, exist_ok=True)
+    name = f"{VERSION_PREFIX}{time.time_ns():x}-{os.getpid()}"
+    index_dir = os.path.join(index_path, name)
+    vectorstore.save_local(index_dir, INDEX_NAME)
+    if manifest is not None:
+        save_manifest(index_dir, manifest)
+    previous = os.path.basename(resolve_index_dir(index_path))
+    _write_atomic(os.path.join(index_path, CURRENT_FILE), name)  # 이 시점부터 새 버전이 보임
+    setattr(vectorstore, INDEX_DIR_ATTR, index_dir)
+
+    keep = {CURRENT_FILE, name, previous}
+    for entry in os.listdir(index_path):
+        if entry not in keep:  # 오래된 버전, 이전 형식의 최상위 파일
+            path = os.path.join(index_path, entry)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    return index_dir
+
+
+def prefault_index(index_path, block_size=4 << 20):
+    """
+    인덱스 폴더(현재 버전)의 모든 파일을 끝까지 읽어 OS 페이지 캐시에 올리고 읽은 바이트 수를 반환합니다.
+    트래픽 전에 한 번 실행해 두면 메모리 매핑으로 여는 워커들의 첫 검색에서 디스크 읽기가 없어집니다.
+    """
+    total = 0
+    for root, _, names in os.walk(resolve_index_dir(index_path)):
+        for name in names:
+            with open(os.path.join(root, name), "rb") as f:
+                for block in iter(lambda: f.read(block_size), b""):
+                    total += len(block)
+    return total
+
+
+def _diff_files(file_paths, old_files, load_rows, split_documents=None, file_hashes=None):
+    """
+    매니페스트 파일 항목(`old_files`)과 현재 파일을 비교하여 (새 파일 항목, 추가할 문서, 추가할 ID, 삭제할 ID, 통계)를
+    반환합니다. 해시가 그대로인 파일은 읽지 않으며, 벡터스토어를 열지 않고 매니페스트만으로 계산합니다.
+    """
+    new_files = {}  # 갱신 후 매니페스트의 파일 항목
+    add_docs, add_ids, delete_ids = [], [], []
+    stats = {"unchanged_files": 0, "changed_files": 0, "added_rows": 0, "removed_rows": 0, "embedded_chunks": 0}
+
+    for file_path in file_paths:
+        file_key = os.path.normpath(file_path)  # 매니페스트 키
+        old_entry = old_files.get(file_key)
+        current_sha = (file_hashes or {}).get(file_key) or file_sha256(file_path)
+        if old_entry and old_entry["sha256"] == current_sha:
+            new_files[file_key] = old_entry  # 변경 없음: 파일을 다시 읽지 않음
+            stats["unchanged_files"] += 1
+            continue
+
+        rows = load_rows(file_path)
+        if rows is None:
+            if old_entry:
+                new_files[file_key] = old_entry  # 읽기 실패: 기존 내용 유지
+            continue
+
+        stats["changed_files"] += 1
+        old_rows = old_entry["rows"] if old_entry else {}
+        new_rows = {}
+        for row in rows:
+            h = row_hash(file_key, row.page_content)
+            if h in new_rows:
+                continue  # 완전히 같은 행은 한 번만 색인
+            if h in old_rows:
+                new_rows[h] = old_rows[h]  # 기존 청크 재사용
+                continue
+            chunks = split_documents([row]) if split_documents else [row]
+            chunk_ids = [f"{h}:{i}" for i in range(len(chunks))]
+            add_docs.extend(chunks)
+            add_ids.extend(chunk_ids)
+            new_rows[h] = chunk_ids
+            stats["added_rows"] += 1
+
+        for h in old_rows.keys() - new_rows.keys():  # 사라지거나 변경된 행
+            delete_ids.extend(old_rows[h])
+            stats["removed_rows"] += 1
+        new_files[file_key] = {"sha256": current_sha, "rows": new_rows}
+
+    for file_key in old_files.keys() - new_files.keys():  # 목록에서 빠진 파일
+        for chunk_ids in old_files[file_key]["rows"].values():
+            delete_ids.extend(chunk_ids)
+            stats["removed_rows"] += 1
+    return new_files, add_docs, add_ids, delete_ids, stats
+
+
+def sync_vectorstore(index_path, file_paths, load_rows, embeddings, split_documents=None, document_schema=None,
+                     file_hashes=None, mmap=False, index_type=DEFAULT_INDEX_TYPE, index_options=None, load_unchanged=True):
+    """
+    매니페스트와 현재 CSV 파일들을 비교하여 FAISS 인덱스를 증분 갱신하고 (벡터스토어, 통계)를 반환합니다.
+
+    - `load_rows(file_path)`는 파일의 행 단위 Document 리스트를 반환합니다. 읽기에 실패하면
+      None을 반환하며, 이 경우 해당 파일의 기존 인덱스 내용은 그대로 유지됩니다.
+    - `split_documents(docs)`가 주어지면 각 행을 청크로 나누어 임베딩합니다.
+    - `file_hashes`({정규화 경로: SHA-256})가 주어지면 파일을 다시 읽어 해시하지 않습니다.
+    - 파일 해시가 그대로인 파일은 다시 읽지 않고, 바뀐 파일은 행 해시를 비교하여
+      추가/변경된 행만 임베딩하고 사라진 행의 청크는 삭제합니다.
+    - 매니페스트가 없거나(이전 버전 인덱스), 임베딩 모델 또는 문서 형식(`document_schema`)이
+      바뀌었으면 전체를 다시 생성합니다.
+    - `mmap=True`이면 읽기 전용 메모리 매핑 인덱스를 반환합니다. 갱신이 필요하면 쓰기 가능한 사본으로
+      수정/저장한 뒤 저장된 파일을 다시 메모리 매핑으로 엽니다.
+    - `index_type`/`index_options`(`INDEX_TYPES`, `DEFAULT_INDEX_OPTIONS`)로 인덱스 종류를 고릅니다.
+      설정이 바뀌면 전체를 다시 생성하고, 제자리 수정이 안 되는 종류는 변경이 있을 때 전체를 다시 학습합니다.
+    - 변경 여부는 매니페스트만으로 판단합니다. `load_unchanged=False`이면 바뀐 것이 없을 때 인덱스를 열지 않고
+      (None, 통계)를 반환합니다 (여러 샤드를 점검만 하는 경우).
+    """
+    index_dir = resolve_index_dir(index_path)  # 매니페스트와 인덱스를 같은 버전에서 읽도록 포인터는 한 번만 해석
+    manifest = load_manifest(index_dir)
+    model_name = embedding_model_name(embeddings)
+    config = index_config(index_type, index_options)
+
+    reusable = (manifest.get("embedding") == model_name and manifest.get("schema") == document_schema
+                and manifest.get("index", index_config()) == config)  # 이전 매니페스트에는 인덱스 설정이 없음 (flat)
+    incremental = bool(manifest["files"]) and reusable and os.path.exists(index_dir)
+    new_files, add_docs, add_ids, delete_ids, stats = _diff_files(
+        file_paths, manifest["files"] if incremental else {}, load_rows, split_documents, file_hashes)
+    changed = bool(add_docs or delete_ids) or new_files != manifest["files"] or not reusable
+    if incremental and not changed and not load_unchanged:
+        return None, stats  # 변경 없음: 인덱스를 열지 않음 (벡터 수는 manifest_vector_count로 확인)
+
+    vectorstore = None
+    if incremental:
+        try:  # 수정할 인덱스는 처음부터 쓰기 가능한 사본으로 (메모리 매핑 인덱스는 수정할 수 없음)
+            vectorstore = load_vectorstore(index_dir, embeddings, mmap=mmap and not (add_docs or delete_ids))
+        except Exception:  # 인덱스가 손상되었으면 전체 재생성
+            new_files, add_docs, add_ids, delete_ids, stats = _diff_files(
+                file_paths, {}, load_rows, split_documents, file_hashes)
+            changed = True
+
+    if vectorstore is not None and (delete_ids or add_docs) and not INDEX_TYPES[index_type][1]:
+        deleted = set(delete_ids)  # 제자리 수정이 안 되는 인덱스: 남은 문서 + 새 문서로 다시 생성
+        keep_ids = [doc_id for _, doc_id in sorted(vectorstore.index_to_docstore_id.items()) if doc_id not in deleted]
+        add_docs = [vectorstore.docstore.search(doc_id) for doc_id in keep_ids] + add_docs
+        add_ids = keep_ids + add_ids
+        stats["embedded_chunks"] = len(add_docs) - len(keep_ids)
+        vectorstore = None
+    elif add_docs:
+        stats["embedded_chunks"] = len(add_docs)
+
+    if vectorstore is not None and delete_ids:
+        vectorstore.delete(delete_ids)
+    if add_docs:
+        if vectorstore is None:
+            vectorstore = create_vectorstore(add_docs, embeddings, add_ids, index_type, index_options)
+        else:
+            vectorstore.add_documents(add_docs, ids=add_ids)
+
+    if vectorstore is None:
+        return None, stats  # 색인할 문서가 전혀 없음
+
+    if changed:
+        index_dir = save_vectorstore(vectorstore, index_path, {  # 인덱스와 매니페스트를 한 버전으로 함께 공개
+            "version": MANIFEST_VERSION, "embedding": model_name, "schema": document_schema, "index": config,
+            "files": new_files,
+        })
+        if mmap:
+            vectorstore = load_vectorstore(index_dir, embeddings, mmap=True)  # 다른 워커와 같은 파일 페이지를 공유
+    return vectorstore, stats